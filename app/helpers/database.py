@@ -1,21 +1,216 @@
 import os
-from sqlalchemy import create_engine
+from typing import Any
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
+from app.utils import metrics
+
 load_dotenv()
 MYSQL_USER = os.getenv("MYSQL_USER")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
 MYSQL_HOST = os.getenv("MYSQL_HOST")
+# Pilote asynchrone MySQL: "aiomysql" ou "asyncmy"
+MYSQL_ASYNC_DRIVER = os.getenv("MYSQL_ASYNC_DRIVER", "aiomysql")
+
+# Profil des moteurs: "dev", "prod" ou "test-sqlite"
+DB_PROFILE = os.getenv("DB_PROFILE", "dev")
+
+# Réglages par profil, chacun modifiable par variable d'environnement (DB_POOL_SIZE, DB_ECHO...)
+ENGINE_PROFILES: dict[str, dict[str, Any]] = {
+    "dev": {
+        "echo": True,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_recycle": 3600,
+        "pool_pre_ping": True,
+        "statement_timeout_ms": 0,
+    },
+    "prod": {
+        # L'écho SQL est synchrone et écrit chaque requête sur la sortie standard
+        "echo": False,
+        "pool_size": 20,
+        "max_overflow": 10,
+        # Pool saturé: échec rapide plutôt que des requêtes en attente pendant 30 s
+        "pool_timeout": 5,
+        # Sous wait_timeout de MySQL (8 h par défaut) et des proxys qui coupent les connexions inactives
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+        "statement_timeout_ms": 10000,
+    },
+    "test-sqlite": {
+        "echo": False,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_recycle": -1,
+        "pool_pre_ping": False,
+        "statement_timeout_ms": 0,
+    },
+}
+
+# PRAGMA appliqués à chaque connexion SQLite (journal WAL: lectures concurrentes des écritures)
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT", "5000"),
+    "cache_size": "-64000",
+    "temp_store": "MEMORY",
+}
+
+
+def engine_settings(profile: str = DB_PROFILE) -> dict[str, Any]:
+    """
+    Réglages du profil, surchargés par les variables DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING et DB_STATEMENT_TIMEOUT_MS
+    """
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Profil de base de donnée inconnu: {profile} ({', '.join(ENGINE_PROFILES)})")
+    settings = dict(ENGINE_PROFILES[profile])
+    for key, default in ENGINE_PROFILES[profile].items():
+        value = os.getenv(f"DB_{key.upper()}")
+        if value is None:
+            continue
+        settings[key] = value.lower() == "true" if isinstance(default, bool) else int(value)
+    return settings
+
+
+# DATABASE_URL="sqlite:///./qr_code_app.db" pour travailler en local (implicite avec DB_PROFILE=test-sqlite)
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "sqlite:///./qr_code_app.db" if DB_PROFILE == "test-sqlite" else
+    f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}?charset=utf8mb4"
+)
+
+# Correspondance pilote synchrone -> pilote asynchrone
+ASYNC_DRIVERS = {
+    "mysql": f"mysql+{MYSQL_ASYNC_DRIVER}",
+    "mysql+pymysql": f"mysql+{MYSQL_ASYNC_DRIVER}",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """
+    Convertit une URL de base de donnée synchrone vers son équivalent asynchrone
+    """
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
 
-# SQLALCHEMY_DATABASE_URL = "sqlite:///./qr_code_app.db"
-SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}?charset=utf8mb4" 
+ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(SQLALCHEMY_DATABASE_URL))
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, echo=True
+# Réplique en lecture (optionnelle), ex. REPLICA_DATABASE_URL="sqlite:///./qr_code_replica.db" en local
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+ASYNC_REPLICA_DATABASE_URL = os.getenv(
+    "ASYNC_REPLICA_DATABASE_URL",
+    to_async_url(REPLICA_DATABASE_URL) if REPLICA_DATABASE_URL else None
 )
+
+def _on_connect(sync_engine, settings: dict[str, Any], read_only: bool = False):
+    """
+    Réglages de session appliqués à chaque nouvelle connexion du pool
+    """
+    dialect = sync_engine.dialect.name
+    statement_timeout_ms = settings["statement_timeout_ms"]
+    statements = []
+    if dialect == "sqlite":
+        statements = [f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()]
+        if read_only:
+            statements.append("PRAGMA query_only=ON")
+    elif dialect == "mysql":
+        if statement_timeout_ms:
+            # Interrompt les SELECT trop longs côté serveur (MySQL >= 5.7.8)
+            statements.append(f"SET SESSION max_execution_time={int(statement_timeout_ms)}")
+        if read_only:
+            statements.append("SET SESSION TRANSACTION READ ONLY")
+    if not statements:
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def configure_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+
+def engine_options(url: str, settings: dict[str, Any], name: str = "primary") -> dict[str, Any]:
+    """
+    Arguments de create_engine / create_async_engine pour une URL et des réglages de profil
+    """
+    options: dict[str, Any] = {"echo": settings["echo"], "pool_pre_ping": settings["pool_pre_ping"]}
+    # Pool par défaut du dialecte, mesuré (attente au checkout) si les métriques sont actives
+    poolclass = metrics.pool_class(url, name)
+    if poolclass is not None:
+        options["poolclass"] = poolclass
+    # SQLite en mémoire: une seule connexion partagée, pas de pool à dimensionner.
+    # aiosqlite: NullPool (défaut de SQLAlchemy), chaque connexion ayant son propre thread
+    # qu'un pool garderait ouvert (et le processus avec) jusqu'à dispose()
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":")
+                                     or url.startswith("sqlite+aiosqlite")):
+        return options
+    options.update(pool_options(settings))
+    return options
+
+
+def pool_options(settings: dict[str, Any]) -> dict[str, Any]:
+    """
+    Dimensionnement d'un pool à file (QueuePool) selon les réglages du profil
+    """
+    return {
+        "pool_size": settings["pool_size"],
+        "max_overflow": settings["max_overflow"],
+        "pool_timeout": settings["pool_timeout"],
+        "pool_recycle": settings["pool_recycle"],
+    }
+
+
+def create_engines(sync_url: str = SQLALCHEMY_DATABASE_URL,
+                   async_url: str = ASYNC_SQLALCHEMY_DATABASE_URL,
+                   profile: str = DB_PROFILE):
+    """
+    Moteurs synchrone et asynchrone configurés selon le profil
+    """
+    settings = engine_settings(profile)
+    sync_engine = create_engine(sync_url, **engine_options(sync_url, settings, "sync"))
+    _on_connect(sync_engine, settings)
+    metrics.instrument_engine(sync_engine, "sync")
+    asynchronous_engine = create_async_engine(async_url, **engine_options(async_url, settings, "primary"))
+    _on_connect(asynchronous_engine.sync_engine, settings)
+    metrics.instrument_engine(asynchronous_engine.sync_engine, "primary")
+    return sync_engine, asynchronous_engine
+
+
+def create_replica_engine(async_url: str, profile: str = DB_PROFILE):
+    """
+    Moteur asynchrone de la réplique: mêmes réglages que le primaire, connexions en lecture seule
+    (une écriture envoyée par erreur à la réplique échoue au lieu de diverger)
+    """
+    settings = engine_settings(profile)
+    replica = create_async_engine(async_url, **engine_options(async_url, settings, "replica"))
+    _on_connect(replica.sync_engine, settings, read_only=True)
+    metrics.instrument_engine(replica.sync_engine, "replica")
+    return replica
+
+
+# Moteur asynchrone utilisé par les routes: une requête lente ne bloque plus la boucle d'événements.
+# Le moteur synchrone sert à la création du schéma et aux scripts.
+engine, async_engine = create_engines()
 SessionLocal = sessionmaker(bind=engine)
 
+# Sans réplique configurée, les lectures restent sur le primaire
+replica_engine = create_replica_engine(ASYNC_REPLICA_DATABASE_URL) if ASYNC_REPLICA_DATABASE_URL else None
+
+# expire_on_commit=False: les objets restent lisibles après commit sans nouveau SELECT implicite
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+# Sessions des routes en lecture seule (voir app.utils.replica)
+ReplicaSessionLocal = async_sessionmaker(bind=replica_engine or async_engine, expire_on_commit=False)
+
 Base = declarative_base()
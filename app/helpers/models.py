@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Date
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, Date, DateTime, Text
 from datetime import datetime
 from sqlalchemy.orm import relationship
 
@@ -45,7 +45,7 @@ class Journal(Base):
     operation = Column(String(200))
     id_operator = Column(Integer, ForeignKey("Operators.id", ondelete="CASCADE", onupdate="CASCADE"))
     im_etudiant = Column(String(20), ForeignKey("etudiants.matricule", ondelete="CASCADE", onupdate="CASCADE"))
-    date = Column(Date, default=datetime.now())
+    date = Column(Date, default=datetime.now(), index=True)
 
     effectue_par = relationship("Operator", back_populates="activites")
     etudiant = relationship("Etudiant", back_populates="activites")
@@ -58,7 +58,80 @@ class QR_Code(Base):
     id_etudiant = Column(Integer, ForeignKey("etudiants.id", ondelete="CASCADE", onupdate="CASCADE"))
     expire_date = Column(Date)
     is_valid = Column(Boolean, default=True)
-    data = Column(String(255))
+    data = Column(String(255), index=True)
     created_at = Column(Date, default=datetime.now())
 
-    owner = relationship("Etudiant", back_populates="qrcode")
\ No newline at end of file
+    owner = relationship("Etudiant", back_populates="qrcode")
+
+
+class QR_CodeChange(Base):
+    """
+    Codes QR modifiés (invalidation, suppression, étudiant modifié): lus par l'index en mémoire
+    des autres processus (app.utils.qr_index). Les créations se lisent directement sur qrcode.id.
+    """
+    __tablename__ = "qrcode_changes"
+
+    id = Column(Integer, primary_key=True)
+    data = Column(String(255))
+    changed_at = Column(DateTime, default=datetime.now, index=True)
+
+
+class ScanEvent(Base):
+    """
+    Scans des portiques, en ajout seul (app.utils.scan_events): écrits par lots, jamais modifiés.
+    Rangés par jour (index (day, id)): un jour est une plage contiguë de l'index, lue par la
+    consolidation (app.utils.attendance) et supprimée d'un bloc à l'expiration de la rétention.
+    Sur MySQL, la table peut être partitionnée par RANGE sur `day` sans changer le code.
+    Pas de clé étrangère: l'historique survit à la suppression de l'étudiant, l'insertion ne vérifie rien.
+    """
+    __tablename__ = "scan_events"
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    scanned_at = Column(DateTime, nullable=False)
+    id_etudiant = Column(Integer, nullable=True)
+    # Classe de l'étudiant au moment du scan (vide pour un code inconnu)
+    parcours = Column(String(20), nullable=False, default="")
+    niveau = Column(String(4), nullable=False, default="")
+    # accepted, identified (GET /etudiants/qrcode), expired, invalidated, unknown, forged
+    outcome = Column(String(12), nullable=False)
+
+    __table_args__ = (Index("ix_scan_events_day_id", "day", "id"),)
+
+
+class AttendanceDaily(Base):
+    """
+    Scans consolidés par jour et par classe (parcours, niveau), lus par les rapports de présence
+    """
+    __tablename__ = "attendance_daily"
+
+    day = Column(Date, primary_key=True)
+    parcours = Column(String(20), primary_key=True)
+    niveau = Column(String(4), primary_key=True)
+    scans = Column(Integer, nullable=False, default=0)
+    accepted = Column(Integer, nullable=False, default=0)
+    refused = Column(Integer, nullable=False, default=0)
+    # Étudiants distincts présents (scan accepté ou étudiant identifié)
+    students = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now)
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True)
+    to_email = Column(String(50))
+    subject = Column(String(200))
+    body = Column(Text)
+    # Donnée du code QR à joindre en PNG (rendu au moment de l'envoi)
+    qr_data = Column(String(255), nullable=True)
+    # pending -> sending -> sent | failed
+    status = Column(String(10), default="pending", index=True)
+    attempts = Column(Integer, default=0)
+    last_error = Column(String(255), nullable=True)
+    next_attempt_at = Column(DateTime, default=datetime.now, index=True)
+    # Réservation par un worker (statut "sending"): remise en file seulement une fois le bail expiré
+    claimed_at = Column(DateTime, nullable=True)
+    claimed_by = Column(String(64), nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    sent_at = Column(DateTime, nullable=True)
@@ -1,7 +1,7 @@
 from typing import Annotated, Union
 
-from datetime import datetime
-from pydantic import BaseModel, EmailStr, StringConstraints
+from datetime import date, datetime
+from pydantic import BaseModel, ConfigDict, EmailStr, StringConstraints, field_validator
 
 
 class QR_CodeBase(BaseModel):
@@ -18,8 +18,7 @@ class QR_CodeCreate(QR_CodeBase):
 class QR_Code(QR_CodeBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class EtudiantBase(BaseModel):
@@ -61,8 +60,46 @@ class Etudiant(EtudiantBase):
     id: int
     qrcode: Union[list[QR_Code], None] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ScanEtudiant(BaseModel):
+    # Uniquement les champs affichés par le portique
+    id: int
+    nom: str
+    prenom: str
+    matricule: str
+    parcours: str
+    niveau: str
+    annee_univ: str
+
+    # Construit depuis une ligne de requête (Row) ou une entrée de l'index des codes QR
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ScanVerification(BaseModel):
+    accepted: bool
+    reason: Union[str, None] = None
+    etudiant: Union[ScanEtudiant, None] = None
+
+
+class ScanBatch(BaseModel):
+    codes: list[str]
+
+
+class ScanBatchItem(ScanVerification):
+    data: str
+
+
+class ImportRowError(BaseModel):
+    line: int
+    errors: list[str]
+
+
+class ImportReport(BaseModel):
+    total: int = 0
+    created: int = 0
+    errors: list[ImportRowError] = []
 
 
 class OperatorBase(BaseModel):
@@ -79,15 +116,13 @@ class OperatorInDB(OperatorBase):
     id: int
     hashed_password: str
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class Operator(OperatorBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
         
 class OperatorUdpate(BaseModel):
     nom: Union[str, None] = None
@@ -113,10 +148,29 @@ class Journal(JournalBase):
     effectue_par: Operator
     etudiant: Union[Etudiant, str] = "Etudiant indisponible"
 
-    class Config:
-        orm_mode = True
+    @field_validator("etudiant", mode="before")
+    @classmethod
+    def etudiant_indisponible(cls, value):
+        # Opérations sans étudiant (import, suppression...)
+        return "Etudiant indisponible" if value is None else value
+
+    model_config = ConfigDict(from_attributes=True)
         
 
+class Email(BaseModel):
+    id: int
+    to_email: str
+    subject: str
+    status: str
+    attempts: int
+    last_error: Union[str, None] = None
+    next_attempt_at: Union[datetime, None] = None
+    created_at: datetime
+    sent_at: Union[datetime, None] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -124,3 +178,26 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     op_name: str
+
+
+class AttendanceDay(BaseModel):
+    day: date
+    parcours: str
+    niveau: str
+    scans: int
+    accepted: int
+    refused: int
+    students: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class AttendanceTotal(BaseModel):
+    parcours: str
+    niveau: str
+    days: int
+    scans: int
+    accepted: int
+    refused: int
+    # Présences journalières additionnées: un étudiant présent trois jours compte trois fois
+    student_days: int
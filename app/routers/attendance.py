@@ -0,0 +1,65 @@
+from datetime import date, timedelta
+from typing import Annotated, Union
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.utils.attendance import attendance_rollup
+from app.utils.auth import get_current_active_operator
+from app.utils.replica import get_read_db
+from app.utils.scan_events import scan_events
+
+from ..services import attendance as attendance_service
+from ..helpers import schemas
+
+
+router = APIRouter(
+    prefix="/attendance",
+    tags=["attendance"]
+)
+
+# Période par défaut des rapports (jours, jusqu'à aujourd'hui)
+DEFAULT_PERIOD_DAYS = 30
+
+
+def _period(debut: Union[date, None], fin: Union[date, None]) -> tuple[date, date]:
+    fin = fin or date.today()
+    debut = debut or fin - timedelta(days=DEFAULT_PERIOD_DAYS - 1)
+    if debut > fin:
+        raise HTTPException(status_code=422, detail="La date de début doit précéder la date de fin.")
+    return debut, fin
+
+
+@router.get("/", response_model=list[schemas.AttendanceDay])
+async def read_attendance(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
+                          debut: Union[date, None] = None, fin: Union[date, None] = None,
+                          parcours: Union[str, None] = None, niveau: Union[str, None] = None,
+                          db: AsyncSession = Depends(get_read_db)):
+    """Scans et présences par jour et par classe (compteurs consolidés, en retard d'au plus une consolidation)"""
+    return await attendance_service.get_daily(db, *_period(debut, fin), parcours=parcours, niveau=niveau)
+
+
+@router.get("/totals", response_model=list[schemas.AttendanceTotal])
+async def read_attendance_totals(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
+                                 debut: Union[date, None] = None, fin: Union[date, None] = None,
+                                 parcours: Union[str, None] = None, niveau: Union[str, None] = None,
+                                 db: AsyncSession = Depends(get_read_db)):
+    """Totaux de la période par classe"""
+    return await attendance_service.get_totals(db, *_period(debut, fin), parcours=parcours, niveau=niveau)
+
+
+@router.get("/stats")
+async def read_attendance_stats(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)]):
+    """Journal des scans (file d'écriture, purge) et consolidation"""
+    return {"scan_events": scan_events.stats(), "rollup": attendance_rollup.stats()}
+
+
+@router.post("/rollup")
+async def rollup_attendance(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
+                            day: Union[date, None] = None):
+    """Consolide un jour tout de suite (par défaut aujourd'hui), par exemple après un rattrapage"""
+    day = day or date.today()
+    if day < scan_events.cutoff():
+        raise HTTPException(status_code=422,
+                            detail="Scans de ce jour purgés (rétention dépassée): ses compteurs ne sont pas recalculés.")
+    await scan_events.flush()
+    return {"day": day, "rows": await attendance_rollup.fold(day)}
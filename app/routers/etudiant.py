@@ -1,11 +1,14 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from typing import Annotated, Literal, Union
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.utils import badges, pagination
 from app.utils.auth import get_current_active_operator
+from app.utils.replica import get_read_db, use_primary
 
 from ..services import etudiant as etudiant_service
-from ..helpers.database import SessionLocal
+from ..helpers.database import AsyncSessionLocal, ReplicaSessionLocal
 from ..helpers import schemas
 
 
@@ -16,32 +19,79 @@ router = APIRouter(
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 @router.get("/", response_model=list[schemas.Etudiant])
 async def read_etudiants(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
-                         skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    etudiants = etudiant_service.get_all(db, skip=skip, limit=limit)
+                         response: Response, skip: int = 0, limit: int = 100, cursor: Union[str, None] = None,
+                         sort: Literal["id", "matricule"] = "id", order: Literal["asc", "desc"] = "asc",
+                         parcours: Union[str, None] = None, niveau: Union[str, None] = None,
+                         annee_univ: Union[str, None] = None, db: AsyncSession = Depends(get_read_db)):
+    """
+    Pagination par curseur: le curseur de la page suivante est renvoyé dans l'en-tête X-Next-Cursor
+    (absent sur la dernière page). `skip` garde l'ancienne pagination par décalage.
+    """
+    filters = {"parcours": parcours, "niveau": niveau, "annee_univ": annee_univ}
+    if skip:
+        return await etudiant_service.get_all(db, skip=skip, limit=limit, sort=sort, order=order, **filters)
+
+    try:
+        etudiants, next_cursor = await etudiant_service.get_page(db, limit=limit, cursor=cursor,
+                                                                 sort=sort, order=order, **filters)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
     return etudiants
 
 
+@router.get("/export/badges")
+async def export_badges(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
+                        request: Request, parcours: Union[str, None] = None, niveau: Union[str, None] = None,
+                        annee_univ: Union[str, None] = None, format: Literal["zip", "pdf"] = "zip"):
+    """
+    Badges d'une classe: ZIP de PNG ou PDF multipage, rendus en parallèle et envoyés au fil de l'eau.
+    Le débit (images/s) figure dans rapport.json (ZIP) ou dans les métadonnées du PDF.
+    """
+    stats = badges.ExportStats()
+    session_factory = AsyncSessionLocal if use_primary(request) else ReplicaSessionLocal
+
+    async def content():
+        # Session propre au flux: celle des dépendances est fermée avant l'envoi de la réponse
+        async with session_factory() as db:
+            rows = etudiant_service.stream_badges(db, parcours=parcours, niveau=niveau, annee_univ=annee_univ)
+            rendered = badges.render_badges(rows, stats)
+            stream = badges.zip_stream if format == "zip" else badges.pdf_stream
+            async for chunk in stream(rendered, stats):
+                yield chunk
+
+    classe = "_".join(value for value in (parcours, niveau, annee_univ) if value) or "tous"
+    return StreamingResponse(
+        content(),
+        media_type="application/zip" if format == "zip" else "application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="badges_{classe}.{format}"'}
+    )
+
+
 @router.get("/{user_im}", response_model=schemas.Etudiant)
-async def read_etudiant(im: str, db: Session = Depends(get_db)):
-    etudiant = etudiant_service.get_by_im(db, im)
+async def read_etudiant(im: str, db: AsyncSession = Depends(get_read_db)):
+    etudiant = await etudiant_service.get_by_im(db, im)
     if etudiant is None:
         raise HTTPException(status_code=404, detail="Le numéro matricule n'existe pas.")
     return etudiant
 
 
-@router.get("/qrcode/{qcode_data}", response_model=schemas.Etudiant)
-async def read_etudiant_by_qrcode(qcode_data: str, db: Session = Depends(get_db)):
-    etudiant = etudiant_service.get_by_qrcode(db, qcode_data)
+@router.get("/qrcode/{qcode_data}", response_model=schemas.ScanEtudiant, response_class=ORJSONResponse)
+async def read_etudiant_by_qrcode(qcode_data: str, db: AsyncSession = Depends(get_db)):
+    """
+    Étudiant d'un code QR scanné: champs affichés au scan seulement (fiche complète par le matricule).
+    Lu sur le primaire, comme /qrcode/verify: le résultat remplit le cache des scans, une réplique
+    en retard y mettrait un étudiant modifié ou supprimé.
+    """
+    etudiant = await etudiant_service.get_by_qrcode(db, qcode_data)
     if etudiant is None:
         raise HTTPException(status_code=404, detail="Aucun étudiant associé au code QR.")
     return etudiant
@@ -49,32 +99,49 @@ async def read_etudiant_by_qrcode(qcode_data: str, db: Session = Depends(get_db)
 
 @router.post("/", response_model=schemas.Etudiant)
 async def create_etudiant(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
-                          etudiant: schemas.EtudiantCreate, db: Session = Depends(get_db)):
+                          etudiant: schemas.EtudiantCreate, db: AsyncSession = Depends(get_db)):
     #     Vérifier d'abord si l'étudiant existe déjà dans la base de donnée
-    is_present = etudiant_service.get_by_im(db=db, im=etudiant.matricule) or \
-        etudiant_service.get_by_cin(db=db, cin=etudiant.cin) # type: ignore
-    if is_present:
+    if await etudiant_service.exists(db, im=etudiant.matricule, cin=etudiant.cin):
         raise HTTPException(status_code=400, detail="L'étudiant existe déja.")
 
-    return etudiant_service.create(db, etudiant, current_op)
+    return await etudiant_service.create(db, etudiant, current_op)
+
+
+@router.post("/import", response_model=schemas.ImportReport)
+async def import_etudiants(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
+                           request: Request, send_email: bool = True, db: AsyncSession = Depends(get_db)):
+    """
+    Import en masse depuis un flux CSV (text/csv, avec en-tête) ou JSON lines (application/x-ndjson).
+    Retourne le nombre d'étudiants créés et les erreurs ligne par ligne.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        file_format = "csv"
+    elif "ndjson" in content_type or "jsonl" in content_type or "json-seq" in content_type:
+        file_format = "jsonl"
+    else:
+        raise HTTPException(status_code=415, detail="Formats acceptés: text/csv ou application/x-ndjson.")
+
+    rows = etudiant_service.parse_rows(request.stream(), file_format)
+    return await etudiant_service.bulk_create(db, rows, current_op, send_email=send_email)
 
 
 @router.put("/{id_etudiant}", response_model=schemas.Etudiant)
 async def update_etudiant(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
-                          id_etudiant: int, etudiant_to_update: schemas.EtudiantUpdate, db: Session = Depends(get_db)):
-    is_present = etudiant_service.get_by_id(db, id_etudiant)
+                          id_etudiant: int, etudiant_to_update: schemas.EtudiantUpdate, db: AsyncSession = Depends(get_db)):
+    is_present = await etudiant_service.get_by_id(db, id_etudiant)
     if not is_present:
         raise HTTPException(status_code=404, detail="Étudiant non enregistré.")
       
     # effacer les clés à valeurs vides
     etudiant_to_update_dict = etudiant_to_update.model_dump(exclude_unset=True)
-    return etudiant_service.update(db, id_etudiant=id_etudiant, etudiant_param=etudiant_to_update_dict, operateur=current_op)
+    return await etudiant_service.update(db, id_etudiant=id_etudiant, etudiant_param=etudiant_to_update_dict, operateur=current_op)
 
 
 @router.delete("/{id_etudiant}")
 async def delete_etudiant(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
-                          id_etudiant: int, db: Session = Depends(get_db)):
-    is_present = etudiant_service.get_by_id(db, id_etudiant)
+                          id_etudiant: int, db: AsyncSession = Depends(get_db)):
+    is_present = await etudiant_service.get_by_id(db, id_etudiant)
     if not is_present:
         raise HTTPException(status_code=404, detail="Étudiant non enregistré.")
-    return etudiant_service.delete(db, id_etudiant, operateur=current_op)
\ No newline at end of file
+    return await etudiant_service.delete(db, id_etudiant, operateur=current_op)
\ No newline at end of file
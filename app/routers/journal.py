@@ -1,11 +1,19 @@
+import asyncio
+import time
 from datetime import datetime
+from typing import Literal, Union
 from typing_extensions import Annotated
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.helpers import schemas
-from app.helpers.database import SessionLocal
-from app.utils.auth import get_current_active_operator
+from app.helpers.database import AsyncSessionLocal, ReplicaSessionLocal
+from app.utils import export, pagination
+from app.utils.auth import get_current_active_operator, get_websocket_operator
+from app.utils.journal_feed import DROPPED, journal_feed
+from app.utils.journal_writer import journal_buffer
+from app.utils.replica import get_read_db, use_primary
 
 from ..services import journal as journal_service
 
@@ -17,56 +25,190 @@ router = APIRouter(
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
         
         
 @router.get("/", response_model=list[schemas.Journal])
 async def read_journals(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
-                        skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    journals = journal_service.get_all(db, skip=skip, limit=limit)
+                        response: Response, skip: int = 0, limit: int = 100, cursor: Union[str, None] = None,
+                        sort: Literal["date", "id"] = "id", order: Literal["asc", "desc"] = "asc",
+                        id_operator: Union[int, None] = None, im_etudiant: Union[str, None] = None,
+                        debut: Union[datetime, None] = None, fin: Union[datetime, None] = None,
+                        db: AsyncSession = Depends(get_read_db)):
+    """
+    Opérations dans l'ordre d'écriture (sort=date&order=desc: les plus récentes d'abord). Pagination
+    par curseur: le curseur de la page suivante est renvoyé dans l'en-tête X-Next-Cursor. `skip` garde
+    l'ancienne pagination par décalage, sur le même ordre par défaut.
+    """
+    filters = {"id_operator": id_operator, "im_etudiant": im_etudiant, "debut": debut, "fin": fin}
+    if skip:
+        return await journal_service.get_all(db, skip=skip, limit=limit, sort=sort, order=order, **filters)
+
+    try:
+        journals, next_cursor = await journal_service.get_page(db, limit=limit, cursor=cursor,
+                                                               sort=sort, order=order, **filters)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
     return journals
 
 
-@router.get("/{id_operation}", response_model=schemas.Journal)
-async def read_journal(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
-                       id_operation: int, db: Session = Depends(get_db)):
-    journal = journal_service.get_by_id(db, id_operation)
-    if journal is None:
-        raise HTTPException(status_code=404, detail="Opération non enregistrée.")
-    return journal
+@router.get("/buffer/stats")
+async def read_journal_buffer_stats(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)]):
+    """Métriques du tampon d'écriture du journal (profondeur de file, durée des écritures)"""
+    return journal_buffer.stats()
 
 
+# Déclarées avant /{id_operation}, qui les masquerait sinon
 @router.get("/date", response_model=list[schemas.Journal])
 async def read_journals_by_date(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
-                                debut: datetime, fin: datetime|None = None, db: Session = Depends(get_db)):
+                                debut: datetime, fin: datetime|None = None, db: AsyncSession = Depends(get_read_db)):
     if fin is None:
-        journals = journal_service.get_by_date(db, debut)
+        journals = await journal_service.get_by_date(db, debut)
     else:
-        journals = journal_service.get_by_date(db, debut, fin)
+        journals = await journal_service.get_by_date(db, debut, fin)
     
     return journals
 
 
+@router.get("/export")
+async def export_journals(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
+                          request: Request, debut: Union[datetime, None] = None, fin: Union[datetime, None] = None,
+                          id_operator: Union[int, None] = None, im_etudiant: Union[str, None] = None,
+                          format: Literal["csv", "ndjson"] = "csv"):
+    """
+    Export du journal en CSV ou NDJSON, envoyé au fil de la lecture: la mémoire utilisée
+    ne dépend pas de la période demandée.
+    """
+    session_factory = AsyncSessionLocal if use_primary(request) else ReplicaSessionLocal
+
+    async def content():
+        # Session propre au flux: celle des dépendances est fermée avant l'envoi de la réponse
+        async with session_factory() as db:
+            rows = journal_service.stream_export(db, debut=debut, fin=fin,
+                                                 id_operator=id_operator, im_etudiant=im_etudiant)
+            async for chunk in export.STREAMS[format](rows, journal_service.EXPORT_COLUMNS):
+                yield chunk
+
+    periode = "_".join(value.date().isoformat() for value in (debut, fin) if value) or "complet"
+    return StreamingResponse(
+        content(),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="journal_{periode}.{format}"'}
+    )
+
+
+@router.get("/feed/stats")
+async def read_journal_feed_stats(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)]):
+    """Abonnés du flux du journal, opérations diffusées et abonnés abandonnés"""
+    return journal_feed.stats()
+
+
+@router.get("/feed")
+async def journal_events(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
+                         id_operator: Union[int, None] = None, im_etudiant: Union[str, None] = None,
+                         last_id: Union[int, None] = None,
+                         last_event_id: Annotated[Union[int, None], Header()] = None):
+    """
+    Flux des nouvelles opérations (Server-Sent Events), filtré par opérateur ou étudiant.
+    Reprise après `last_id` (ou l'en-tête Last-Event-ID envoyé par EventSource à la reconnexion).
+    Un client trop lent reçoit l'événement `dropped` et doit se reconnecter.
+    """
+    subscription = await journal_feed.subscribe(id_operator, im_etudiant,
+                                                last_id if last_id is not None else last_event_id)
+
+    async def content():
+        try:
+            async for feed_event in subscription.events():
+                if feed_event is None:
+                    yield b": ping\n\n"
+                elif feed_event is DROPPED:
+                    yield b"event: dropped\ndata: {}\n\n"
+                else:
+                    yield f"id: {feed_event.id}\nevent: journal\ndata: {feed_event.payload}\n\n".encode()
+        finally:
+            journal_feed.unsubscribe(subscription)
+
+    return StreamingResponse(content(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.websocket("/ws")
+async def journal_channel(websocket: WebSocket, id_operator: Union[int, None] = None,
+                          im_etudiant: Union[str, None] = None, last_id: Union[int, None] = None,
+                          authorization: Annotated[Union[str, None], Header()] = None):
+    """
+    Flux des nouvelles opérations sur WebSocket (même contenu que /journal/feed), pour les navigateurs:
+    jeton dans le premier message {"token": ...}. Un client trop lent est déconnecté (code 1013).
+    """
+    await websocket.accept()
+    authenticated = await get_websocket_operator(websocket, authorization)
+    if authenticated is None:
+        return
+    _, expires_at = authenticated
+    subscription = await journal_feed.subscribe(id_operator, im_etudiant, last_id)
+
+    async def receive():
+        # Détecte la déconnexion du client (aucun message attendu)
+        while True:
+            await websocket.receive_text()
+
+    async def send():
+        async for feed_event in subscription.events():
+            if expires_at is not None and time.time() >= expires_at:
+                await websocket.close(code=1008, reason="Token expiré.")
+                return
+            if feed_event is DROPPED:
+                await websocket.close(code=1013, reason="Client trop lent: reconnexion avec last_id.")
+                return
+            if feed_event is not None:
+                await websocket.send_text(feed_event.payload)
+
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(send())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        journal_feed.unsubscribe(subscription)
+    for task in done:
+        if not task.cancelled() and not isinstance(task.exception(), (WebSocketDisconnect, type(None))):
+            raise task.exception()  # type: ignore
+
+
+@router.get("/{id_operation}", response_model=schemas.Journal)
+async def read_journal(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
+                       id_operation: int, db: AsyncSession = Depends(get_read_db)):
+    journal = await journal_service.get_by_id(db, id_operation)
+    if journal is None:
+        raise HTTPException(status_code=404, detail="Opération non enregistrée.")
+    return journal
+
+
 @router.post("/", response_model=schemas.Journal)
 async def create_journal(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
-                         journal: schemas.JournalCreate, db: Session = Depends(get_db)):
-    """Insertion dans le journal"""
+                         journal: schemas.JournalCreate, synchronous: bool = True,
+                         db: AsyncSession = Depends(get_db)):
+    """
+    Insertion dans le journal.
+    synchronous=false: écriture différée si le tampon est actif (réponse 202 sans l'opération créée)
+    """
     journal_schema_to_db = schemas.JournalToDB(
         id_operator=current_op.id,
         **journal.model_dump()
     )
-    journal = journal_service.create(db, journal_schema_to_db)
+    journal = await journal_service.create(db, journal_schema_to_db, synchronous=synchronous)
+    if journal is None:
+        return JSONResponse(status_code=202, content={"message": "Opération mise en file d'écriture"})
     return journal
 
 
 
 @router.delete("/{id_operation}")
 async def delete_journal(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
-                         id_operation: int, db: Session = Depends(get_db)):
+                         id_operation: int, db: AsyncSession = Depends(get_db)):
     """Suppression d'une opération"""
-    return journal_service.delete(db, id_operation)
\ No newline at end of file
+    return await journal_service.delete(db, id_operation)
\ No newline at end of file
@@ -0,0 +1,51 @@
+from typing import Annotated, Union
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.utils.auth import get_current_active_operator
+
+from ..services import mail as mail_service
+from ..helpers.database import AsyncSessionLocal
+from ..helpers import schemas
+
+
+router = APIRouter(
+    prefix="/mail",
+    tags=["mail"]
+)
+
+
+# Dependency
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+@router.get("/", response_model=list[schemas.Email])
+async def read_emails(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
+                      status: Union[str, None] = None, skip: int = 0, limit: int = 100,
+                      db: AsyncSession = Depends(get_db)):
+    """Emails de l'outbox, filtrés par statut (pending, sending, sent, failed)"""
+    return await mail_service.get_all(db, status=status, skip=skip, limit=limit)
+
+
+@router.get("/{id_email}", response_model=schemas.Email)
+async def read_email(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
+                     id_email: int, db: AsyncSession = Depends(get_db)):
+    """Statut de livraison d'un email"""
+    db_email = await mail_service.get_by_id(db, id_email)
+    if db_email is None:
+        raise HTTPException(status_code=404, detail="Email introuvable.")
+    return db_email
+
+
+@router.post("/{id_email}/retry", response_model=schemas.Email)
+async def retry_email(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
+                      id_email: int, db: AsyncSession = Depends(get_db)):
+    """Relance d'un email échoué (statut "failed" seulement)"""
+    if await mail_service.get_by_id(db, id_email) is None:
+        raise HTTPException(status_code=404, detail="Email introuvable.")
+    db_email = await mail_service.retry(db, id_email)
+    if db_email is None:
+        raise HTTPException(status_code=409, detail="Seul un email en échec peut être relancé.")
+    return db_email
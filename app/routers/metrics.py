@@ -0,0 +1,20 @@
+import hmac
+from typing import Union
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import Response
+
+from app.utils import metrics
+
+router = APIRouter(
+    tags=["metrics"]
+)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def read_metrics(authorization: Union[str, None] = Header(default=None)):
+    """Métriques du processus au format texte Prometheus"""
+    if metrics.METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {metrics.METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Jeton de métriques invalide.",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -7,12 +7,14 @@ from dotenv import load_dotenv
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from typing_extensions import Annotated
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError
 
 from app.utils.auth import authenticate_operator, create_token, get_current_active_operator
+from app.utils.cache import operator_cache
+from app.utils.hasher import PasswordPoolBusy, password_hasher
 
-from..helpers.database import SessionLocal
+from..helpers.database import AsyncSessionLocal
 from ..services import operator as operator_service
 from app.helpers import schemas
 
@@ -28,24 +30,26 @@ ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")) # type: ignore
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS")) # type: ignore
 
+PASSWORD_POOL_BUSY = "Trop de connexions simultanées, veuillez réessayer."
+
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 @router.post("/token", response_model=schemas.Token)
-def login_for_access_token(response: Response, 
-                           db: Session = Depends(get_db), 
-                           form_data: OAuth2PasswordRequestForm = Depends()
-                           ):
+async def login_for_access_token(response: Response, 
+                                 db: AsyncSession = Depends(get_db), 
+                                 form_data: OAuth2PasswordRequestForm = Depends()
+                                 ):
     """
     login pour avoir un token d'acces
     """
-    operator = authenticate_operator(form_data.username, form_data.password, db)
+    try:
+        operator = await authenticate_operator(form_data.username, form_data.password, db)
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail=PASSWORD_POOL_BUSY, headers={"Retry-After": "1"})
     if not operator:
         raise HTTPException(
             status_code=401,
@@ -65,7 +69,7 @@ def login_for_access_token(response: Response,
     )
     
     # Mettre à jour le refresh token de l'Operator
-    operator_service.update(db, operator.__dict__["id"], {"refresh_token": refresh_token})
+    await operator_service.update(db, operator.__dict__["id"], {"refresh_token": refresh_token})
     
     response.set_cookie(
         key="refresh_token", 
@@ -79,7 +83,7 @@ def login_for_access_token(response: Response,
 
 
 @router.post("/refresh_token")
-def refresh_token(request: Request, db: Session = Depends(get_db)):
+async def refresh_token(request: Request, db: AsyncSession = Depends(get_db)):
     """
     rafraîchir le token d'accès
     """
@@ -103,7 +107,7 @@ def refresh_token(request: Request, db: Session = Depends(get_db)):
             )
         
         # Récuperer l'operateur de la BD
-        operator = operator_service.get_operator(db, operator_name)
+        operator = await operator_service.get_operator(db, operator_name)
         if operator.refresh_token != refresh_token: # type: ignore
             raise HTTPException(
                 status_code=401, 
@@ -131,20 +135,39 @@ async def read_operator_me(
     return current_op
 
 
+@router.get("/operator/cache/stats")
+async def read_operator_cache_stats(
+    current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)]
+    ):
+    """Compteurs du cache des opérateurs authentifiés (hits, misses, taille)"""
+    return operator_cache.stats()
+
+
+@router.get("/operator/password/stats")
+async def read_password_hasher_stats(
+    current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)]
+    ):
+    """Pool de hachage des mots de passe: file, refus, latences (attente comprise)"""
+    return password_hasher.stats()
+
+
 @router.post("/operator")
 async def create_operator(
     operator: schemas.OperatorCreate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
     ):
-    db_operator = operator_service.create(db, operator)
+    try:
+        db_operator = await operator_service.create(db, operator)
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail=PASSWORD_POOL_BUSY, headers={"Retry-After": "1"})
     return db_operator
 
 
 @router.post("/logout", response_model=Any)
 async def logout(
     current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
     ):
-    operator_service.update(db, current_op.id, {"refresh_token": None})
+    await operator_service.update(db, current_op.id, {"refresh_token": None})
     return {"message": "Vous avez été déconnecté"}
     
\ No newline at end of file
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import time
+from typing import Annotated, Literal, Union
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.utils.auth import get_current_active_operator, get_websocket_operator
+from app.utils import qr_signing, renderer
+from app.utils.cache import scan_cache
+from app.utils.qr_index import qr_index
+from app.utils.replica import get_read_db
+
+from ..services import qrcode as qrcode_service
+from ..helpers.database import AsyncSessionLocal
+from ..helpers import schemas
+
+
+router = APIRouter(
+    prefix="/qrcode",
+    tags=["qrcode"]
+)
+
+
+# Dependency
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+@router.get("/cache/stats")
+async def read_scan_cache_stats(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)]):
+    """Compteurs du cache des scans (hits, misses, taille)"""
+    return scan_cache.stats()
+
+
+@router.get("/index/stats")
+async def read_qr_index_stats(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)]):
+    """État de l'index des codes QR en mémoire: entrées, empreinte mémoire, rafraîchissements"""
+    return qr_index.stats()
+
+
+@router.get("/image/cache/stats")
+async def read_image_cache_stats(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)]):
+    """Compteurs du cache des images rendues"""
+    return renderer.image_cache.stats()
+
+
+@router.get("/keys")
+async def read_signing_keys(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)]):
+    """Clés de signature des codes QR (identifiants seulement): clé active et clés acceptées"""
+    return {"active": qr_signing.QR_SIGNING_KEY_ID or None, "accepted": list(qr_signing.QR_SIGNING_KEYS)}
+
+
+@router.get("/image/{id_etudiant}")
+async def read_qrcode_image(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
+                            id_etudiant: int,
+                            format: Literal["png", "svg"] = "png",
+                            box_size: Annotated[int, Query(ge=1, le=40)] = 10,
+                            border: Annotated[int, Query(ge=0, le=20)] = 4,
+                            if_none_match: Annotated[Union[str, None], Header()] = None,
+                            db: AsyncSession = Depends(get_read_db)):
+    """Image (PNG ou SVG) du code QR actuel d'un étudiant, pour réimprimer un badge"""
+    qcode = await qrcode_service.get_current(db, id_etudiant)
+    if qcode is None:
+        raise HTTPException(status_code=404, detail="Aucun code QR valide pour cet étudiant.")
+
+    image_format = format.upper()
+    key = renderer.etag(qcode.data, image_format, box_size, border)
+    headers = {"ETag": f'"{key}"', "Cache-Control": "private, max-age=3600"}
+    # Le client a déjà cette image: pas de rendu
+    if if_none_match is not None and key in if_none_match:
+        return Response(status_code=304, headers=headers)
+
+    _, image = await renderer.render(qcode.data, image_format, box_size, border)
+    return Response(content=image, media_type=renderer.MEDIA_TYPES[image_format], headers=headers)
+
+
+@router.get("/verify/{qcode_data}", response_model=schemas.ScanVerification, response_class=ORJSONResponse)
+async def verify_qrcode(qcode_data: str, db: AsyncSession = Depends(get_db)):
+    """Décision du portique: accepté ou refusé, avec les champs à afficher"""
+    return await qrcode_service.verify(db, qcode_data)
+
+
+@router.post("/verify", response_model=list[schemas.ScanBatchItem], response_class=ORJSONResponse)
+async def verify_qrcodes(batch: schemas.ScanBatch, db: AsyncSession = Depends(get_db)):
+    """Vérification groupée des scans mis en mémoire tampon par un scanner hors ligne"""
+    if len(batch.codes) > qrcode_service.SCAN_BATCH_MAX:
+        raise HTTPException(status_code=413,
+                            detail=f"Au plus {qrcode_service.SCAN_BATCH_MAX} codes par requête.")
+    return await qrcode_service.verify_many(db, batch.codes)
+
+
+@router.websocket("/ws")
+async def scan_channel(websocket: WebSocket, authorization: Annotated[Union[str, None], Header()] = None):
+    """
+    Canal persistant d'un portique: authentification une seule fois (en-tête Authorization ou premier
+    message {"token": ...}), puis scans {"id": ..., "data": ...} envoyés sans attendre les réponses.
+    Les résultats {"id": ..., "accepted": ...} reviennent dans l'ordre d'envoi; les scans en attente
+    sont vérifiés par lots. Au-delà de SCAN_WINDOW scans en attente, la lecture est suspendue.
+    """
+    await websocket.accept()
+    authenticated = await get_websocket_operator(websocket, authorization)
+    if authenticated is None:
+        return
+    operator, expires_at = authenticated
+    await websocket.send_json({"type": "ready", "operator": operator.nom, "window": qrcode_service.SCAN_WINDOW})
+
+    pending: asyncio.Queue = asyncio.Queue(maxsize=qrcode_service.SCAN_WINDOW)
+
+    async def receive():
+        while True:
+            text = await websocket.receive_text()
+            if expires_at is not None and time.time() >= expires_at:
+                await websocket.close(code=1008, reason="Token expiré.")
+                return
+            try:
+                message = json.loads(text)
+            except ValueError:
+                message = None
+            # File pleine: attente, la connexion n'est plus lue (contre-pression)
+            await pending.put(message if isinstance(message, dict) else {})
+
+    async def verify():
+        while True:
+            batch = [await pending.get()]
+            while not pending.empty() and len(batch) < qrcode_service.SCAN_BATCH_MAX:
+                batch.append(pending.get_nowait())
+            codes = [message.get("data") for message in batch]
+            scanned = [code for code in codes if isinstance(code, str)]
+            results = iter(())
+            if scanned:
+                async with AsyncSessionLocal() as db:
+                    results = iter(await qrcode_service.verify_many(db, scanned))
+            for message, code in zip(batch, codes):
+                if isinstance(code, str):
+                    result = {"id": message.get("id"), **next(results).model_dump()}
+                else:
+                    result = {"id": message.get("id"),
+                              "error": 'Message invalide: {"id": ..., "data": "..."} attendu.'}
+                # orjson plutôt que send_json (json.dumps): chemin de chaque scan
+                await websocket.send_text(orjson.dumps(result).decode())
+
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(verify())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+    for task in done:
+        if not task.cancelled() and not isinstance(task.exception(), (WebSocketDisconnect, type(None))):
+            raise task.exception()  # type: ignore
+
+
+@router.put("/{qcode_data}/invalidate")
+async def invalidate_qrcode(current_op: Annotated[schemas.Operator, Depends(get_current_active_operator)],
+                            qcode_data: str, db: AsyncSession = Depends(get_db)):
+    """Invalidation d'un code QR perdu ou compromis"""
+    if not await qrcode_service.invalidate(db, qcode_data):
+        raise HTTPException(status_code=404, detail="Code QR inconnu.")
+    return {"message": "Code QR invalidé"}
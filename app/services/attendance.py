@@ -0,0 +1,46 @@
+from datetime import date
+from typing import Union
+
+from sqlalchemy import distinct, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..helpers import models
+
+
+def _filter(stmt, debut: date, fin: date, parcours: Union[str, None], niveau: Union[str, None]):
+    # Compteurs consolidés seulement (attendance_daily): jamais de lecture des scans bruts
+    stmt = stmt.filter(models.AttendanceDaily.day >= debut, models.AttendanceDaily.day <= fin)
+    if parcours is not None:
+        stmt = stmt.filter(models.AttendanceDaily.parcours == parcours)
+    if niveau is not None:
+        stmt = stmt.filter(models.AttendanceDaily.niveau == niveau)
+    return stmt
+
+
+async def get_daily(db: AsyncSession, debut: date, fin: date,
+                    parcours: Union[str, None] = None, niveau: Union[str, None] = None):
+    """
+    Scans et présences par jour et par classe
+    """
+    stmt = _filter(select(models.AttendanceDaily), debut, fin, parcours, niveau)
+    stmt = stmt.order_by(models.AttendanceDaily.day, models.AttendanceDaily.parcours, models.AttendanceDaily.niveau)
+    return (await db.scalars(stmt)).all()
+
+
+async def get_totals(db: AsyncSession, debut: date, fin: date,
+                     parcours: Union[str, None] = None, niveau: Union[str, None] = None):
+    """
+    Totaux de la période par classe
+    """
+    daily = models.AttendanceDaily
+    stmt = select(
+        daily.parcours,
+        daily.niveau,
+        func.count(distinct(daily.day)).label("days"),
+        func.sum(daily.scans).label("scans"),
+        func.sum(daily.accepted).label("accepted"),
+        func.sum(daily.refused).label("refused"),
+        func.sum(daily.students).label("student_days"),
+    )
+    stmt = _filter(stmt, debut, fin, parcours, niveau).group_by(daily.parcours, daily.niveau)
+    return (await db.execute(stmt.order_by(daily.parcours, daily.niveau))).all()
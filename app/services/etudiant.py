@@ -1,44 +1,66 @@
 import base64
+import codecs
+import csv
 from datetime import datetime, timedelta
-from typing import Type, Union
-from uuid import uuid1, uuid4
+import os
+from typing import AsyncIterator, Type, Union
+from uuid import uuid1
 import zlib
 
-from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from sqlalchemy import delete as sql_delete, insert, inspect, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload, selectinload
 import json
 
-from app.services.qrcode import generate_qr_code, send_email
+from app.utils import pagination, qr_signing
+from app.utils.cache import scan_cache
+from app.utils.qr_index import INDEXED_FIELDS, qr_index, record_changes
+from app.utils.scan_events import scan_events
 
 from ..helpers import models, schemas
 from ..services import journal as journal_service
-from ..services import qrcode as qrcode_service
+from ..services import mail as mail_service
 
+load_dotenv()
 
-def create(db: Session, 
-           etudiant: schemas.EtudiantCreate, 
-           operateur: schemas.Operator):
+# Nombre de lignes insérées par transaction lors d'un import en masse
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+# Champs devant être uniques parmi les étudiants
+UNIQUE_FIELDS = ("matricule", "cin", "email")
+# Clés de tri de la liste des étudiants (colonnes indexées)
+SORT_COLUMNS = {"id": models.Etudiant.id, "matricule": models.Etudiant.matricule}
+
+
+async def create(db: AsyncSession, 
+                 etudiant: schemas.EtudiantCreate, 
+                 operateur: schemas.Operator):
     """
-    Création d'un étudiant et logger l'operation dans la base de donnée
+    Création d'un étudiant et logger l'operation dans la base de donnée.
+    Une seule transaction: étudiant, code QR, email (outbox) et journal sont validés ensemble.
     """
-    # Créer un étudiant
-    db_etudiant = models.Etudiant(**etudiant.model_dump())
+    # Créer un étudiant. La collection des codes QR est initialisée ici:
+    # elle reste chargée après le flush (pas de lazy loading en asynchrone)
+    db_etudiant = models.Etudiant(**etudiant.model_dump(), qrcode=[])
     db.add(db_etudiant)
-    db.commit()
-    db.refresh(db_etudiant)
-
-    # créer un code QR pour ce dernier
-    qr_code_data = str(db_etudiant.id) + "_" + str(uuid4())
-    qcode_dict = {
-        "id_etudiant": db_etudiant.id,
-        "expire_date": datetime.now() + timedelta(days=365),
-        "is_valid": True,
-        "data": qr_code_data,
-        "created_at": datetime.now()
-    }
-    db_qcode = models.QR_Code(**qcode_dict)
-    db.add(db_qcode)
-    db.commit() 
-    
+    # flush: l'id est attribué par la base sans valider la transaction
+    await db.flush()
+
+    # créer un code QR signé pour ce dernier
+    expire_date = datetime.now() + timedelta(days=365)
+    qr_code_data = qr_signing.new_payload(db_etudiant.id, expire_date)
+    db_etudiant.qrcode.append(models.QR_Code(
+        expire_date=expire_date,
+        is_valid=True,
+        data=qr_code_data,
+        created_at=datetime.now()
+    ))
+
+    # Envoyer le QR code à l'@ email de l'étudiant: mis en file d'attente,
+    # envoyé en arrière-plan par le worker (app.utils.mailer)
+    await mail_service.enqueue_qr_code(db, to_email=db_etudiant.email, qr_data=qr_code_data)
+
     # Insertion dans le journal
     creation_journal = schemas.JournalCreate(
         operation="Création d'un étudiant",
@@ -46,24 +68,26 @@ def create(db: Session,
         im_etudiant=db_etudiant.matricule
     )
     insert_into_journal(current_op=operateur, journal=creation_journal, db=db)
+    await db.commit()
+    qr_index.notify()
 
-    # Rafraîchir avant de retourner vers la route
-    db.refresh(db_etudiant)
-    db.refresh(db_qcode)
-    
-    # Envoyer le QR code à l'@ email de l'étudiant
-    qr_code_image = generate_qr_code(qr_code_data)
-    send_email(to_email=db_etudiant.email, qr_code_image=qr_code_image)
-
+    # expire_on_commit=False: l'objet (et ses codes QR) reste utilisable sans nouvelle requête
     return db_etudiant
 
 
-def update(db: Session, id_etudiant: int, etudiant_param: dict, operateur: schemas.Operator):
-    db.query(models.Etudiant).filter(models.Etudiant.id == id_etudiant)\
-        .update(etudiant_param)
-    db.commit()
-    
-    db_etudiant = get_by_id(db, id_etudiant)
+async def update(db: AsyncSession, id_etudiant: int, etudiant_param: dict, operateur: schemas.Operator):
+    """
+    Modification d'un étudiant et insertion dans le journal, dans une seule transaction
+    """
+    # L'étudiant a déjà été chargé par la route: récupéré depuis la session, sans requête
+    db_etudiant = await _get_loaded(db, id_etudiant)
+    for key, value in etudiant_param.items():
+        setattr(db_etudiant, key, value)
+    # Champs affichés au portique modifiés: à propager aux index des autres processus
+    indexed_change = INDEXED_FIELDS.intersection(etudiant_param)
+    if indexed_change:
+        record_changes(db, (qcode.data for qcode in db_etudiant.qrcode))
+
     #insertion dans le journal
     update_journal = schemas.JournalCreate(
         operation="Modification d'un étudiant",
@@ -71,67 +95,366 @@ def update(db: Session, id_etudiant: int, etudiant_param: dict, operateur: schem
         im_etudiant=db_etudiant.matricule
     )
     insert_into_journal(current_op=operateur, journal=update_journal, db=db)
+    await db.commit()
 
+    # Les scans en cache ne doivent plus renvoyer l'ancienne version
+    scan_cache.invalidate(*(qcode.data for qcode in db_etudiant.qrcode))
+    if indexed_change:
+        qr_index.notify()
     return db_etudiant
 
 
-def delete(db: Session, id_etudiant: int, operateur: schemas.Operator):
+async def delete(db: AsyncSession, id_etudiant: int, operateur: schemas.Operator):
     """
-    Suppression d'un étudiant et insertion dans le journal
+    Suppression d'un étudiant et insertion dans le journal, dans une seule transaction
     """
     # Récuperer d'abord l'immatricule de l'étudiant avant de le supprimer
-    db_etudiant = get_by_id(db, id_etudiant).__dict__
-    db.query(models.Etudiant).filter(models.Etudiant.id == id_etudiant).delete()
-    db.commit()
-    
-    # insertion dans le journal
+    db_etudiant = await _get_loaded(db, id_etudiant)
+    qcodes = [qcode.data for qcode in db_etudiant.qrcode]
     delete_journal = schemas.JournalCreate(
-        operation=f"Suppression de {db_etudiant['nom']} {db_etudiant['prenom']} IM: {db_etudiant['matricule']} classe: {db_etudiant['niveau']} {db_etudiant['parcours']} année: {db_etudiant['annee_univ']}",
+        operation=f"Suppression de {db_etudiant.nom} {db_etudiant.prenom} IM: {db_etudiant.matricule} classe: {db_etudiant.niveau} {db_etudiant.parcours} année: {db_etudiant.annee_univ}",
         date=datetime.now()
     )
+
+    # Les codes QR sont supprimés en cascade par la base (ON DELETE CASCADE)
+    record_changes(db, qcodes)
+    await db.execute(sql_delete(models.Etudiant).filter(models.Etudiant.id == id_etudiant))
+    # insertion dans le journal
     insert_into_journal(current_op=operateur, journal=delete_journal, db=db)
+    await db.commit()
 
+    scan_cache.invalidate(*qcodes)
+    qr_index.notify()
     return json.dumps({"message": "Étudiant supprimé avec succès"})
 
 
-def get_by_id(db: Session, id_etudiant: int) -> models.Etudiant:
-    return db.query(models.Etudiant).filter(models.Etudiant.id == id_etudiant).first()
+async def _get_loaded(db: AsyncSession, id_etudiant: int) -> models.Etudiant:
+    # Session.get consulte d'abord la carte d'identité de la session: aucune requête
+    # si l'étudiant (avec ses codes QR) a déjà été chargé dans cette session
+    db_etudiant = await db.get(models.Etudiant, id_etudiant)
+    if db_etudiant is None or "qrcode" in inspect(db_etudiant).unloaded:
+        db_etudiant = await get_by_id(db, id_etudiant)
+    return db_etudiant
+
+
+def _select_etudiant():
+    # schemas.Etudiant sérialise les codes QR: chargement explicite (pas de lazy loading en asynchrone).
+    # selectinload pour une collection: une seule requête IN par page, sans multiplier les lignes.
+    # raiseload: toute autre relation lue par erreur lève une exception au lieu d'une requête par ligne
+    return select(models.Etudiant).options(selectinload(models.Etudiant.qrcode), raiseload("*"))
+
+
+async def bulk_create(db: AsyncSession,
+                      rows: AsyncIterator[tuple[int, Union[dict, None], Union[str, None]]],
+                      operateur: schemas.Operator,
+                      send_email: bool = True) -> schemas.ImportReport:
+    """
+    Import en masse d'étudiants: validation ligne par ligne, détection des doublons
+    par requêtes ensemblistes et insertions groupées par paquets de IMPORT_CHUNK_SIZE
+    """
+    report = schemas.ImportReport()
+    seen: dict[str, set] = {field: set() for field in UNIQUE_FIELDS}
+    chunk: list[tuple[int, schemas.EtudiantCreate]] = []
+
+    async for line, raw, error in rows:
+        report.total += 1
+        if error is not None:
+            report.errors.append(schemas.ImportRowError(line=line, errors=[error]))
+            continue
+        try:
+            chunk.append((line, schemas.EtudiantCreate.model_validate(raw)))
+        except ValidationError as e:
+            report.errors.append(schemas.ImportRowError(
+                line=line,
+                errors=[f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()]
+            ))
+            continue
+
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            report.created += await _import_chunk(db, chunk, seen, report, send_email)
+            chunk = []
+    if chunk:
+        report.created += await _import_chunk(db, chunk, seen, report, send_email)
+    report.errors.sort(key=lambda row_error: row_error.line)
+
+    # Une seule entrée de journal pour tout l'import
+    import_journal = schemas.JournalCreate(
+        operation=f"Import de {report.created} étudiant(s), {len(report.errors)} ligne(s) rejetée(s)",
+        date=datetime.now()
+    )
+    insert_into_journal(current_op=operateur, journal=import_journal, db=db)
+    await db.commit()
+
+    return report
+
+
+async def _import_chunk(db: AsyncSession,
+                        chunk: list[tuple[int, schemas.EtudiantCreate]],
+                        seen: dict[str, set],
+                        report: schemas.ImportReport,
+                        send_email: bool) -> int:
+    # Doublons déjà en base: une requête IN par champ unique
+    existing: dict[str, set] = {}
+    for field in UNIQUE_FIELDS:
+        column = getattr(models.Etudiant, field)
+        values = {getattr(etudiant, field) for _, etudiant in chunk if getattr(etudiant, field)}
+        result = await db.execute(select(column).filter(column.in_(values)))
+        existing[field] = set(result.scalars().all())
+
+    accepted: list[schemas.EtudiantCreate] = []
+    for line, etudiant in chunk:
+        # Doublons en base ou plus haut dans le fichier
+        duplicates = [
+            field for field in UNIQUE_FIELDS
+            if getattr(etudiant, field) and (getattr(etudiant, field) in existing[field]
+                                             or getattr(etudiant, field) in seen[field])
+        ]
+        if duplicates:
+            report.errors.append(schemas.ImportRowError(
+                line=line,
+                errors=[f"{field}: {getattr(etudiant, field)} existe déjà" for field in duplicates]
+            ))
+            continue
+        for field in UNIQUE_FIELDS:
+            if getattr(etudiant, field):
+                seen[field].add(getattr(etudiant, field))
+        accepted.append(etudiant)
+
+    if not accepted:
+        return 0
+
+    await db.execute(insert(models.Etudiant), [etudiant.model_dump() for etudiant in accepted])
+    # Récupérer les identifiants attribués (RETURNING n'est pas disponible sous MySQL)
+    result = await db.execute(
+        select(models.Etudiant.matricule, models.Etudiant.id)
+        .filter(models.Etudiant.matricule.in_([etudiant.matricule for etudiant in accepted]))
+    )
+    ids = dict(result.tuples().all())
+
+    now = datetime.now()
+    qcodes = [{
+        "id_etudiant": ids[etudiant.matricule],
+        "expire_date": now + timedelta(days=365),
+        "is_valid": True,
+        "data": qr_signing.new_payload(ids[etudiant.matricule], now + timedelta(days=365)),
+        "created_at": now,
+    } for etudiant in accepted]
+    await db.execute(insert(models.QR_Code), qcodes)
+
+    if send_email:
+        await mail_service.enqueue_qr_codes(db, [
+            (etudiant.email, qcode["data"]) for etudiant, qcode in zip(accepted, qcodes)
+        ])
+    await db.commit()
+    qr_index.notify()
+    return len(accepted)
+
+
+async def stream_badges(db: AsyncSession,
+                        parcours: Union[str, None] = None,
+                        niveau: Union[str, None] = None,
+                        annee_univ: Union[str, None] = None):
+    """
+    Étudiants d'une classe avec leur code QR actuel, lus par paquets (curseur serveur)
+    """
+    stmt = select(
+        models.Etudiant.id,
+        models.Etudiant.nom,
+        models.Etudiant.prenom,
+        models.Etudiant.matricule,
+        models.Etudiant.parcours,
+        models.Etudiant.niveau,
+        models.Etudiant.annee_univ,
+        models.QR_Code.data,
+    ).join(models.QR_Code, models.QR_Code.id_etudiant == models.Etudiant.id)\
+        .filter(models.QR_Code.is_valid == True)
+    if parcours is not None:
+        stmt = stmt.filter(models.Etudiant.parcours == parcours)
+    if niveau is not None:
+        stmt = stmt.filter(models.Etudiant.niveau == niveau)
+    if annee_univ is not None:
+        stmt = stmt.filter(models.Etudiant.annee_univ == annee_univ)
+    stmt = stmt.order_by(models.Etudiant.matricule, models.Etudiant.id, models.QR_Code.id.desc())
+
+    last_id = None
+    result = await db.stream(stmt.execution_options(yield_per=500))
+    async for row in result:
+        # Plusieurs codes valides: seul le plus récent est imprimé
+        if row.id != last_id:
+            last_id = row.id
+            yield row
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # Découpe un flux d'octets en lignes sans le charger entièrement en mémoire
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line + "\n"
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+async def parse_rows(chunks: AsyncIterator[bytes], file_format: str):
+    """
+    Lit un flux CSV (avec en-tête) ou JSON lines.
+    Produit des triplets (numéro de ligne, ligne en dict, erreur de lecture).
+    """
+    line_no = 0
+    if file_format == "jsonl":
+        async for line in _iter_lines(chunks):
+            line_no += 1
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, None, f"JSON invalide: {e.msg}"
+                continue
+            if not isinstance(raw, dict):
+                yield line_no, None, "JSON invalide: un objet est attendu"
+                continue
+            yield line_no, raw, None
+        return
+
+    header = None
+    pending, start = "", 0
+    async for line in _iter_lines(chunks):
+        line_no += 1
+        if not pending:
+            start = line_no
+        pending += line
+        # Un champ entre guillemets peut contenir un retour à la ligne
+        if pending.count('"') % 2:
+            continue
+        record, pending = pending, ""
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [value.strip() for value in values]
+            continue
+        if len(values) != len(header):
+            yield start, None, f"{len(values)} colonnes au lieu de {len(header)}"
+            continue
+        # Champ vide -> None pour les champs optionnels (cin, cin_date)
+        yield start, {key: (value if value != "" else None) for key, value in zip(header, values)}, None
+
+
+async def get_by_id(db: AsyncSession, id_etudiant: int) -> models.Etudiant:
+    result = await db.execute(_select_etudiant().filter(models.Etudiant.id == id_etudiant))
+    return result.scalars().first()
+
+
+async def get_by_im(db: AsyncSession, im: str) -> models.Etudiant:
+    result = await db.execute(_select_etudiant().filter(models.Etudiant.matricule == im))
+    return result.scalars().first()
 
 
-def get_by_im(db: Session, im: str) -> models.Etudiant:
-    return db.query(models.Etudiant).filter(models.Etudiant.matricule == im).first()
+def _select_page(sort: str, order: str, after: Union[tuple, None] = None,
+                 parcours: Union[str, None] = None, niveau: Union[str, None] = None,
+                 annee_univ: Union[str, None] = None):
+    stmt = _select_etudiant()
+    if parcours is not None:
+        stmt = stmt.filter(models.Etudiant.parcours == parcours)
+    if niveau is not None:
+        stmt = stmt.filter(models.Etudiant.niveau == niveau)
+    if annee_univ is not None:
+        stmt = stmt.filter(models.Etudiant.annee_univ == annee_univ)
+    return pagination.keyset(stmt, SORT_COLUMNS[sort], models.Etudiant.id, after, order == "desc")
 
 
-def get_all(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Etudiant)\
-        .offset(skip).limit(limit).all()
+async def get_all(db: AsyncSession, skip: int = 0, limit: int = 100,
+                  sort: str = "id", order: str = "asc", **filters):
+    """
+    Pagination par décalage (OFFSET): le coût augmente avec la profondeur de la page
+    """
+    result = await db.execute(_select_page(sort, order, **filters)
+                              .offset(skip).limit(limit))
+    return result.scalars().all()
 
 
-def get_by_cin(db: Session, cin: str):
-    return db.query(models.Etudiant).filter(models.Etudiant.cin == cin).first()
+async def get_page(db: AsyncSession, limit: int = 100, cursor: Union[str, None] = None,
+                   sort: str = "id", order: str = "asc", **filters):
+    """
+    Pagination par curseur (keyset) sur (clé de tri, id): coût constant quelle que soit la page.
+    Retourne (étudiants, curseur de la page suivante ou None). Lève pagination.InvalidCursor.
+    """
+    after = pagination.decode_cursor(cursor, sort, order, SORT_COLUMNS[sort]) if cursor else None
+    result = await db.execute(_select_page(sort, order, after, **filters).limit(limit + 1))
+    return pagination.page(result.scalars().all(), limit, sort, order,
+                           key=lambda db_etudiant: (getattr(db_etudiant, sort), db_etudiant.id))
 
 
-def get_by_qrcode(db: Session, qcode_data: str):
+async def exists(db: AsyncSession, im: str, cin: Union[str, None]) -> bool:
     """
-    Récupère l'étudiant associé à un code QR
+    Un étudiant porte-t-il déjà ce matricule ou ce CIN ? Une seule requête, sans chargement.
+    Un CIN absent n'est comparé à rien (plusieurs étudiants peuvent ne pas en avoir).
     """
-    # Rechercher d'abord le qr code dans la base de donnée
-    qcode = qrcode_service.get_by_data(db, qcode_data)
-    if qcode is not None:
-        return get_by_id(db, qcode.id_etudiant)
-    else:
+    condition = models.Etudiant.matricule == im
+    if cin is not None:
+        condition = or_(condition, models.Etudiant.cin == cin)
+    result = await db.execute(select(models.Etudiant.id).filter(condition).limit(1))
+    return result.first() is not None
+
+
+async def get_by_cin(db: AsyncSession, cin: str):
+    result = await db.execute(_select_etudiant().filter(models.Etudiant.cin == cin))
+    return result.scalars().first()
+
+
+def _select_scan_etudiant():
+    # Colonnes affichées au scan seulement (schemas.ScanEtudiant): une ligne, ni objet ORM ni codes QR
+    return select(*(getattr(models.Etudiant, name) for name in schemas.ScanEtudiant.model_fields))
+
+
+async def get_by_qrcode(db: AsyncSession, qcode_data: str) -> Union[schemas.ScanEtudiant, None]:
+    """
+    Récupère l'étudiant associé à un code QR; le scan est journalisé (étudiant identifié ou code inconnu)
+    """
+    etudiant = await _find_by_qrcode(db, qcode_data)
+    scan_events.record(etudiant, "identified" if etudiant is not None else "unknown")
+    return etudiant
+
+
+async def _find_by_qrcode(db: AsyncSession, qcode_data: str) -> Union[schemas.ScanEtudiant, None]:
+    """
+    Étudiant associé à un code QR (servi depuis le cache si possible)
+    """
+    cached = scan_cache.get(qcode_data)
+    if cached is not None:
+        return cached
+    # Code signé contrefait: refusé sans requête
+    if qr_signing.is_signed(qcode_data):
+        try:
+            qr_signing.verify(qcode_data)
+        except qr_signing.InvalidPayload:
+            return None
+
+    result = await db.execute(_select_scan_etudiant()
+                              .join(models.QR_Code, models.QR_Code.id_etudiant == models.Etudiant.id)
+                              .filter(models.QR_Code.data == qcode_data).limit(1))
+    row = result.first()
+    if row is None:
         return None
+    etudiant = schemas.ScanEtudiant.model_validate(row)
+    scan_cache.set(qcode_data, etudiant)
+    return etudiant
 
 
 def insert_into_journal(current_op: schemas.Operator, 
                         journal: schemas.JournalCreate,
-                        db: Session):
+                        db: AsyncSession):
     """
-    Insertion dans le journal
+    Insertion dans le journal, dans la transaction de l'appelant (pas de commit ici)
     """
     journal_schema_to_db = schemas.JournalToDB(
         id_operator=current_op.id,
         **journal.model_dump()
     )
-    journal = journal_service.create(db, journal_schema_to_db)
+    journal = journal_service.add(db, journal_schema_to_db)
     return journal
\ No newline at end of file
@@ -1,38 +1,155 @@
 import json
+import os
 from typing import Union
 
 from datetime import datetime
-from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from sqlalchemy import delete as sql_delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, raiseload
 
 from ..helpers import models, schemas
+from ..utils import journal_feed, journal_writer, pagination
+from ..utils.journal_writer import journal_buffer
 
+load_dotenv()
+
+# Nombre de lignes lues par paquet lors d'un export du journal
+JOURNAL_EXPORT_BATCH = int(os.getenv("JOURNAL_EXPORT_BATCH", "1000"))
+# Colonnes de l'export (dans l'ordre de stream_export)
+EXPORT_COLUMNS = ["id", "date", "operation", "operateur", "im_etudiant", "nom_etudiant", "prenom_etudiant"]
+# Clés de tri de la liste des opérations (colonnes indexées)
+SORT_COLUMNS = {"date": models.Journal.date, "id": models.Journal.id}
+
+
+def _select_journal():
+    # Les relations sérialisées par schemas.Journal doivent être chargées avant
+    # la sortie de la session: le lazy loading n'est pas possible en asynchrone.
+    # joinedload pour les relations many-to-one (même requête, une ligne par opération),
+    # selectinload pour la collection des codes QR, raiseload pour tout le reste
+    return select(models.Journal).options(
+        joinedload(models.Journal.effectue_par),
+        joinedload(models.Journal.etudiant).selectinload(models.Etudiant.qrcode),
+        raiseload("*"),
+    )
+
+
+async def create(db: AsyncSession, operation: schemas.JournalToDB, synchronous: bool = False):
+    """
+    Insertion dans le journal. Si le tampon d'écriture est actif (JOURNAL_BUFFERED),
+    l'opération est mise en file et None est retourné, sauf si `synchronous` est demandé.
+    """
+    if not synchronous and journal_buffer.running:
+        journal_buffer.enqueue(operation)
+        return None
+
+    db_journal = models.Journal(**operation.model_dump())
+    db.add(db_journal)
+    journal_feed.mark_written(db)
+    await db.commit()
+
+    return await get_by_id(db, db_journal.id)
+
+
+def add(db: AsyncSession, operation: schemas.JournalToDB):
+    """
+    Ajoute l'opération à la transaction de l'appelant, sans commit: elle est écrite
+    (ou mise dans le tampon d'écriture) si et seulement si cette transaction est validée.
+    """
+    if journal_buffer.running:
+        journal_writer.defer(db, operation)
+        return None
 
-def create(db: Session, operation: schemas.JournalToDB):
     db_journal = models.Journal(**operation.model_dump())
     db.add(db_journal)
-    db.commit()
-    db.refresh(db_journal)
-    
+    journal_feed.mark_written(db)
     return db_journal
 
 
-def get_by_id(db: Session, id_operation: int):
-    return db.query(models.Journal).filter(models.Journal.id == id_operation).first()
+async def get_by_id(db: AsyncSession, id_operation: int):
+    result = await db.execute(_select_journal().filter(models.Journal.id == id_operation))
+    return result.scalars().first()
+
+
+def _select_page(sort: str, order: str, after: Union[tuple, None] = None,
+                 id_operator: Union[int, None] = None, im_etudiant: Union[str, None] = None,
+                 debut: Union[datetime, None] = None, fin: Union[datetime, None] = None):
+    stmt = _select_journal()
+    if id_operator is not None:
+        stmt = stmt.filter(models.Journal.id_operator == id_operator)
+    if im_etudiant is not None:
+        stmt = stmt.filter(models.Journal.im_etudiant == im_etudiant)
+    # La colonne est de type Date: comparaison sur le jour
+    if debut is not None:
+        stmt = stmt.filter(models.Journal.date >= debut.date())
+    if fin is not None:
+        stmt = stmt.filter(models.Journal.date <= fin.date())
+    return pagination.keyset(stmt, SORT_COLUMNS[sort], models.Journal.id, after, order == "desc")
+
+
+async def get_all(db: AsyncSession, skip: int = 0, limit: int = 100,
+                  sort: str = "id", order: str = "asc", **filters):
+    """
+    Pagination par décalage (OFFSET): le coût augmente avec la profondeur de la page
+    """
+    result = await db.execute(_select_page(sort, order, **filters)
+                              .offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+async def get_page(db: AsyncSession, limit: int = 100, cursor: Union[str, None] = None,
+                   sort: str = "id", order: str = "asc", **filters):
+    """
+    Pagination par curseur (keyset) sur (clé de tri, id): coût constant quelle que soit la page.
+    Retourne (opérations, curseur de la page suivante ou None). Lève pagination.InvalidCursor.
+    """
+    after = pagination.decode_cursor(cursor, sort, order, SORT_COLUMNS[sort]) if cursor else None
+    result = await db.execute(_select_page(sort, order, after, **filters).limit(limit + 1))
+    return pagination.page(result.scalars().all(), limit, sort, order,
+                           key=lambda db_journal: (getattr(db_journal, sort), db_journal.id))
+
+
+async def get_by_date(db: AsyncSession, debut: datetime, fin: Union[datetime, None] = None):
+    stmt = _select_journal().filter(models.Journal.date >= debut.date())
+    if fin is not None:
+        stmt = stmt.filter(models.Journal.date <= fin.date())
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
 
+async def stream_export(db: AsyncSession, debut: Union[datetime, None] = None, fin: Union[datetime, None] = None,
+                        id_operator: Union[int, None] = None, im_etudiant: Union[str, None] = None):
+    """
+    Opérations par ordre chronologique, lues par paquets de JOURNAL_EXPORT_BATCH (curseur serveur).
+    Projection limitée aux colonnes exportées: ni objets ORM ni schémas Pydantic en mémoire.
+    """
+    stmt = select(
+        models.Journal.id,
+        models.Journal.date,
+        models.Journal.operation,
+        models.Operator.nom.label("operateur"),
+        models.Journal.im_etudiant,
+        models.Etudiant.nom.label("nom_etudiant"),
+        models.Etudiant.prenom.label("prenom_etudiant"),
+    ).outerjoin(models.Operator, models.Operator.id == models.Journal.id_operator)\
+        .outerjoin(models.Etudiant, models.Etudiant.matricule == models.Journal.im_etudiant)
+    # La colonne est de type Date: comparaison sur le jour (index sur journals.date)
+    if debut is not None:
+        stmt = stmt.filter(models.Journal.date >= debut.date())
+    if fin is not None:
+        stmt = stmt.filter(models.Journal.date <= fin.date())
+    if id_operator is not None:
+        stmt = stmt.filter(models.Journal.id_operator == id_operator)
+    if im_etudiant is not None:
+        stmt = stmt.filter(models.Journal.im_etudiant == im_etudiant)
+    stmt = stmt.order_by(models.Journal.date, models.Journal.id)
 
-def get_all(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Journal)\
-        .offset(skip).limit(limit).all()
-        
+    result = await db.stream(stmt.execution_options(yield_per=JOURNAL_EXPORT_BATCH))
+    async for row in result:
+        yield row
 
-def get_by_date(db: Session, debut: datetime, fin: Union[datetime, None] = None):
-    if fin is None:
-        return db.query(models.Journal).filter(models.Journal.date >= debut).all()
-    else:
-        return db.query(models.Journal).filter(models.Journal.date >= debut).filter(models.Journal.date <= fin).all()
-    
 
-def delete(db: Session, id_operation: int):
-    db.query(models.Journal).filter(models.Journal.id == id_operation).delete()
-    db.commit()
-    return json.dumps({"message": "Opération supprimée avec succès"})
\ No newline at end of file
+async def delete(db: AsyncSession, id_operation: int):
+    await db.execute(sql_delete(models.Journal).filter(models.Journal.id == id_operation))
+    await db.commit()
+    return json.dumps({"message": "Opération supprimée avec succès"})
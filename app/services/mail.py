@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+import os
+from typing import Union
+
+from dotenv import load_dotenv
+from sqlalchemy import insert, or_, select, update as sql_update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..helpers import models
+from ..services.qrcode import generate_qr_code
+
+load_dotenv()
+
+SMTP_FROM = os.getenv("SMTP_FROM", "admin@pearl.com")
+# Nombre d'essais avant de marquer un email comme échoué
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+# Délai de base du backoff exponentiel (secondes)
+MAIL_RETRY_DELAY = float(os.getenv("MAIL_RETRY_DELAY", "30"))
+# Bail d'un lot réservé (secondes): au-delà, le worker est considéré arrêté et le lot remis en file.
+# Doit dépasser la durée d'envoi d'un lot (MAIL_BATCH_SIZE envois, SMTP_TIMEOUT chacun au pire)
+MAIL_CLAIM_LEASE = float(os.getenv("MAIL_CLAIM_LEASE", "900"))
+
+
+def _qr_code_email(to_email: str, qr_data: str) -> dict:
+    return {
+        "to_email": to_email,
+        "subject": "Votre Code QR",
+        "body": "Bonjour, voici votre code QR",
+        "qr_data": qr_data,
+        "status": "pending",
+        "attempts": 0,
+    }
+
+
+async def enqueue_qr_code(db: AsyncSession, to_email: str, qr_data: str):
+    """
+    Ajoute l'envoi du code QR d'un étudiant dans la file d'attente (outbox).
+    Pas de commit ici: l'email est enregistré avec la transaction de l'appelant.
+    """
+    db_email = models.EmailOutbox(**_qr_code_email(to_email, qr_data))
+    db.add(db_email)
+    return db_email
+
+
+async def enqueue_qr_codes(db: AsyncSession, recipients: list[tuple[str, str]]):
+    """
+    Version groupée de enqueue_qr_code (import en masse): un seul INSERT multi-lignes.
+    `recipients` contient des couples (email, donnée du code QR).
+    """
+    if not recipients:
+        return
+    now = datetime.now()
+    await db.execute(insert(models.EmailOutbox), [
+        {**_qr_code_email(to_email, qr_data), "next_attempt_at": now, "created_at": now}
+        for to_email, qr_data in recipients
+    ])
+
+
+def build_message(db_email: models.EmailOutbox) -> EmailMessage:
+    """
+    Construit le message à partir d'une ligne de l'outbox (rendu du QR compris)
+    """
+    msg = EmailMessage()
+    msg['Subject'] = db_email.subject
+    msg["From"] = SMTP_FROM
+    msg["To"] = db_email.to_email
+    msg.set_content(db_email.body)
+
+    if db_email.qr_data:
+        qr_code_image = generate_qr_code(db_email.qr_data)
+        msg.add_attachment(qr_code_image, maintype="image", subtype="png", filename="qr_code.png")
+    return msg
+
+
+async def claim_batch(db: AsyncSession, limit: int, worker_id: str) -> list[models.EmailOutbox]:
+    """
+    Réserve les prochains emails à envoyer (statut "sending", date et auteur de la réservation).
+    SKIP LOCKED permet à plusieurs workers de se partager la file sous MySQL.
+    """
+    result = await db.execute(
+        select(models.EmailOutbox)
+        .filter(models.EmailOutbox.status == "pending")
+        .filter(models.EmailOutbox.next_attempt_at <= datetime.now())
+        .order_by(models.EmailOutbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    batch = list(result.scalars().all())
+    now = datetime.now()
+    for db_email in batch:
+        db_email.status = "sending"
+        db_email.claimed_at = now
+        db_email.claimed_by = worker_id
+    await db.commit()
+    return batch
+
+
+def mark_result(db_email: models.EmailOutbox, error: Union[str, None]):
+    """
+    Met à jour le statut d'un email après une tentative d'envoi (backoff exponentiel en cas d'échec)
+    """
+    db_email.attempts += 1
+    if error is None:
+        db_email.status = "sent"
+        db_email.sent_at = datetime.now()
+        db_email.last_error = None
+    elif db_email.attempts >= MAIL_MAX_ATTEMPTS:
+        db_email.status = "failed"
+        db_email.last_error = error[:255]
+    else:
+        db_email.status = "pending"
+        db_email.last_error = error[:255]
+        db_email.next_attempt_at = datetime.now() + timedelta(
+            seconds=MAIL_RETRY_DELAY * 2 ** (db_email.attempts - 1)
+        )
+
+
+async def release_stale(db: AsyncSession) -> int:
+    """
+    Remet en file les emails restés en "sending" au-delà du bail (arrêt brutal pendant un envoi).
+    Les lots encore en cours d'envoi par un autre worker ne sont pas touchés.
+    """
+    result = await db.execute(sql_update(models.EmailOutbox)
+                              .filter(models.EmailOutbox.status == "sending")
+                              .filter(or_(models.EmailOutbox.claimed_at.is_(None),
+                                          models.EmailOutbox.claimed_at < datetime.now() - timedelta(seconds=MAIL_CLAIM_LEASE)))
+                              .values(status="pending", claimed_at=None, claimed_by=None))
+    await db.commit()
+    return result.rowcount
+
+
+async def get_by_id(db: AsyncSession, id_email: int):
+    result = await db.execute(select(models.EmailOutbox).filter(models.EmailOutbox.id == id_email))
+    return result.scalars().first()
+
+
+async def get_all(db: AsyncSession, status: Union[str, None] = None, skip: int = 0, limit: int = 100):
+    stmt = select(models.EmailOutbox)
+    if status is not None:
+        stmt = stmt.filter(models.EmailOutbox.status == status)
+    result = await db.execute(stmt.order_by(models.EmailOutbox.id.desc()).offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+async def retry(db: AsyncSession, id_email: int):
+    """
+    Relance manuelle d'un email échoué. None si l'email n'est pas (ou plus) en échec:
+    un email envoyé ou en cours d'envoi n'est jamais renvoyé.
+    """
+    result = await db.execute(sql_update(models.EmailOutbox)
+                              .filter(models.EmailOutbox.id == id_email, models.EmailOutbox.status == "failed")
+                              .values(status="pending", attempts=0, next_attempt_at=datetime.now()))
+    await db.commit()
+    if result.rowcount == 0:
+        return None
+    return await get_by_id(db, id_email)
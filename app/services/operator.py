@@ -1,44 +1,51 @@
 
 import json
-from sqlalchemy.orm import Session
+from sqlalchemy import delete as sql_delete, select, update as sql_update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.helpers import models
 from app.helpers import schemas
-from passlib.context import CryptContext
+from app.utils.cache import operator_cache
+from app.utils.hasher import password_hasher
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+async def get_operator(db: AsyncSession, op_name: str):
+    result = await db.execute(select(models.Operator).filter(models.Operator.nom == op_name))
+    return result.scalars().first()
 
-def get_operator(db:Session, op_name: str):
-    return db.query(models.Operator).filter(models.Operator.nom == op_name).first()
-
-def create(db: Session, op_param: schemas.OperatorCreate):
-    hashed_password = pwd_context.hash(op_param.password)
+async def create(db: AsyncSession, op_param: schemas.OperatorCreate):
+    # bcrypt est coûteux en CPU: calcul dans le pool de processus dédié (PasswordPoolBusy si plein)
+    hashed_password = await password_hasher.hash(op_param.password)
     db_operator = models.Operator(
         nom=op_param.nom,
         hashed_password=hashed_password,
     )
     db.add(db_operator)
-    db.commit()
-    db.refresh(db_operator)
+    await db.commit()
+    await db.refresh(db_operator)
     return schemas.Operator(**db_operator.__dict__)
 
 
-def update(db: Session, id_operator: int, data_to_update: dict):
-    db.query(models.Operator).filter(models.Operator.id == id_operator)\
-        .update(data_to_update)
-    db.commit()
-    return get_by_id(db, id_operator)
+async def update(db: AsyncSession, id_operator: int, data_to_update: dict):
+    await db.execute(sql_update(models.Operator).filter(models.Operator.id == id_operator)
+                     .values(data_to_update))
+    await db.commit()
+    # L'authentification ne doit plus servir l'ancienne version (nom, statut désactivé...)
+    operator_cache.invalidate_where(lambda operator: operator.id == id_operator)
+    return await get_by_id(db, id_operator)
 
 
-def get_by_id(db: Session, id_operator: int):
-    return db.query(models.Operator).filter(models.Operator.id == id_operator).first()
+async def get_by_id(db: AsyncSession, id_operator: int):
+    result = await db.execute(select(models.Operator).filter(models.Operator.id == id_operator))
+    return result.scalars().first()
 
 
-def delete(db: Session, id_operator: int):
-    db.query(models.Operator).filter(models.Operator.id == id_operator).delete()
-    db.commit()
+async def delete(db: AsyncSession, id_operator: int):
+    await db.execute(sql_delete(models.Operator).filter(models.Operator.id == id_operator))
+    await db.commit()
+    operator_cache.invalidate_where(lambda operator: operator.id == id_operator)
     return json.dumps({"message": "Opérateur supprimé avec succès"})
 
 
-def get_operators(db: Session):
-    return db.query(models.Operator).all()
+async def get_operators(db: AsyncSession):
+    result = await db.execute(select(models.Operator))
+    return result.scalars().all()
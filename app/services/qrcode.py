@@ -1,34 +1,187 @@
 import base64
-from email.message import EmailMessage
+from datetime import date
 import io
-import smtplib
+import os
+from typing import Union
 import qrcode
-from sqlalchemy.orm import Session
+from qrcode.image.svg import SvgPathImage
+from dotenv import load_dotenv
+from sqlalchemy import and_, delete as sql_delete, select, update as sql_update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..helpers import models, schemas
+from ..utils import qr_signing
+from ..utils.cache import scan_cache
+from ..utils.qr_index import qr_index, record_changes
+from ..utils.scan_events import scan_events
 
+load_dotenv()
 
-def create(db: Session, qcode: schemas.QR_CodeCreate):
-    db_qrcode = models.QR_Code(qcode)
+# Nombre maximal de codes par requête de vérification groupée
+SCAN_BATCH_MAX = int(os.getenv("SCAN_BATCH_MAX", "500"))
+# Scans reçus et pas encore traités par connexion WebSocket (/qrcode/ws): au-delà, la lecture de la
+# connexion est suspendue et le scanner ralenti par TCP
+SCAN_WINDOW = int(os.getenv("SCAN_WINDOW", "64"))
+
+# Motifs de refus et issue correspondante dans le journal des scans (scan_events.outcome)
+REFUSAL_OUTCOMES = {
+    "Code QR non authentique": "forged",
+    "Code QR expiré": "expired",
+    "Code QR invalidé": "invalidated",
+    "Code QR inconnu": "unknown",
+}
+
+
+async def create(db: AsyncSession, qcode: schemas.QR_CodeCreate):
+    db_qrcode = models.QR_Code(**qcode.model_dump())
     db.add(db_qrcode)
-    db.commit()
-    db.refresh(db_qrcode)
+    await db.commit()
+    await db.refresh(db_qrcode)
     return db_qrcode
 
 
-def delete(db: Session, identifiant: int):
-    return db.query(models.QR_Code).filter(models.QR_Code.id == identifiant).delete()
+async def delete(db: AsyncSession, identifiant: int):
+    qcode = await db.get(models.QR_Code, identifiant)
+    if qcode is not None:
+        scan_cache.invalidate(qcode.data)
+        record_changes(db, [qcode.data])
+    result = await db.execute(sql_delete(models.QR_Code).filter(models.QR_Code.id == identifiant))
+    return result.rowcount
+
+
+async def invalidate(db: AsyncSession, data: str):
+    """
+    Invalide un code QR (perdu, volé...) et le retire du cache des scans et de l'index
+    """
+    result = await db.execute(sql_update(models.QR_Code).filter(models.QR_Code.data == data)
+                              .values(is_valid=False))
+    if result.rowcount:
+        record_changes(db, [data])
+    await db.commit()
+    scan_cache.invalidate(data)
+    qr_index.revoke(data)
+    return result.rowcount
+
+async def get_by_data(db: AsyncSession, data: str):
+    result = await db.execute(select(models.QR_Code).filter(models.QR_Code.data == data))
+    return result.scalars().first()
+
+
+def _select_verification():
+    # Règles de validité évaluées en SQL: le code doit être valide et ne pas être expiré
+    today = date.today()
+    return select(
+        models.QR_Code.data,
+        models.QR_Code.is_valid,
+        (models.QR_Code.expire_date < today).label("expired"),
+        and_(models.QR_Code.is_valid == True, models.QR_Code.expire_date >= today).label("accepted"),
+        models.Etudiant.id,
+        models.Etudiant.nom,
+        models.Etudiant.prenom,
+        models.Etudiant.matricule,
+        models.Etudiant.parcours,
+        models.Etudiant.niveau,
+        models.Etudiant.annee_univ,
+    ).join(models.Etudiant, models.Etudiant.id == models.QR_Code.id_etudiant)
+
+
+async def get_current(db: AsyncSession, id_etudiant: int):
+    """
+    Code QR actuel d'un étudiant: le plus récent encore valide
+    """
+    result = await db.execute(select(models.QR_Code)
+                              .filter(models.QR_Code.id_etudiant == id_etudiant)
+                              .filter(models.QR_Code.is_valid == True)
+                              .order_by(models.QR_Code.id.desc()).limit(1))
+    return result.scalars().first()
+
+
+def check_signature(data: str) -> Union[schemas.ScanVerification, None]:
+    """
+    Contrôle d'un code signé sans la base: refus si la signature est fausse ou le code expiré.
+    None: code à vérifier en base (révocation, champs affichés) ou code historique non signé.
+    """
+    if not qr_signing.is_signed(data):
+        return None
+    try:
+        payload = qr_signing.verify(data)
+    except qr_signing.InvalidPayload:
+        return schemas.ScanVerification(accepted=False, reason="Code QR non authentique")
+    if payload.expire_date < date.today():
+        return schemas.ScanVerification(accepted=False, reason="Code QR expiré")
+    return None
+
+
+async def verify(db: AsyncSession, data: str) -> schemas.ScanVerification:
+    """
+    Vérification d'un scan: signature contrôlée d'abord, puis l'index en mémoire
+    (une seule requête indexée tant qu'il n'est pas chargé)
+    """
+    verification = check_signature(data)
+    if verification is None:
+        if qr_index.ready:
+            verification = scan_verification(await qr_index.lookup(data, force=qr_signing.is_signed(data)))
+        else:
+            stmt = _select_verification().filter(models.QR_Code.data == data).limit(1)
+            verification = scan_verification((await db.execute(stmt)).first())
+    record_scan(verification)
+    return verification
+
+
+async def verify_many(db: AsyncSession, codes: list[str]) -> list[schemas.ScanBatchItem]:
+    """
+    Vérification groupée (scans rejoués par un scanner hors ligne):
+    une seule requête IN pour les codes non refusés par la signature, résultats dans l'ordre reçu
+    """
+    rejected = {code: check_signature(code) for code in set(codes)}
+    lookup = [code for code, verification in rejected.items() if verification is None]
+    rows = {}
+    if qr_index.ready:
+        rows = {code: await qr_index.lookup(code, force=qr_signing.is_signed(code)) for code in lookup}
+    elif lookup:
+        stmt = _select_verification().filter(models.QR_Code.data.in_(lookup))
+        rows = {row.data: row for row in (await db.execute(stmt))}
+    items = [
+        schemas.ScanBatchItem(data=code, **(rejected[code] or scan_verification(rows.get(code))).model_dump())
+        for code in codes
+    ]
+    for item in items:
+        record_scan(item)
+    return items
+
+
+def record_scan(verification: schemas.ScanVerification):
+    """
+    Journalise la décision du portique (écriture différée, par lots)
+    """
+    outcome = "accepted" if verification.accepted else REFUSAL_OUTCOMES.get(verification.reason, "refused")
+    scan_events.record(verification.etudiant, outcome)
+
 
-def get_by_data(db: Session, data: str):
-    return db.query(models.QR_Code).filter(models.QR_Code.data == data).first()
+def scan_verification(row) -> schemas.ScanVerification:
+    """
+    Construit la réponse du portique à partir d'une ligne de la requête de vérification
+    """
+    if row is None:
+        return schemas.ScanVerification(accepted=False, reason="Code QR inconnu")
 
+    etudiant = schemas.ScanEtudiant.model_validate(row)
+    if row.accepted:
+        return schemas.ScanVerification(accepted=True, etudiant=etudiant)
+    reason = "Code QR expiré" if row.expired else "Code QR invalidé"
+    return schemas.ScanVerification(accepted=False, reason=reason, etudiant=etudiant)
 
-def generate_qr_code(data: str) -> bytes:
+
+def generate_qr_code(data: str, image_format: str = "PNG", box_size: int = 10, border: int = 4) -> bytes:
+    """
+    Rendu d'un code QR en PNG ou SVG.
+    Fonction de module (picklable): exécutée dans le pool de processus de app.utils.renderer.
+    """
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
+        box_size=box_size,
+        border=border,
     )
     # Add data to the QR code
     qr.add_data(data)
@@ -37,35 +190,11 @@ def generate_qr_code(data: str) -> bytes:
     # Create a bute buffer to store the image data
     img_buffer = io.BytesIO()
     
-    # Save the QR code as a PNG image(adjest format if needed)
-    qr.make_image(fill_color="black", back_color="white").save(img_buffer, format="PNG")
+    if image_format == "SVG":
+        qr.make_image(image_factory=SvgPathImage).save(img_buffer)
+    else:
+        # Save the QR code as a PNG image(adjest format if needed)
+        qr.make_image(fill_color="black", back_color="white").save(img_buffer, format="PNG")
     img_buffer.seek(0)
     
     return img_buffer.getvalue()
-
-
-def send_email(to_email: str, qr_code_image: bytes):
-    # Create the email content
-    msg = EmailMessage()
-    msg['Subject'] = 'Votre Code QR'
-    msg["From"] = 'admin@pearl.com'
-    msg["To"] = to_email
-    msg.set_content("Bonjour, voici votre code QR")
-    
-    # Attach the QR code image to the email
-    # qr_code_bas64 = base64.b64encode(qr_code_image).decode('ascii')
-    msg.add_attachment(qr_code_image, maintype="image", subtype="png", filename="qr_code.png")
-    
-    try:
-        smtp_server = 'smtp-srv.pearl.com'
-        smtp_port = 25
-        smtp_user = 'steevi'
-        smtp_password = 'tozlife3'
-
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            # server.starttls()  # Secure the connection
-            server.login(smtp_user, smtp_password)
-            server.send_message(msg)
-            print("Email sent successfully!")
-    except Exception as e:
-        print(f"Failed to send email: {e}")
\ No newline at end of file
@@ -0,0 +1,100 @@
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Union
+
+from dotenv import load_dotenv
+from sqlalchemy import case, delete as sql_delete, distinct, func, insert, literal, select
+
+from app.helpers import models
+from app.helpers.database import AsyncSessionLocal
+from app.utils.scan_events import ATTENDED_OUTCOMES, scan_events
+from app.utils.workers import BackgroundWorker
+
+load_dotenv()
+
+# Consolidation des scans en compteurs journaliers (table attendance_daily)
+ATTENDANCE_ROLLUP_ENABLED = os.getenv("ATTENDANCE_ROLLUP_ENABLED", "true").lower() == "true"
+# Le jour en cours est reconsolidé à cet intervalle (secondes): retard maximal des rapports
+ATTENDANCE_ROLLUP_INTERVAL = float(os.getenv("ATTENDANCE_ROLLUP_INTERVAL", "60"))
+
+
+def _select_rollup(day: date):
+    """
+    Compteurs d'un jour par classe, calculés par la base sur la plage du jour (index (day, id))
+    """
+    event = models.ScanEvent
+    accepted = event.outcome == "accepted"
+    attended = event.outcome.in_(ATTENDED_OUTCOMES)
+    return select(
+        event.day,
+        event.parcours,
+        event.niveau,
+        func.count(),
+        func.sum(case((accepted, 1), else_=0)),
+        func.sum(case((attended, 0), else_=1)),
+        func.count(distinct(case((attended, event.id_etudiant)))),
+        literal(datetime.now()),
+    ).filter(event.day == day).group_by(event.day, event.parcours, event.niveau)
+
+
+class AttendanceRollup(BackgroundWorker):
+    """
+    Consolidation des scans bruts en compteurs par jour et par classe. Un jour est recalculé en
+    entier (DELETE puis INSERT ... SELECT dans une transaction): l'opération est idempotente,
+    plusieurs processus peuvent la lancer sans compter deux fois un scan. Le jour en cours est
+    recalculé toutes les ATTENDANCE_ROLLUP_INTERVAL secondes, la veille une dernière fois après minuit.
+    """
+    description = "consolidation des scans"
+
+    def __init__(self, interval: float):
+        super().__init__(interval)
+        self._last_day: Union[date, None] = None
+        # Métriques
+        self.folds = 0
+        self.last_fold_ms = 0.0
+        self.last_fold_rows = 0
+
+    async def fold(self, day: date) -> int:
+        """
+        Recalcule les compteurs d'un jour. Retourne le nombre de lignes (classes) consolidées.
+        Jour sorti de la rétention: ses scans bruts sont purgés, les compteurs consolidés sont gardés tels quels.
+        """
+        if day < scan_events.cutoff():
+            return 0
+        started = time.perf_counter()
+        columns = ["day", "parcours", "niveau", "scans", "accepted", "refused", "students", "updated_at"]
+        async with AsyncSessionLocal() as db:
+            await db.execute(sql_delete(models.AttendanceDaily).filter(models.AttendanceDaily.day == day))
+            result = await db.execute(insert(models.AttendanceDaily).from_select(columns, _select_rollup(day)))
+            await db.commit()
+        self.folds += 1
+        self.last_fold_ms = (time.perf_counter() - started) * 1000
+        self.last_fold_rows = result.rowcount
+        return result.rowcount
+
+    async def tick(self):
+        today = date.today()
+        # Premier passage ou changement de jour: la veille est close, ses derniers scans sont comptés
+        if self._last_day != today:
+            await self.fold(today - timedelta(days=1))
+        await self.fold(today)
+        self._last_day = today
+
+    async def step(self) -> bool:
+        await self.tick()
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.running,
+            "interval": self.interval,
+            "last_day": self._last_day.isoformat() if self._last_day else None,
+            "folds": self.folds,
+            "failures": self.failures,
+            "last_fold_ms": round(self.last_fold_ms, 3),
+            "last_fold_rows": self.last_fold_rows,
+        }
+
+
+attendance_rollup = AttendanceRollup(interval=ATTENDANCE_ROLLUP_INTERVAL)
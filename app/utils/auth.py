@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta, UTC
+import json
 import os
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError
@@ -6,16 +7,16 @@ import jwt
 
 from typing import Annotated, Union
 from dotenv import load_dotenv
-from fastapi import Depends, HTTPException, Request, Response
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from fastapi import Depends, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.helpers import schemas
-from app.helpers.database import SessionLocal
+from app.helpers.database import AsyncSessionLocal
 from app.services import operator as operator_service
+from app.utils.cache import operator_cache
+from app.utils.hasher import password_hasher
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 load_dotenv()
@@ -26,34 +27,30 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")) # ty
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS")) # type: ignore
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
         
         
-def verify_password(plain_password, hashed_password):
-    """
-    Vérification de mot de passe
-    """
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def authenticate_operator(operator_name: str, password: str, db: Session):
+async def authenticate_operator(operator_name: str, password: str, db: AsyncSession):
     """
     Authentification de l'opérateur
     """
-    db_operator = operator_service.get_operator(db, operator_name)
+    db_operator = await operator_service.get_operator(db, operator_name)
     if not db_operator:
         return False
-    if not verify_password(password, db_operator.hashed_password):
+    # bcrypt est coûteux en CPU: vérification dans le pool de processus dédié.
+    # Lève PasswordPoolBusy si la file est pleine (la route répond 503)
+    valid, new_hash = await password_hasher.verify(password, db_operator.hashed_password)
+    if not valid:
         return False
+    if new_hash is not None:
+        # Coût bcrypt changé (BCRYPT_ROUNDS): l'empreinte est recalculée de façon transparente
+        await operator_service.update(db, db_operator.id, {"hashed_password": new_hash})
     
     return schemas.Operator(**db_operator.__dict__)
 
-async def get_current_operator(db: Annotated[Session, Depends(get_db)], token: Annotated[str, Depends(oauth2_scheme)]):
+async def get_current_operator(db: Annotated[AsyncSession, Depends(get_db)], token: Annotated[str, Depends(oauth2_scheme)]):
     """
     Récupération de l'opérateur courant
     """
@@ -67,11 +64,18 @@ async def get_current_operator(db: Annotated[Session, Depends(get_db)], token: A
     except (jwt.InvalidTokenError, jwt.exceptions.DecodeError):
         raise HTTPException(status_code=400, detail="Token non tay aminamany")
     
-    operator = operator_service.get_operator(db, token_data.op_name)
-    if operator is None:
+    # Opérateur en cache: aucune requête à la base pour les requêtes authentifiées suivantes
+    operator = operator_cache.get(token_data.op_name)
+    if operator is not None:
+        return operator
+
+    db_operator = await operator_service.get_operator(db, token_data.op_name)
+    if db_operator is None:
         raise HTTPException(status_code=404, detail="Opérateur non enregistré.")
     
-    return schemas.Operator(**operator.__dict__)
+    operator = schemas.Operator(**db_operator.__dict__)
+    operator_cache.set(token_data.op_name, operator)
+    return operator
 
 async def get_current_active_operator(
     current_op: Annotated[schemas.Operator, Depends(get_current_operator)]
@@ -83,6 +87,25 @@ async def get_current_active_operator(
         raise HTTPException(status_code=400, detail="Opérateur désactivé.")
     return current_op
 
+async def get_websocket_operator(websocket: WebSocket, authorization: Union[str, None]):
+    """
+    Authentification d'un canal WebSocket déjà accepté: en-tête Authorization ou premier message
+    {"token": ...}. Retourne (opérateur, expiration du jeton), ou None après fermeture (1008).
+    """
+    try:
+        token = authorization.removeprefix("Bearer ").strip() if authorization else None
+        if token is None:
+            token = json.loads(await websocket.receive_text()).get("token")
+        async with AsyncSessionLocal() as db:
+            operator = await get_current_active_operator(await get_current_operator(db, token))
+    except WebSocketDisconnect:
+        return None
+    except (HTTPException, ValueError, AttributeError) as e:
+        await websocket.close(code=1008, reason=getattr(e, "detail", "Authentification requise."))
+        return None
+    expires_at = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    return operator, expires_at
+
 def create_token(data: dict, expires_delta: timedelta):
     """
     Création d'un token
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+import zipfile
+from typing import AsyncIterator
+
+from dotenv import load_dotenv
+
+from app.services.qrcode import generate_qr_code
+from app.utils import renderer
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Nombre de badges rendus en parallèle (et gardés en mémoire) à la fois
+BADGE_EXPORT_WINDOW = int(os.getenv("BADGE_EXPORT_WINDOW", str(4 * renderer.RENDER_WORKERS)))
+
+# Format A6 (points PDF)
+PAGE_WIDTH, PAGE_HEIGHT = 298, 420
+QR_SIZE = 220
+
+
+class ExportStats:
+    """
+    Débit d'un export (images par seconde)
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.images = 0
+
+    def as_dict(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "images": self.images,
+            "seconds": round(elapsed, 3),
+            "images_per_second": round(self.images / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+async def render_badges(rows: AsyncIterator, stats: ExportStats,
+                        window: int = BADGE_EXPORT_WINDOW) -> AsyncIterator[tuple]:
+    """
+    Rendu parallèle des codes QR dans le pool de processus, par fenêtres de `window` étudiants:
+    au plus une fenêtre d'images en mémoire, ordre des étudiants conservé.
+    """
+    loop = asyncio.get_running_loop()
+    pool = renderer.get_pool()
+
+    async def flush(pending: list) -> list:
+        images = await asyncio.gather(*(
+            loop.run_in_executor(pool, generate_qr_code, row.data) for row in pending
+        ))
+        stats.images += len(images)
+        return list(zip(pending, images))
+
+    pending = []
+    async for row in rows:
+        pending.append(row)
+        if len(pending) >= window:
+            for item in await flush(pending):
+                yield item
+            pending = []
+    if pending:
+        for item in await flush(pending):
+            yield item
+
+
+class _StreamBuffer:
+    # Fichier en écriture seule (non positionnable) vidé après chaque badge
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def zip_stream(badges: AsyncIterator[tuple], stats: ExportStats) -> AsyncIterator[bytes]:
+    """
+    Archive ZIP produite au fil de l'eau: un PNG par étudiant puis un rapport JSON
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        async for row, image in badges:
+            filename = f"{row.matricule}_{row.nom}_{row.prenom}".replace("/", "-")
+            archive.writestr(f"{filename}.png", image)
+            yield buffer.drain()
+        archive.writestr("rapport.json", json.dumps(stats.as_dict()))
+    yield buffer.drain()
+    logger.info("Export ZIP des badges: %s", stats.as_dict())
+
+
+def _png_image(png: bytes) -> tuple[int, int, int, int, bytes]:
+    """
+    Extrait dimensions et flux IDAT d'un PNG non entrelacé: le flux est repris tel quel
+    dans le PDF (FlateDecode + prédicteur PNG), sans décodage de l'image
+    """
+    pos = 8
+    idat = []
+    width = height = bit_depth = color_type = 0
+    while pos < len(png):
+        length, kind = struct.unpack(">I4s", png[pos:pos + 8])
+        data = png[pos + 8:pos + 8 + length]
+        if kind == b"IHDR":
+            width, height, bit_depth, color_type = struct.unpack(">IIBB", data[:10])
+        elif kind == b"IDAT":
+            idat.append(data)
+        elif kind == b"IEND":
+            break
+        pos += 12 + length
+    colors = {0: 1, 2: 3}[color_type]
+    return width, height, bit_depth, colors, b"".join(idat)
+
+
+def _pdf_text(text: str) -> bytes:
+    # Chaîne PDF littérale (police standard, encodage WinAnsi)
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return b"(" + escaped.encode("cp1252", errors="replace") + b")"
+
+
+class _PdfWriter:
+    def __init__(self):
+        self.offset = 0
+        self.xref: dict[int, int] = {}
+
+    def obj(self, number: int, body: bytes) -> bytes:
+        data = b"%d 0 obj\n" % number + body + b"\nendobj\n"
+        self.xref[number] = self.offset
+        self.offset += len(data)
+        return data
+
+    def raw(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+
+async def pdf_stream(badges: AsyncIterator[tuple], stats: ExportStats) -> AsyncIterator[bytes]:
+    """
+    PDF multipage produit au fil de l'eau: une page A6 par badge.
+    La table xref et l'arbre des pages sont écrits à la fin.
+    """
+    writer = _PdfWriter()
+    # 1: catalogue, 2: arbre des pages, 3: police, 4: infos, puis 3 objets par page
+    yield writer.raw(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    yield writer.obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    yield writer.obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    pages = []
+    number = 5
+    async for row, png in badges:
+        width, height, bit_depth, colors, idat = _png_image(png)
+        image_id, content_id, page_id = number, number + 1, number + 2
+        number += 3
+
+        yield writer.obj(image_id, b"".join([
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d " % (width, height),
+            b"/ColorSpace /DeviceGray " if colors == 1 else b"/ColorSpace /DeviceRGB ",
+            b"/BitsPerComponent %d /Filter /FlateDecode " % bit_depth,
+            b"/DecodeParms << /Predictor 15 /Colors %d /BitsPerComponent %d /Columns %d >> " % (colors, bit_depth, width),
+            b"/Length %d >>\nstream\n" % len(idat), idat, b"\nendstream",
+        ]))
+        x = (PAGE_WIDTH - QR_SIZE) // 2
+        content = b"".join([
+            b"q %d 0 0 %d %d %d cm /Im0 Do Q\n" % (QR_SIZE, QR_SIZE, x, PAGE_HEIGHT - QR_SIZE - 40),
+            b"BT /F1 14 Tf 30 130 Td " + _pdf_text(f"{row.nom} {row.prenom}") + b" Tj ET\n",
+            b"BT /F1 12 Tf 30 105 Td " + _pdf_text(f"IM: {row.matricule}") + b" Tj ET\n",
+            b"BT /F1 12 Tf 30 85 Td " + _pdf_text(f"{row.niveau} {row.parcours} {row.annee_univ}") + b" Tj ET\n",
+        ])
+        yield writer.obj(content_id, b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        yield writer.obj(page_id, b"".join([
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] " % (PAGE_WIDTH, PAGE_HEIGHT),
+            b"/Resources << /Font << /F1 3 0 R >> /XObject << /Im0 %d 0 R >> >> " % image_id,
+            b"/Contents %d 0 R >>" % content_id,
+        ]))
+        pages.append(page_id)
+
+    kids = b" ".join(b"%d 0 R" % page for page in pages)
+    yield writer.obj(2, b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(pages))
+    yield writer.obj(4, b"<< /Title (Badges) /Subject " + _pdf_text(json.dumps(stats.as_dict())) + b" >>")
+
+    xref_offset = writer.offset
+    lines = [b"xref\n0 %d\n" % number, b"0000000000 65535 f \n"]
+    for i in range(1, number):
+        lines.append(b"%010d 00000 n \n" % writer.xref[i])
+    yield b"".join(lines)
+    yield b"trailer\n<< /Size %d /Root 1 0 R /Info 4 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (number, xref_offset)
+    logger.info("Export PDF des badges: %s", stats.as_dict())
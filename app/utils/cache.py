@@ -0,0 +1,88 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SCAN_CACHE_SIZE = int(os.getenv("SCAN_CACHE_SIZE", "10000"))
+# Les entrées modifiées par un autre processus sont évincées à la relecture de qrcode_changes par
+# l'index des codes QR (QR_INDEX_REFRESH_INTERVAL); sans index, seule la durée de vie les borne
+SCAN_CACHE_TTL = float(os.getenv("SCAN_CACHE_TTL", "300"))
+# Durée de vie courte: borne le délai de prise en compte d'une modification faite hors de ce
+# processus (autre worker, base modifiée directement)
+OPERATOR_CACHE_SIZE = int(os.getenv("OPERATOR_CACHE_SIZE", "1000"))
+OPERATOR_CACHE_TTL = float(os.getenv("OPERATOR_CACHE_TTL", "30"))
+
+
+class TTLCache:
+    """
+    Cache LRU borné avec durée de vie des entrées.
+    Utilisé depuis la boucle d'événements uniquement: pas de verrou nécessaire.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *keys: Hashable):
+        for key in keys:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Any], bool]):
+        # Parcours complet: réservé aux invalidations rares (modification d'un opérateur...)
+        for key in [key for key, (_, value) in self._data.items() if predicate(value)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+# Code QR scanné -> champs affichés par le portique (schemas.ScanEtudiant, projection des colonnes)
+scan_cache = TTLCache(maxsize=SCAN_CACHE_SIZE, ttl=SCAN_CACHE_TTL)
+
+# Nom d'opérateur (sujet du token) -> opérateur authentifié (schemas.Operator)
+operator_cache = TTLCache(maxsize=OPERATOR_CACHE_SIZE, ttl=OPERATOR_CACHE_TTL)
@@ -0,0 +1,48 @@
+import csv
+import io
+import json
+from typing import AsyncIterator
+
+# Taille visée des morceaux envoyés au client (octets)
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+async def csv_stream(rows: AsyncIterator, columns: list[str]) -> AsyncIterator[bytes]:
+    """
+    CSV avec en-tête, envoyé par morceaux d'environ EXPORT_CHUNK_SIZE octets.
+    Le BOM permet à Excel de reconnaître l'UTF-8.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    async for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+async def ndjson_stream(rows: AsyncIterator, columns: list[str]) -> AsyncIterator[bytes]:
+    """
+    Un objet JSON par ligne, envoyé par morceaux d'environ EXPORT_CHUNK_SIZE octets
+    """
+    lines: list[str] = []
+    size = 0
+    async for row in rows:
+        line = json.dumps(dict(zip(columns, row)), default=str, ensure_ascii=False)
+        lines.append(line)
+        size += len(line) + 1
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ("\n".join(lines) + "\n").encode()
+            lines.clear()
+            size = 0
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+STREAMS = {"csv": csv_stream, "ndjson": ndjson_stream}
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+
+load_dotenv()
+
+# Processus dédiés à bcrypt (par défaut: la moitié des coeurs, le reste sert les requêtes)
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(max(1, (os.cpu_count() or 1) // 2))))
+# Opérations acceptées à la fois (en cours + en attente): au-delà, refus immédiat (503)
+PASSWORD_QUEUE_SIZE = int(os.getenv("PASSWORD_QUEUE_SIZE", str(8 * PASSWORD_WORKERS)))
+# Coût bcrypt: les empreintes d'un autre coût sont recalculées à la connexion
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Nombre de mesures gardées pour les percentiles de latence
+PASSWORD_METRICS_WINDOW = 1000
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+class PasswordPoolBusy(Exception):
+    """File du pool de hachage pleine: la requête doit être refusée (503)"""
+
+
+def _hash(password: str) -> tuple[str, float]:
+    started = time.perf_counter()
+    return pwd_context.hash(password), time.perf_counter() - started
+
+
+def _verify(password: str, hashed_password: str) -> tuple[tuple[bool, Union[str, None]], float]:
+    # verify_and_update: nouvelle empreinte si le coût (ou le schéma) n'est plus celui configuré
+    started = time.perf_counter()
+    return pwd_context.verify_and_update(password, hashed_password), time.perf_counter() - started
+
+
+class PasswordHasher:
+    """
+    Pool de processus borné pour bcrypt: le calcul ne prend ni la boucle d'événements
+    ni les threads des routes synchrones. File limitée à PASSWORD_QUEUE_SIZE opérations.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._pool: Union[ProcessPoolExecutor, None] = None
+        self.in_flight = 0
+        # Métriques
+        self.max_in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self._latencies: deque[float] = deque(maxlen=PASSWORD_METRICS_WINDOW)
+        self._waits: deque[float] = deque(maxlen=PASSWORD_METRICS_WINDOW)
+
+    def get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def _run(self, function, *args):
+        if self.in_flight >= self.queue_size:
+            self.rejected += 1
+            raise PasswordPoolBusy()
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, compute = await loop.run_in_executor(self.get_pool(), function, *args)
+        finally:
+            self.in_flight -= 1
+        elapsed = time.perf_counter() - started
+        self.completed += 1
+        self._latencies.append(elapsed)
+        self._waits.append(max(0.0, elapsed - compute))
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> tuple[bool, Union[str, None]]:
+        """
+        Retourne (mot de passe correct, nouvelle empreinte à enregistrer ou None)
+        """
+        valid, new_hash = await self._run(_verify, password, hashed_password)
+        if new_hash is not None:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        def pick(samples, q: float) -> float:
+            if not samples:
+                return 0.0
+            ordered = sorted(samples)
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "latency_p50_ms": pick(self._latencies, 0.50),
+            "latency_p95_ms": pick(self._latencies, 0.95),
+            "latency_p99_ms": pick(self._latencies, 0.99),
+            "queue_wait_p50_ms": pick(self._waits, 0.50),
+            "queue_wait_p99_ms": pick(self._waits, 0.99),
+        }
+
+
+password_hasher = PasswordHasher(workers=PASSWORD_WORKERS, queue_size=PASSWORD_QUEUE_SIZE)
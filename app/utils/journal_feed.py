@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, NamedTuple, Union
+
+from dotenv import load_dotenv
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.helpers import models
+from app.helpers.database import AsyncSessionLocal
+from app.utils import pagination
+from app.utils.workers import BackgroundWorker
+
+load_dotenv()
+
+# Flux des opérations du journal (GET /journal/feed, /journal/ws)
+JOURNAL_FEED_ENABLED = os.getenv("JOURNAL_FEED_ENABLED", "true").lower() == "true"
+# Relecture des opérations écrites par les autres processus (secondes); immédiate pour ce processus
+JOURNAL_FEED_POLL_INTERVAL = float(os.getenv("JOURNAL_FEED_POLL_INTERVAL", "1"))
+# Opérations en attente par abonné: au-delà, l'abonné trop lent est déconnecté
+JOURNAL_FEED_QUEUE_SIZE = int(os.getenv("JOURNAL_FEED_QUEUE_SIZE", "100"))
+# Opérations rejouées au plus à la reprise (les plus récentes après le dernier id reçu)
+JOURNAL_FEED_BACKFILL = int(os.getenv("JOURNAL_FEED_BACKFILL", "500"))
+# Message vide envoyé sans activité (garde la connexion ouverte à travers les proxys)
+JOURNAL_FEED_HEARTBEAT = float(os.getenv("JOURNAL_FEED_HEARTBEAT", "15"))
+JOURNAL_FEED_BATCH = 1000
+JOURNAL_FEED_GAP_SECONDS = 60.0
+
+# Transaction ayant ajouté des opérations au journal (Session.info)
+_WRITTEN_KEY = "journal_written"
+
+
+class FeedEvent(NamedTuple):
+    id: int
+    id_operator: Union[int, None]
+    im_etudiant: Union[str, None]
+    # JSON sérialisé une seule fois, partagé par tous les abonnés
+    payload: str
+
+
+# Abonné déconnecté pour lenteur: fin du flux, le client reprend avec le dernier id reçu
+DROPPED = FeedEvent(0, None, None, "")
+
+
+def _select_events():
+    return select(
+        models.Journal.id,
+        models.Journal.date,
+        models.Journal.operation,
+        models.Journal.id_operator,
+        models.Operator.nom.label("operateur"),
+        models.Journal.im_etudiant,
+    ).outerjoin(models.Operator, models.Operator.id == models.Journal.id_operator)
+
+
+def _event(row) -> FeedEvent:
+    payload = json.dumps({
+        "id": row.id,
+        "date": row.date.isoformat() if row.date else None,
+        "operation": row.operation,
+        "id_operator": row.id_operator,
+        "operateur": row.operateur,
+        "im_etudiant": row.im_etudiant,
+    }, ensure_ascii=False)
+    return FeedEvent(row.id, row.id_operator, row.im_etudiant, payload)
+
+
+class Subscription:
+    """
+    Abonné au flux: filtres et file bornée. Une file pleine ne bloque jamais la diffusion:
+    l'abonné est abandonné (DROPPED).
+    """
+
+    def __init__(self, id_operator: Union[int, None], im_etudiant: Union[str, None], queue_size: int):
+        self.id_operator = id_operator
+        self.im_etudiant = im_etudiant
+        self.queue: asyncio.Queue[FeedEvent] = asyncio.Queue(maxsize=queue_size)
+        self.backlog: list[FeedEvent] = []
+        self.dropped = False
+
+    def matches(self, feed_event: FeedEvent) -> bool:
+        return ((self.id_operator is None or feed_event.id_operator == self.id_operator)
+                and (self.im_etudiant is None or feed_event.im_etudiant == self.im_etudiant))
+
+    def offer(self, feed_event: FeedEvent) -> bool:
+        if self.dropped:
+            return False
+        try:
+            self.queue.put_nowait(feed_event)
+            return True
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(DROPPED)
+            return False
+
+    async def events(self, heartbeat: float = JOURNAL_FEED_HEARTBEAT) -> AsyncIterator[Union[FeedEvent, None]]:
+        """
+        Opérations rejouées puis opérations en direct; None sans activité pendant `heartbeat` secondes.
+        Se termine par DROPPED si l'abonné a été abandonné.
+        """
+        replayed = {feed_event.id for feed_event in self.backlog}
+        for feed_event in self.backlog:
+            yield feed_event
+        self.backlog = []
+        while True:
+            try:
+                feed_event = await asyncio.wait_for(self.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if feed_event is DROPPED:
+                yield DROPPED
+                return
+            if feed_event.id not in replayed:
+                yield feed_event
+
+
+class JournalFeed(BackgroundWorker):
+    """
+    Diffusion des opérations du journal aux abonnés de ce processus. Une seule lecture incrémentale
+    (id > dernier id lu) par lot de nouvelles opérations, quel que soit le nombre d'abonnés;
+    aucune requête sans abonné.
+    """
+
+    description = "lecture du flux du journal"
+    # Position prise au premier abonnement: rien à lire au démarrage
+    run_at_start = False
+
+    def __init__(self, interval: float, queue_size: int):
+        super().__init__(interval)
+        self.queue_size = queue_size
+        self._subscribers: set[Subscription] = set()
+        self._watermark = pagination.Watermark(JOURNAL_FEED_GAP_SECONDS)
+        self._positioned = False
+        self._lock = asyncio.Lock()
+        # Métriques
+        self.peak_subscribers = 0
+        self.polls = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.last_poll_ms = 0.0
+
+    async def subscribe(self, id_operator: Union[int, None] = None, im_etudiant: Union[str, None] = None,
+                        last_id: Union[int, None] = None) -> Subscription:
+        """
+        Nouvel abonné. Avec `last_id`, les opérations suivantes (au plus JOURNAL_FEED_BACKFILL, les plus
+        récentes) sont rejouées avant le direct.
+        """
+        subscription = Subscription(id_operator, im_etudiant, self.queue_size)
+        async with self._lock, AsyncSessionLocal() as db:
+            # Position prise avant la relecture: rien n'est perdu entre rejeu et direct
+            if not self._positioned:
+                self._watermark.reset((await db.execute(select(func.max(models.Journal.id)))).scalar() or 0)
+                self._positioned = True
+            self._subscribers.add(subscription)
+            if last_id is not None:
+                subscription.backlog = await self._backfill(db, subscription, last_id)
+        self.peak_subscribers = max(self.peak_subscribers, len(self._subscribers))
+        return subscription
+
+    async def _backfill(self, db: AsyncSession, subscription: Subscription, last_id: int) -> list[FeedEvent]:
+        stmt = _select_events().filter(models.Journal.id > last_id)
+        if subscription.id_operator is not None:
+            stmt = stmt.filter(models.Journal.id_operator == subscription.id_operator)
+        if subscription.im_etudiant is not None:
+            stmt = stmt.filter(models.Journal.im_etudiant == subscription.im_etudiant)
+        rows = (await db.execute(stmt.order_by(models.Journal.id.desc()).limit(JOURNAL_FEED_BACKFILL))).all()
+        return [_event(row) for row in reversed(rows)]
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    async def poll(self) -> int:
+        """
+        Lit les opérations ajoutées depuis la dernière lecture et les diffuse aux abonnés concernés
+        """
+        async with self._lock:
+            if not self._subscribers:
+                # Position reprise au prochain abonné: pas de lecture sans abonné
+                self._positioned = False
+                return 0
+            started = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(_select_events().filter(self._watermark.condition(models.Journal.id))
+                                         .order_by(models.Journal.id).limit(JOURNAL_FEED_BATCH))).all()
+            self._watermark.advance([row.id for row in rows])
+            for row in rows:
+                feed_event = _event(row)
+                for subscription in list(self._subscribers):
+                    if subscription.matches(feed_event):
+                        if subscription.offer(feed_event):
+                            self.delivered += 1
+                        elif subscription.dropped and subscription in self._subscribers:
+                            self._subscribers.discard(subscription)
+                            self.dropped += 1
+            self.polls += 1
+            self.published += len(rows)
+            self.last_poll_ms = (time.perf_counter() - started) * 1000
+            return len(rows)
+
+    async def step(self) -> bool:
+        # Lot plein: d'autres opérations attendent sans doute, relecture immédiate
+        return await self.poll() == JOURNAL_FEED_BATCH
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.running,
+            "subscribers": len(self._subscribers),
+            "peak_subscribers": self.peak_subscribers,
+            "queue_size": self.queue_size,
+            "poll_interval": self.interval,
+            "polls": self.polls,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "failures": self.failures,
+            "last_poll_ms": round(self.last_poll_ms, 3),
+        }
+
+
+journal_feed = JournalFeed(interval=JOURNAL_FEED_POLL_INTERVAL, queue_size=JOURNAL_FEED_QUEUE_SIZE)
+
+
+def mark_written(db: AsyncSession):
+    """
+    La transaction en cours ajoute des opérations: le flux est relu dès son commit
+    """
+    db.info[_WRITTEN_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_committed(session: Session):
+    if session.info.pop(_WRITTEN_KEY, False):
+        journal_feed.notify()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back(session: Session, previous_transaction):
+    session.info.pop(_WRITTEN_KEY, None)
@@ -0,0 +1,63 @@
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.helpers import models, schemas
+from app.utils.journal_feed import journal_feed
+from app.utils.workers import BatchWriter
+
+load_dotenv()
+
+# Journal en écriture différée (désactivé par défaut)
+JOURNAL_BUFFERED = os.getenv("JOURNAL_BUFFERED", "false").lower() == "true"
+JOURNAL_BATCH_SIZE = int(os.getenv("JOURNAL_BATCH_SIZE", "200"))
+JOURNAL_FLUSH_INTERVAL = float(os.getenv("JOURNAL_FLUSH_INTERVAL", "1"))
+# Opérations en attente au plus (base indisponible): au-delà, les nouvelles opérations sont perdues
+JOURNAL_MAX_PENDING = int(os.getenv("JOURNAL_MAX_PENDING", "100000"))
+
+# Opérations en attente du commit de la transaction qui les a produites (Session.info)
+_PENDING_KEY = "journal_pending"
+
+
+class JournalBuffer(BatchWriter):
+    """
+    Tampon d'écriture du journal: les opérations sont regroupées puis insérées
+    en un seul INSERT multi-lignes toutes les JOURNAL_FLUSH_INTERVAL secondes
+    ou dès que JOURNAL_BATCH_SIZE opérations sont en attente.
+    """
+    model = models.Journal
+    description = "opérations du journal"
+
+    def enqueue(self, operation: schemas.JournalToDB):
+        self.put(operation.model_dump())
+
+    async def flush(self) -> int:
+        written = await super().flush()
+        if written:
+            journal_feed.notify()
+        return written
+
+
+journal_buffer = JournalBuffer(batch_size=JOURNAL_BATCH_SIZE, interval=JOURNAL_FLUSH_INTERVAL,
+                               max_pending=JOURNAL_MAX_PENDING)
+
+
+def defer(db: AsyncSession, operation: schemas.JournalToDB):
+    """
+    Met l'opération en file au commit de la transaction en cours (abandonnée en cas de rollback)
+    """
+    db.info.setdefault(_PENDING_KEY, []).append(operation)
+
+
+@event.listens_for(Session, "after_commit")
+def _enqueue_committed(session: Session):
+    for operation in session.info.pop(_PENDING_KEY, ()):
+        journal_buffer.enqueue(operation)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back(session: Session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
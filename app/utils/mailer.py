@@ -0,0 +1,176 @@
+import logging
+import os
+import smtplib
+import socket
+import time
+from email.message import EmailMessage
+from typing import Union
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+
+from app.helpers import models
+from app.helpers.database import AsyncSessionLocal
+from app.services import mail as mail_service
+from app.utils import metrics
+from app.utils.workers import BackgroundWorker
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp-srv.pearl.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "false").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+# Connexion fermée après ce délai sans envoi (secondes)
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+
+MAIL_WORKER_ENABLED = os.getenv("MAIL_WORKER_ENABLED", "true").lower() == "true"
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", "2"))
+
+
+class SMTPConnection:
+    """
+    Connexion SMTP authentifiée et réutilisée entre les envois.
+    N'est utilisée que depuis un seul thread à la fois (un lot après l'autre).
+    """
+
+    def __init__(self):
+        self._smtp: Union[smtplib.SMTP, None] = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_STARTTLS:
+            smtp.starttls()
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD or "")
+        self._smtp = smtp
+
+    def send(self, msg: EmailMessage):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            if self._smtp is None:
+                self._connect()
+            try:
+                self._smtp.send_message(msg)  # type: ignore
+            except smtplib.SMTPServerDisconnected:
+                # Le serveur a fermé la connexion inactive: reconnexion puis nouvel essai
+                self._connect()
+                self._smtp.send_message(msg)  # type: ignore
+            outcome = "sent"
+        finally:
+            metrics.SMTP_SEND_SECONDS.observe(time.perf_counter() - started, outcome)
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > SMTP_IDLE_TIMEOUT:
+            self.close()
+
+    def close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except smtplib.SMTPException:
+            pass
+        except OSError:
+            pass
+        self._smtp = None
+
+
+class MailWorker(BackgroundWorker):
+    """
+    Worker d'envoi des emails de l'outbox: lots de MAIL_BATCH_SIZE emails
+    envoyés sur une même connexion, nouvel essai avec backoff en cas d'échec.
+    """
+
+    description = "worker d'envoi des emails"
+
+    def __init__(self):
+        super().__init__(MAIL_POLL_INTERVAL)
+        self.connection = SMTPConnection()
+        # Auteur des réservations (un worker par processus uvicorn)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"[:64]
+        self._last_release = 0.0
+
+    def _build_messages(self, batch: list[models.EmailOutbox]) -> list[Union[EmailMessage, str]]:
+        """
+        Message de chaque email, ou l'erreur de sa construction: un email illisible
+        n'empêche pas l'envoi des autres
+        """
+        messages: list[Union[EmailMessage, str]] = []
+        for db_email in batch:
+            try:
+                messages.append(mail_service.build_message(db_email))
+            except Exception as e:
+                logger.exception("Échec de la construction de l'email %s", db_email.id)
+                messages.append(str(e) or e.__class__.__name__)
+        return messages
+
+    def _send_batch(self, messages: list[Union[EmailMessage, str]]) -> list[Union[str, None]]:
+        errors: list[Union[str, None]] = []
+        for msg in messages:
+            if isinstance(msg, str):
+                errors.append(msg)
+                continue
+            try:
+                self.connection.send(msg)
+                errors.append(None)
+            except (smtplib.SMTPException, OSError) as e:
+                logger.warning("Échec de l'envoi à %s: %s", msg["To"], e)
+                self.connection.close()
+                errors.append(str(e) or e.__class__.__name__)
+            except Exception as e:
+                # Erreur inattendue: connexion dans un état inconnu, rouverte pour l'email suivant
+                logger.exception("Échec de l'envoi à %s", msg["To"])
+                self.connection.close()
+                errors.append(str(e) or e.__class__.__name__)
+        return errors
+
+    async def process_batch(self) -> int:
+        """
+        Envoie un lot d'emails en attente. Retourne le nombre d'emails traités.
+        """
+        async with AsyncSessionLocal() as db:
+            batch = await mail_service.claim_batch(db, MAIL_BATCH_SIZE, self.worker_id)
+            if not batch:
+                await run_in_threadpool(self.connection.close_if_idle)
+                return 0
+
+            messages = await run_in_threadpool(self._build_messages, batch)
+            errors = await run_in_threadpool(self._send_batch, messages)
+            for db_email, error in zip(batch, errors):
+                mail_service.mark_result(db_email, error)
+            await db.commit()
+            return len(batch)
+
+    async def release_stale(self):
+        """
+        Lots dont le bail a expiré (worker arrêté pendant l'envoi): remis en file,
+        au démarrage puis une fois par bail
+        """
+        if self._last_release and time.monotonic() - self._last_release < mail_service.MAIL_CLAIM_LEASE:
+            return
+        self._last_release = time.monotonic()
+        async with AsyncSessionLocal() as db:
+            released = await mail_service.release_stale(db)
+        if released:
+            logger.warning("%d emails remis en file (bail de réservation expiré)", released)
+
+    async def step(self) -> bool:
+        await self.release_stale()
+        # Lot plein: la file n'est sans doute pas vide, on enchaîne
+        return await self.process_batch() >= MAIL_BATCH_SIZE
+
+    async def stop(self):
+        await super().stop()
+        await run_in_threadpool(self.connection.close)
+
+
+mail_worker = MailWorker()
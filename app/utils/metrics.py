@@ -0,0 +1,262 @@
+"""
+Métriques de l'application au format texte Prometheus (GET /metrics).
+
+Compteurs, jauges et histogrammes en mémoire du processus, sans dépendance: un scrape par
+processus uvicorn. Mesurés:
+- durée des requêtes HTTP par route et requêtes en cours (MetricsMiddleware)
+- nombre et durée des requêtes SQL par requête HTTP, durée de chaque requête SQL (événements du moteur)
+- attente au checkout du pool de connexions et connexions empruntées
+- durée du rendu des codes QR et des envois SMTP
+"""
+import bisect
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Union
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import Pool
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Jeton attendu par GET /metrics (Authorization: Bearer <jeton>); sans jeton, l'endpoint est ouvert
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Secondes: de la requête servie par un index en mémoire au pool saturé (pool_timeout)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._series: dict[tuple, list] = {}
+        REGISTRY.append(self)
+
+    def _labels(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _samples(self, values: tuple, series: list) -> list[str]:
+        return [f"{self.name}{self._labels(values)} {_format(series[0])}"]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            snapshot = [(values, list(series)) for values, series in self._series.items()]
+        for values, series in sorted(snapshot):
+            lines.extend(self._samples(values, series))
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                self._series[labels] = [amount]
+            else:
+                series[0] += amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                self._series[labels] = [amount]
+            else:
+                series[0] += amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._series[labels] = [value]
+
+
+class Histogram(_Metric):
+    """
+    Série: un compteur par intervalle (non cumulés, cumulés au rendu), puis la somme des valeurs
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def _samples(self, values: tuple, series: list) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series):
+            cumulative += count
+            le = 'le="' + _format(bound) + '"'
+            lines.append(f"{self.name}_bucket{self._labels(values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{self._labels(values)} {_format(series[-1])}")
+        lines.append(f"{self.name}_count{self._labels(values)} {cumulative}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Durée des requêtes HTTP",
+                                 ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requêtes HTTP en cours de traitement")
+HTTP_SQL_STATEMENTS = Histogram("http_request_sql_statements", "Requêtes SQL exécutées par requête HTTP",
+                                ("route",), buckets=COUNT_BUCKETS)
+HTTP_SQL_SECONDS = Histogram("http_request_sql_seconds", "Durée cumulée des requêtes SQL par requête HTTP",
+                             ("route",))
+DB_STATEMENT_SECONDS = Histogram("db_statement_duration_seconds", "Durée d'exécution des requêtes SQL",
+                                 ("engine",))
+DB_POOL_WAIT_SECONDS = Histogram("db_pool_checkout_wait_seconds",
+                                 "Attente d'une connexion au pool (ouverture comprise sans pool)", ("engine",))
+DB_CONNECTIONS_CHECKED_OUT = Gauge("db_pool_connections_checked_out", "Connexions empruntées au pool",
+                                   ("engine",))
+QR_RENDER_SECONDS = Histogram("qr_render_duration_seconds", "Rendu d'un code QR (hors cache)", ("format",))
+SMTP_SEND_SECONDS = Histogram("smtp_send_duration_seconds", "Envoi d'un email au serveur SMTP (connexion comprise)",
+                              ("outcome",))
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Requête HTTP en cours: [nombre de requêtes SQL, durée cumulée]
+_request_queries: ContextVar[Union[list, None]] = ContextVar("request_queries", default=None)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI (HTTP seulement, pas de tâche intermédiaire): durée par route (modèle de chemin,
+    "unmatched" sans route), requêtes en cours et requêtes SQL de la requête
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        queries = [0, 0.0]
+        token = _request_queries.set(queries)
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            _request_queries.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(elapsed, scope["method"], path, status[0])
+            HTTP_SQL_STATEMENTS.observe(queries[0], path)
+            HTTP_SQL_SECONDS.observe(queries[1], path)
+
+
+def timed_pool(pool_class: type[Pool], name: str) -> type[Pool]:
+    """
+    Sous-classe du pool mesurant l'attente au checkout et les connexions empruntées
+    (plutôt que des événements du pool, plus coûteux; conservée par dispose(), qui recrée le pool)
+    """
+
+    class TimedPool(pool_class):  # type: ignore
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            finally:
+                DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started, name)
+            DB_CONNECTIONS_CHECKED_OUT.inc(name)
+            return connection
+
+        def _do_return_conn(self, record):
+            DB_CONNECTIONS_CHECKED_OUT.dec(name)
+            super()._do_return_conn(record)
+
+    TimedPool.__name__ = TimedPool.__qualname__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+def pool_class(url: str, name: str) -> Union[type[Pool], None]:
+    """
+    Classe de pool mesurée pour une URL: celle que SQLAlchemy choisirait pour le dialecte.
+    None si les métriques sont désactivées (pool par défaut, aucun surcoût).
+    """
+    if not METRICS_ENABLED:
+        return None
+    url_object = make_url(url)
+    return timed_pool(url_object.get_dialect().get_pool_class(url_object), name)
+
+
+def instrument_engine(sync_engine: Engine, name: str):
+    """
+    Durée des requêtes SQL, globale et cumulée par requête HTTP
+    """
+    if not METRICS_ENABLED:
+        return
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        DB_STATEMENT_SECONDS.observe(elapsed, name)
+        queries = _request_queries.get()
+        if queries is not None:
+            queries[0] += 1
+            queries[1] += elapsed
@@ -0,0 +1,116 @@
+import base64
+import json
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Sequence, Union
+
+from sqlalchemy import Select, and_, or_
+
+
+class InvalidCursor(ValueError):
+    """Curseur illisible ou produit pour un autre tri"""
+
+
+def encode_cursor(sort: str, order: str, value: Any, id_: int) -> str:
+    """
+    Curseur opaque: position (clé de tri, id) de la dernière ligne d'une page
+    """
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    payload = json.dumps([sort, order, value, id_], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str, column) -> tuple[Any, int]:
+    """
+    Retourne (valeur de la clé de tri, id). Le curseur doit avoir été produit pour le même tri.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, cursor_order, value, id_ = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Curseur de pagination invalide.") from e
+    if (cursor_sort, cursor_order) != (sort, order) or not isinstance(id_, int):
+        raise InvalidCursor("Curseur de pagination produit pour un autre tri.")
+
+    python_type = column.type.python_type
+    try:
+        if python_type is datetime:
+            value = datetime.fromisoformat(value)
+        elif python_type is date:
+            value = datetime.fromisoformat(value).date()
+        elif value is not None:
+            value = python_type(value)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Curseur de pagination invalide.") from e
+    return value, id_
+
+
+def keyset(stmt: Select, column, id_column, after: Union[tuple[Any, int], None], descending: bool) -> Select:
+    """
+    Tri stable sur (column, id) et reprise après la position `after`.
+    La condition `column >= v AND (column > v OR id > i)` reste exploitable par un index sur column.
+    """
+    if after is not None:
+        value, id_ = after
+        if column is id_column:
+            stmt = stmt.filter(id_column < id_ if descending else id_column > id_)
+        elif descending:
+            stmt = stmt.filter(and_(column <= value, or_(column < value, id_column < id_)))
+        else:
+            stmt = stmt.filter(and_(column >= value, or_(column > value, id_column > id_)))
+
+    if column is id_column:
+        return stmt.order_by(id_column.desc() if descending else id_column)
+    if descending:
+        return stmt.order_by(column.desc(), id_column.desc())
+    return stmt.order_by(column, id_column)
+
+
+def page(rows: Sequence, limit: int, sort: str, order: str,
+         key: Callable[[Any], tuple[Any, int]]) -> tuple[list, Union[str, None]]:
+    """
+    `rows` contient jusqu'à limit + 1 lignes: la ligne en trop indique qu'une page suivante existe
+    """
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(sort, order, *key(rows[-1]))
+
+
+class Watermark:
+    """
+    Position de lecture incrémentale d'une table à clé auto-incrémentée (lignes ajoutées depuis la
+    dernière lecture). Un id manquant sous le maximum lu (transaction plus ancienne pas encore
+    validée) est relu pendant `gap_seconds`, puis abandonné (insertion annulée).
+    """
+
+    def __init__(self, gap_seconds: float):
+        self.gap_seconds = gap_seconds
+        self.last = 0
+        self._gaps: dict[int, float] = {}
+
+    def condition(self, column):
+        if self._gaps:
+            return or_(column > self.last, column.in_(list(self._gaps)))
+        return column > self.last
+
+    def reset(self, last: int):
+        self.last = last
+        self._gaps.clear()
+
+    def advance(self, ids: Sequence[int]):
+        now = time.monotonic()
+        for id_ in ids:
+            self._gaps.pop(id_, None)
+        top = max(ids, default=self.last)
+        if top > self.last:
+            seen = set(ids)
+            self._gaps.update((id_, now) for id_ in range(self.last + 1, top) if id_ not in seen)
+            self.last = top
+        for id_ in [id_ for id_, since in self._gaps.items() if now - since > self.gap_seconds]:
+            del self._gaps[id_]
+
+    def __len__(self):
+        return len(self._gaps)
@@ -0,0 +1,326 @@
+import asyncio
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Iterable, Union
+
+from dotenv import load_dotenv
+from sqlalchemy import delete as sql_delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.helpers import models
+from app.helpers.database import AsyncSessionLocal
+from app.utils import pagination
+from app.utils.cache import scan_cache
+from app.utils.workers import BackgroundWorker
+
+load_dotenv()
+
+# Index des codes QR chargé au démarrage: un scan est décidé en mémoire, sans requête
+QR_INDEX_ENABLED = os.getenv("QR_INDEX_ENABLED", "true").lower() == "true"
+# Relecture des changements faits par les autres processus (secondes)
+QR_INDEX_REFRESH_INTERVAL = float(os.getenv("QR_INDEX_REFRESH_INTERVAL", "2"))
+# Code absent de l'index: relecture des changements au plus une fois par intervalle (secondes),
+# pour trouver un code créé à l'instant par un autre processus
+QR_INDEX_MISS_REFRESH = float(os.getenv("QR_INDEX_MISS_REFRESH", "0.2"))
+# Code signé authentique absent (émis à l'instant ou supprimé): même règle, intervalle plus court
+QR_INDEX_FORCED_REFRESH = float(os.getenv("QR_INDEX_FORCED_REFRESH", "0.05"))
+# Codes expirés depuis moins de QR_INDEX_EXPIRED_DAYS jours gardés (motif "expiré" au portique)
+QR_INDEX_EXPIRED_DAYS = int(os.getenv("QR_INDEX_EXPIRED_DAYS", "30"))
+# Durée de conservation de la table des changements (heures)
+QR_INDEX_CHANGES_RETENTION = float(os.getenv("QR_INDEX_CHANGES_RETENTION", "24"))
+# Codes lus par requête au chargement
+QR_INDEX_LOAD_BATCH = int(os.getenv("QR_INDEX_LOAD_BATCH", "20000"))
+# Id manquant sous le maximum lu (transaction pas encore validée): relu pendant ce délai (secondes)
+QR_INDEX_GAP_SECONDS = 60.0
+QR_INDEX_PRUNE_INTERVAL = 3600.0
+
+# Champs de l'étudiant gardés dans l'index: leur modification doit être propagée
+INDEXED_FIELDS = {"nom", "prenom", "matricule", "parcours", "niveau", "annee_univ"}
+
+
+class IndexedCode:
+    """
+    Code QR indexé et champs affichés au portique. __slots__: pas de __dict__ par entrée;
+    classes, années et dates d'expiration sont partagées entre entrées.
+    """
+    __slots__ = ("id", "nom", "prenom", "matricule", "parcours", "niveau", "annee_univ",
+                 "is_valid", "expire_date")
+
+    def __init__(self, id_etudiant, nom, prenom, matricule, parcours, niveau, annee_univ, is_valid, expire_date):
+        self.id = id_etudiant
+        self.nom = nom
+        self.prenom = prenom
+        self.matricule = matricule
+        self.parcours = parcours
+        self.niveau = niveau
+        self.annee_univ = annee_univ
+        self.is_valid = bool(is_valid)
+        self.expire_date = expire_date
+
+    # Mêmes attributs que les lignes de la requête de vérification (qrcode.scan_verification)
+    @property
+    def expired(self) -> bool:
+        return self.expire_date is None or self.expire_date < date.today()
+
+    @property
+    def accepted(self) -> bool:
+        return self.is_valid and not self.expired
+
+
+def _select_codes():
+    window = date.today() - timedelta(days=QR_INDEX_EXPIRED_DAYS)
+    return select(
+        models.QR_Code.id.label("id_qrcode"),
+        models.QR_Code.data,
+        models.QR_Code.is_valid,
+        models.QR_Code.expire_date,
+        models.Etudiant.id,
+        models.Etudiant.nom,
+        models.Etudiant.prenom,
+        models.Etudiant.matricule,
+        models.Etudiant.parcours,
+        models.Etudiant.niveau,
+        models.Etudiant.annee_univ,
+    ).join(models.Etudiant, models.Etudiant.id == models.QR_Code.id_etudiant) \
+     .filter(models.QR_Code.expire_date >= window)
+
+
+class QRCodeIndex(BackgroundWorker):
+    """
+    Codes QR valides ou récemment invalidés/expirés (données -> IndexedCode), chargés au démarrage
+    puis tenus à jour par relecture incrémentale: nouveaux codes (qrcode.id) et codes modifiés
+    (qrcode_changes). Un code absent de l'index est inconnu: refusé sans requête.
+    """
+
+    description = "index des codes QR"
+
+    def __init__(self, interval: float, miss_refresh: float, forced_refresh: float):
+        super().__init__(interval)
+        self.miss_refresh = miss_refresh
+        self.forced_refresh = forced_refresh
+        self._entries: dict[str, IndexedCode] = {}
+        self._shared: dict = {}
+        self._codes = pagination.Watermark(QR_INDEX_GAP_SECONDS)
+        self._changes = pagination.Watermark(QR_INDEX_GAP_SECONDS)
+        self._lock = asyncio.Lock()
+        self._miss_task: Union[asyncio.Task, None] = None
+        self.ready = False
+        self._dirty = False
+        self._last_refresh = 0.0
+        self._last_prune = 0.0
+        # Métriques
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.miss_refreshes = 0
+        self.applied = 0
+        self.load_ms = 0.0
+        self.last_refresh_ms = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _put(self, row):
+        # Dépaquetage par position: l'accès par nom aux colonnes d'une ligne coûte ~1 µs chacun
+        _, data, is_valid, expire_date, id_etudiant, nom, prenom, matricule, parcours, niveau, annee_univ = row
+        shared = self._shared
+        self._entries[data] = IndexedCode(
+            id_etudiant, nom, prenom, matricule,
+            shared.setdefault(parcours, parcours), shared.setdefault(niveau, niveau),
+            shared.setdefault(annee_univ, annee_univ), is_valid, shared.setdefault(expire_date, expire_date),
+        )
+
+    async def load(self):
+        """
+        Chargement complet. Les positions sont lues avant les codes: un changement validé
+        pendant le chargement est relu au rafraîchissement suivant, un code validé après sa tranche aussi.
+        """
+        started = time.perf_counter()
+        async with self._lock, AsyncSessionLocal() as db:
+            last_change = (await db.execute(select(func.max(models.QR_CodeChange.id)))).scalar() or 0
+            last_code = (await db.execute(select(func.max(models.QR_Code.id)))).scalar() or 0
+            self._entries = {}
+            self._shared = {}
+            self._codes.reset(0)
+            # Lecture par tranches d'id (pagination par clé): mémoire bornée. Les ids de chaque tranche
+            # sont lus sans le filtre d'expiration: un id absent sous le maximum (transaction pas encore
+            # validée, import en cours...) devient un trou de la position, relu comme après un rafraîchissement
+            after = 0
+            while after < last_code:
+                ids = (await db.scalars(select(models.QR_Code.id)
+                                        .filter(models.QR_Code.id > after, models.QR_Code.id <= last_code)
+                                        .order_by(models.QR_Code.id).limit(QR_INDEX_LOAD_BATCH))).all()
+                if not ids:
+                    break
+                for row in await db.execute(_select_codes().filter(models.QR_Code.id >= ids[0],
+                                                                   models.QR_Code.id <= ids[-1])):
+                    self._put(row)
+                self._codes.advance(ids)
+                after = ids[-1]
+            self._changes.reset(last_change)
+        self.ready = True
+        self._last_refresh = time.monotonic()
+        self.load_ms = (time.perf_counter() - started) * 1000
+
+    async def refresh(self) -> int:
+        """
+        Applique les codes créés et modifiés depuis la dernière lecture (deux requêtes indexées)
+        """
+        async with self._lock:
+            started = time.perf_counter()
+            self._dirty = False
+            async with AsyncSessionLocal() as db:
+                applied = await self._apply_new_codes(db) + await self._apply_changes(db)
+            self._last_refresh = time.monotonic()
+            self.refreshes += 1
+            self.applied += applied
+            self.last_refresh_ms = (time.perf_counter() - started) * 1000
+            return applied
+
+    async def _apply_new_codes(self, db: AsyncSession) -> int:
+        result = await db.execute(select(models.QR_Code.id).filter(self._codes.condition(models.QR_Code.id)))
+        ids = result.scalars().all()
+        if ids:
+            for row in await db.execute(_select_codes().filter(models.QR_Code.id.in_(ids))):
+                self._put(row)
+        self._codes.advance(ids)
+        return len(ids)
+
+    async def _apply_changes(self, db: AsyncSession) -> int:
+        result = await db.execute(select(models.QR_CodeChange.id, models.QR_CodeChange.data)
+                                  .filter(self._changes.condition(models.QR_CodeChange.id)))
+        changes = result.all()
+        changed = {change.data for change in changes}
+        if changed:
+            for data in changed:
+                self._entries.pop(data, None)
+            # Cache des scans de ce processus: un étudiant modifié ou supprimé ailleurs n'y reste pas
+            scan_cache.invalidate(*changed)
+            # Code supprimé (ou étudiant supprimé): absent du résultat, donc retiré de l'index
+            for row in await db.execute(_select_codes().filter(models.QR_Code.data.in_(changed))):
+                self._put(row)
+        self._changes.advance([change.id for change in changes])
+        return len(changed)
+
+    def get(self, data: str) -> Union[IndexedCode, None]:
+        entry = self._entries.get(data)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def _must_refresh(self, force: bool) -> bool:
+        delay = self.forced_refresh if force else self.miss_refresh
+        return self._dirty or time.monotonic() - self._last_refresh > delay
+
+    async def lookup(self, data: str, force: bool = False) -> Union[IndexedCode, None]:
+        """
+        Code absent: les changements sont relus avant de conclure qu'il est inconnu, au plus une fois
+        par QR_INDEX_MISS_REFRESH (QR_INDEX_FORCED_REFRESH avec `force`: code signé authentique, il a
+        forcément été émis), sauf changement local en attente
+        """
+        entry = self.get(data)
+        if entry is None and self._must_refresh(force):
+            await self._refresh_on_miss()
+            entry = self._entries.get(data)
+        return entry
+
+    async def _refresh_on_miss(self):
+        """
+        Une seule relecture en cours pour les absences concurrentes: les suivantes attendent la même
+        """
+        if self._miss_task is None:
+            self.miss_refreshes += 1
+            self._miss_task = asyncio.create_task(self.refresh())
+            self._miss_task.add_done_callback(self._miss_refresh_done)
+        # Requête annulée (client parti): la relecture partagée continue pour les autres
+        await asyncio.shield(self._miss_task)
+
+    def _miss_refresh_done(self, task: asyncio.Task):
+        self._miss_task = None
+
+    def revoke(self, data: str):
+        """
+        Invalidation faite par ce processus: appliquée tout de suite, sans attendre la relecture
+        """
+        entry = self._entries.get(data)
+        if entry is not None:
+            entry.is_valid = False
+        self.notify()
+
+    def notify(self):
+        """
+        Changement validé par ce processus: relecture immédiate plutôt qu'au prochain intervalle
+        """
+        self._dirty = True
+        super().notify()
+
+    async def prune(self):
+        limit = datetime.now() - timedelta(hours=QR_INDEX_CHANGES_RETENTION)
+        async with AsyncSessionLocal() as db:
+            await db.execute(sql_delete(models.QR_CodeChange).filter(models.QR_CodeChange.changed_at < limit))
+            await db.commit()
+        self._last_prune = time.monotonic()
+
+    async def step(self) -> bool:
+        # Chargement complet jusqu'à réussite, puis relecture incrémentale
+        if not self.ready:
+            await self.load()
+            await self.prune()
+            return False
+        await self.refresh()
+        if time.monotonic() - self._last_prune > QR_INDEX_PRUNE_INTERVAL:
+            await self.prune()
+        return False
+
+    async def stop(self):
+        await super().stop()
+        self.ready = False
+
+    def memory_bytes(self) -> int:
+        """
+        Empreinte mémoire estimée: table de hachage, clés, entrées et chaînes propres à chaque entrée
+        (les valeurs partagées sont comptées une fois). Parcours complet: à appeler rarement.
+        """
+        size = sys.getsizeof(self._entries) + sum(sys.getsizeof(value) for value in self._shared)
+        for data, entry in self._entries.items():
+            size += (sys.getsizeof(data) + sys.getsizeof(entry) + sys.getsizeof(entry.nom)
+                     + sys.getsizeof(entry.prenom) + sys.getsizeof(entry.matricule))
+        return size
+
+    def stats(self) -> dict:
+        memory = self.memory_bytes()
+        total = self.hits + self.misses
+        return {
+            "enabled": self.running,
+            "ready": self.ready,
+            "entries": len(self._entries),
+            "revoked": sum(1 for entry in self._entries.values() if not entry.is_valid),
+            "memory_bytes": memory,
+            "bytes_per_entry": round(memory / len(self._entries), 1) if self._entries else 0.0,
+            "load_ms": round(self.load_ms, 3),
+            "refresh_interval": self.interval,
+            "refreshes": self.refreshes,
+            "miss_refreshes": self.miss_refreshes,
+            "applied": self.applied,
+            "pending_gaps": len(self._codes) + len(self._changes),
+            "last_refresh_ms": round(self.last_refresh_ms, 3),
+            "failures": self.failures,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+qr_index = QRCodeIndex(interval=QR_INDEX_REFRESH_INTERVAL, miss_refresh=QR_INDEX_MISS_REFRESH,
+                       forced_refresh=QR_INDEX_FORCED_REFRESH)
+
+
+def record_changes(db: AsyncSession, codes: Iterable[str]):
+    """
+    Signale aux index des autres processus des codes modifiés, dans la transaction en cours
+    """
+    db.add_all([models.QR_CodeChange(data=data) for data in codes])
@@ -0,0 +1,120 @@
+"""
+Codes QR signés (HMAC-SHA256), vérifiables sans accès à la base:
+
+    Q1.<kid>.<id étudiant>.<expiration AAAAMMJJ>.<nonce>.<signature>
+
+Les clés sont à configurer explicitement (QR_SIGNING_KEYS), indépendamment de SECRET_KEY: changer
+le secret des tokens ne doit pas invalider les badges déjà imprimés. Sans clé, les nouveaux codes
+restent au format historique (avertissement au démarrage).
+
+Rotation des clés: ajouter la nouvelle clé à QR_SIGNING_KEYS, la désigner par QR_SIGNING_KEY_ID
+(les nouveaux codes sont signés avec elle), puis retirer l'ancienne une fois ses codes expirés.
+Toutes les clés listées sont acceptées à la vérification.
+
+Les anciens codes "<id>_<uuid4>" ne sont pas signés: ils restent vérifiés par la base.
+Module sans dépendance à l'application: un scanner de confiance peut l'embarquer avec les clés.
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+from datetime import date, datetime
+from typing import NamedTuple, Union
+from uuid import uuid4
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+VERSION = "Q1"
+# Octets de signature conservés (128 bits): le code QR reste court
+SIGNATURE_BYTES = 16
+NONCE_BYTES = 8
+
+
+def _load_keys() -> dict[str, bytes]:
+    """
+    QR_SIGNING_KEYS="k2:secret,k1:ancien-secret"
+    """
+    keys = {}
+    for item in os.getenv("QR_SIGNING_KEYS", "").split(","):
+        kid, _, secret = item.strip().partition(":")
+        if kid and secret:
+            keys[kid] = secret.encode()
+    if not keys:
+        logger.warning("QR_SIGNING_KEYS non configurée: les nouveaux codes QR ne sont pas signés")
+    return keys
+
+
+QR_SIGNING_KEYS = _load_keys()
+# Clé des nouveaux codes (par défaut la première listée); sans clé, les codes restent au format historique
+QR_SIGNING_KEY_ID = os.getenv("QR_SIGNING_KEY_ID", next(iter(QR_SIGNING_KEYS), ""))
+if QR_SIGNING_KEY_ID and QR_SIGNING_KEY_ID not in QR_SIGNING_KEYS:
+    raise RuntimeError(f"QR_SIGNING_KEY_ID={QR_SIGNING_KEY_ID} absente de QR_SIGNING_KEYS")
+
+
+class InvalidPayload(ValueError):
+    """Code QR signé illisible, clé inconnue ou signature fausse"""
+
+
+class SignedPayload(NamedTuple):
+    kid: str
+    id_etudiant: int
+    expire_date: date
+
+
+def _signature(key: bytes, message: str) -> str:
+    digest = hmac.new(key, message.encode(), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def is_signed(data: str) -> bool:
+    return data.startswith(VERSION + ".")
+
+
+def sign(id_etudiant: int, expire_date: Union[date, datetime], kid: str = QR_SIGNING_KEY_ID) -> str:
+    if kid not in QR_SIGNING_KEYS:
+        raise KeyError(f"Clé de signature inconnue: {kid}")
+    if isinstance(expire_date, datetime):
+        expire_date = expire_date.date()
+    nonce = base64.urlsafe_b64encode(secrets.token_bytes(NONCE_BYTES)).decode().rstrip("=")
+    message = f"{VERSION}.{kid}.{id_etudiant}.{expire_date:%Y%m%d}.{nonce}"
+    return f"{message}.{_signature(QR_SIGNING_KEYS[kid], message)}"
+
+
+def verify(data: str) -> SignedPayload:
+    """
+    Vérifie la signature d'un code signé (sans la base). L'expiration est à comparer par l'appelant.
+    """
+    message, _, signature = data.rpartition(".")
+    parts = message.split(".")
+    if len(parts) != 5 or parts[0] != VERSION:
+        raise InvalidPayload("Code QR signé illisible.")
+    _, kid, id_etudiant, expire_date, _ = parts
+    key = QR_SIGNING_KEYS.get(kid)
+    if key is None:
+        raise InvalidPayload("Clé de signature inconnue ou retirée.")
+    # Comparaison d'octets: compare_digest refuse les chaînes non ASCII (code forgé)
+    try:
+        authentic = hmac.compare_digest(signature.encode(), _signature(key, message).encode())
+    except UnicodeError as e:
+        raise InvalidPayload("Code QR signé illisible.") from e
+    if not authentic:
+        raise InvalidPayload("Signature du code QR invalide.")
+    try:
+        return SignedPayload(kid, int(id_etudiant), datetime.strptime(expire_date, "%Y%m%d").date())
+    except ValueError as e:
+        raise InvalidPayload("Code QR signé illisible.") from e
+
+
+def new_payload(id_etudiant: int, expire_date: Union[date, datetime]) -> str:
+    """
+    Données d'un nouveau code QR: signées si une clé est configurée, format historique sinon
+    """
+    if QR_SIGNING_KEY_ID in QR_SIGNING_KEYS:
+        return sign(id_etudiant, expire_date)
+    return f"{id_etudiant}_{uuid4()}"
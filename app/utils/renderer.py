@@ -0,0 +1,64 @@
+import asyncio
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+
+from dotenv import load_dotenv
+
+from app.services.qrcode import generate_qr_code
+from app.utils import metrics
+from app.utils.cache import TTLCache
+
+load_dotenv()
+
+# Nombre de processus de rendu (par défaut: nombre de coeurs)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 1)))
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "2048"))
+RENDER_CACHE_TTL = float(os.getenv("RENDER_CACHE_TTL", "86400"))
+
+MEDIA_TYPES = {"PNG": "image/png", "SVG": "image/svg+xml"}
+
+# Images déjà rendues, indexées par l'empreinte (donnée + paramètres de rendu)
+image_cache = TTLCache(maxsize=RENDER_CACHE_SIZE, ttl=RENDER_CACHE_TTL)
+
+_pool: Union[ProcessPoolExecutor, None] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+    return _pool
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def etag(data: str, image_format: str, box_size: int, border: int) -> str:
+    """
+    Empreinte du rendu: sert de clé de cache et d'ETag HTTP
+    """
+    key = f"{image_format}:{box_size}:{border}:{data}".encode()
+    return hashlib.sha256(key).hexdigest()
+
+
+async def render(data: str, image_format: str = "PNG", box_size: int = 10, border: int = 4) -> tuple[str, bytes]:
+    """
+    Rendu d'un code QR dans le pool de processus (CPU), servi depuis le cache si possible.
+    Retourne (etag, image).
+    """
+    key = etag(data, image_format, box_size, border)
+    image = image_cache.get(key)
+    if image is None:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        image = await loop.run_in_executor(get_pool(), generate_qr_code, data, image_format, box_size, border)
+        metrics.QR_RENDER_SECONDS.observe(time.perf_counter() - started, image_format)
+        image_cache.set(key, image)
+    return key, image
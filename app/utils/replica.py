@@ -0,0 +1,77 @@
+import os
+import time
+from contextvars import ContextVar
+from typing import Union
+
+from dotenv import load_dotenv
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.helpers.database import AsyncSessionLocal, ReplicaSessionLocal, replica_engine
+
+load_dotenv()
+
+# Après une écriture, les lectures du même client restent sur le primaire pendant ce délai
+# (doit couvrir le retard de réplication)
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+# Lecture forcée sur le primaire pour une requête: en-tête "X-Read-Primary: true"
+PRIMARY_HEADER = "X-Read-Primary"
+# Échéance (timestamp) de lecture sur le primaire, posée après une écriture
+PRIMARY_COOKIE = "read_primary_until"
+
+# Requête en cours: une transaction du primaire a-t-elle été validée ?
+_request_writes: ContextVar[Union[list, None]] = ContextVar("request_writes", default=None)
+
+
+def use_primary(request: Request) -> bool:
+    """
+    Lecture sur le primaire: pas de réplique, demande explicite ou écriture récente du client
+    """
+    if replica_engine is None:
+        return True
+    if request.headers.get(PRIMARY_HEADER, "").lower() in ("1", "true"):
+        return True
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, "0")) > time.time()
+    except ValueError:
+        return False
+
+
+async def get_read_db(request: Request):
+    """
+    Session des routes en lecture seule: réplique si configurée, primaire sinon
+    (lire ses propres écritures, voir use_primary)
+    """
+    session_factory = AsyncSessionLocal if use_primary(request) else ReplicaSessionLocal
+    async with session_factory() as db:
+        yield db
+
+
+@event.listens_for(Session, "after_commit")
+def _record_write(session: Session):
+    writes = _request_writes.get()
+    if writes is not None and (replica_engine is None or session.bind is not replica_engine.sync_engine):
+        writes.append(True)
+
+
+async def read_your_writes(request: Request, call_next):
+    """
+    Middleware: après une requête ayant validé une transaction sur le primaire, le client
+    lit sur le primaire pendant REPLICA_STICKY_SECONDS (cookie, valable entre processus)
+    """
+    writes: list = []
+    token = _request_writes.set(writes)
+    try:
+        response = await call_next(request)
+    finally:
+        _request_writes.reset(token)
+    if writes and response.status_code < 400:
+        response.set_cookie(
+            key=PRIMARY_COOKIE,
+            value=str(time.time() + REPLICA_STICKY_SECONDS),
+            max_age=int(REPLICA_STICKY_SECONDS) or 1,
+            httponly=True,
+            samesite="strict",
+        )
+    return response
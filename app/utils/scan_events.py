@@ -0,0 +1,102 @@
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Union
+
+from dotenv import load_dotenv
+from sqlalchemy import delete as sql_delete, select
+
+from app.helpers import models, schemas
+from app.helpers.database import AsyncSessionLocal
+from app.utils.workers import BatchWriter
+
+load_dotenv()
+
+# Journal des scans (table scan_events), écrit par lots
+SCAN_EVENTS_ENABLED = os.getenv("SCAN_EVENTS_ENABLED", "true").lower() == "true"
+SCAN_EVENTS_BATCH_SIZE = int(os.getenv("SCAN_EVENTS_BATCH_SIZE", "1000"))
+SCAN_EVENTS_FLUSH_INTERVAL = float(os.getenv("SCAN_EVENTS_FLUSH_INTERVAL", "1"))
+# Scans en attente au plus (base indisponible): au-delà, les nouveaux scans ne sont pas journalisés
+SCAN_EVENTS_MAX_PENDING = int(os.getenv("SCAN_EVENTS_MAX_PENDING", "100000"))
+# Jours de scans bruts conservés (les compteurs consolidés sont conservés sans limite)
+SCAN_EVENTS_RETENTION_DAYS = int(os.getenv("SCAN_EVENTS_RETENTION_DAYS", "90"))
+SCAN_EVENTS_PRUNE_INTERVAL = float(os.getenv("SCAN_EVENTS_PRUNE_INTERVAL", "3600"))
+# Lignes supprimées par transaction lors de la purge
+SCAN_EVENTS_PRUNE_BATCH = 5000
+
+# Issues d'un scan comptées comme présence de l'étudiant
+ATTENDED_OUTCOMES = ("accepted", "identified")
+
+
+class ScanEventLog(BatchWriter):
+    """
+    Journal des scans en ajout seul: les scans sont gardés en mémoire puis insérés en un seul
+    INSERT multi-lignes toutes les SCAN_EVENTS_FLUSH_INTERVAL secondes ou dès que
+    SCAN_EVENTS_BATCH_SIZE scans sont en attente. Le scan lui-même n'attend jamais la base.
+    """
+    model = models.ScanEvent
+    description = "journal des scans"
+
+    def __init__(self, batch_size: int, interval: float, max_pending: int, retention_days: int):
+        super().__init__(batch_size=batch_size, interval=interval, max_pending=max_pending)
+        self.retention_days = retention_days
+        self._last_prune = 0.0
+        self.pruned = 0
+
+    def record(self, etudiant: Union[schemas.ScanEtudiant, None], outcome: str):
+        """
+        Met un scan en file (sans effet si le journal n'est pas démarré)
+        """
+        if not self.running:
+            return
+        now = datetime.now()
+        self.put({
+            "day": now.date(),
+            "scanned_at": now,
+            "id_etudiant": etudiant.id if etudiant is not None else None,
+            "parcours": etudiant.parcours if etudiant is not None else "",
+            "niveau": etudiant.niveau if etudiant is not None else "",
+            "outcome": outcome,
+        })
+
+    def cutoff(self, today: Union[date, None] = None) -> date:
+        """
+        Premier jour dont les scans bruts sont conservés
+        """
+        return (today or date.today()) - timedelta(days=self.retention_days)
+
+    async def prune(self, today: Union[date, None] = None) -> int:
+        """
+        Supprime les scans des jours sortis de la rétention, par transactions de
+        SCAN_EVENTS_PRUNE_BATCH lignes (les écritures concurrentes ne sont pas bloquées longtemps)
+        """
+        cutoff = self.cutoff(today)
+        deleted = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                ids = (await db.scalars(select(models.ScanEvent.id).filter(models.ScanEvent.day < cutoff)
+                                        .order_by(models.ScanEvent.day, models.ScanEvent.id)
+                                        .limit(SCAN_EVENTS_PRUNE_BATCH))).all()
+                if not ids:
+                    break
+                await db.execute(sql_delete(models.ScanEvent).filter(models.ScanEvent.id.in_(ids)))
+                await db.commit()
+            deleted += len(ids)
+        self.pruned += deleted
+        return deleted
+
+    async def step(self) -> bool:
+        await self.flush()
+        if time.monotonic() - self._last_prune >= SCAN_EVENTS_PRUNE_INTERVAL:
+            self._last_prune = time.monotonic()
+            await self.prune()
+        return False
+
+    def stats(self) -> dict:
+        # "recorded": nom historique de "queued" dans ces métriques
+        return {**super().stats(), "recorded": self.queued, "retention_days": self.retention_days,
+                "pruned": self.pruned}
+
+
+scan_events = ScanEventLog(batch_size=SCAN_EVENTS_BATCH_SIZE, interval=SCAN_EVENTS_FLUSH_INTERVAL,
+                           max_pending=SCAN_EVENTS_MAX_PENDING, retention_days=SCAN_EVENTS_RETENTION_DAYS)
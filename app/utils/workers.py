@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from typing import Union
+
+from sqlalchemy import exc, insert
+
+from app.helpers.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWorker:
+    """
+    Tâche de fond d'un processus, démarrée et arrêtée par le lifespan de main.py. step() est appelée
+    au démarrage (si run_at_start), puis à chaque réveil (notify) ou au plus tard toutes les `interval`
+    secondes; une étape qui retourne True est enchaînée sans attente (travail restant). Une étape en
+    échec est journalisée et comptée, la tâche continue.
+    """
+    # Désignation de la tâche dans les messages d'erreur
+    description = "tâche de fond"
+    # Première étape dès le démarrage, sinon après la première attente
+    run_at_start = True
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Union[asyncio.Task, None] = None
+        self._wake = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self.failures = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def step(self) -> bool:
+        raise NotImplementedError
+
+    def notify(self):
+        self._wake.set()
+
+    async def run(self):
+        if not self.run_at_start:
+            await self._wait()
+        while not self._stopping.is_set():
+            try:
+                busy = await self.step()
+            except Exception:
+                logger.exception("Échec: %s", self.description)
+                self.failures += 1
+                busy = False
+            if not busy:
+                await self._wait()
+
+    async def _wait(self):
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    def start(self):
+        self._stopping.clear()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+
+class BatchWriter(BackgroundWorker):
+    """
+    Écriture différée en ajout seul dans la table `model`: les lignes sont gardées en mémoire puis
+    insérées en INSERT multi-lignes toutes les `interval` secondes ou dès que `batch_size` lignes sont
+    en attente. Au-delà de `max_pending` lignes en attente (base indisponible), les nouvelles sont perdues.
+    """
+    model: type = None  # type: ignore
+    # Rien à écrire au démarrage: première écriture après `interval` ou au premier lot plein
+    run_at_start = False
+
+    def __init__(self, batch_size: int, interval: float, max_pending: int):
+        super().__init__(interval)
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._entries: list[dict] = []
+        # Métriques
+        self.queued = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.flushed = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def put(self, entry: dict):
+        if len(self._entries) >= self.max_pending:
+            if not self.dropped:
+                logger.error("File pleine (%s, %d lignes): nouvelles lignes perdues", self.description, self.max_pending)
+            self.dropped += 1
+            return
+        self._entries.append(entry)
+        self.queued += 1
+        if len(self._entries) >= self.batch_size:
+            self._wake.set()
+
+    async def _insert(self, entries: list[dict]):
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(self.model), entries)
+            await db.commit()
+
+    async def _write_batch(self, entries: list[dict]) -> Union[list[dict], None]:
+        """
+        Écrit un lot. Erreur propre aux données (contrainte, valeur trop longue...): le lot est coupé
+        en deux jusqu'à isoler les lignes fautives, écartées pour ne pas bloquer les suivantes.
+        Autre erreur (base indisponible): retourne les lignes non écrites, dans l'ordre.
+        """
+        # Parties restant à écrire, la prochaine en fin de liste
+        parts = [entries]
+        while parts:
+            part = parts.pop()
+            try:
+                await self._insert(part)
+            except (exc.IntegrityError, exc.DataError):
+                if len(part) == 1:
+                    logger.exception("Ligne rejetée par la base (%s): %s", self.description, part[0])
+                    self.rejected += 1
+                else:
+                    middle = len(part) // 2
+                    parts += [part[middle:], part[:middle]]
+                continue
+            except Exception:
+                logger.exception("Échec de l'écriture (%s)", self.description)
+                return part + [entry for rest in reversed(parts) for entry in rest]
+            self.flushed += len(part)
+        return None
+
+    async def flush(self) -> int:
+        """
+        Insère les lignes en attente par lots de batch_size. En cas d'échec, les lignes non écrites
+        sont gardées pour le prochain essai. Retourne le nombre de lignes écrites.
+        """
+        flushed = self.flushed
+        while self._entries:
+            entries, self._entries = self._entries[:self.batch_size], self._entries[self.batch_size:]
+            started = time.perf_counter()
+            unwritten = await self._write_batch(entries)
+            if unwritten is not None:
+                self._entries[:0] = unwritten
+                self.failures += 1
+                break
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flushes += 1
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+        return self.flushed - flushed
+
+    async def step(self) -> bool:
+        await self.flush()
+        return False
+
+    async def stop(self):
+        """
+        Arrêt: les lignes encore en attente sont écrites avant de rendre la main
+        """
+        await super().stop()
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.running,
+            "queue_depth": len(self._entries),
+            "batch_size": self.batch_size,
+            "flush_interval": self.interval,
+            "max_pending": self.max_pending,
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "flushed": self.flushed,
+            "failures": self.failures,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+        }
@@ -0,0 +1,89 @@
+"""
+Latence des scans pendant que des requêtes lentes sont en cours.
+
+Compare deux situations:
+- `blocking`: la requête lente passe par la Session synchrone dans la boucle d'événements
+  (comportement des routes avant la couche asynchrone)
+- `async`: la requête lente passe par l'AsyncSession, comme toutes les routes
+
+Chaque situation dure `--duration` secondes: le nombre de scans traités dans la fenêtre
+mesure le débit, les percentiles mesurent la latence.
+
+Usage: python -m benchmarks.bench_async_scan [--etudiants 2000] [--duration 5] [--slow 2] [--slow-rows 150000]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks.common import percentiles
+from tests.support import configure_env, seed
+
+# Requête volontairement coûteuse (~50 ms sur SQLite pour 150 000 lignes)
+SLOW_SQL = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < :n) SELECT count(*) FROM c"
+
+
+async def run(n_etudiants: int, duration: float, n_slow: int, slow_rows: int) -> dict:
+    configure_env()
+    qr_data = seed(n_etudiants)
+
+    import httpx
+    from sqlalchemy import text
+
+    from app.helpers.database import AsyncSessionLocal, SessionLocal
+    from main import app
+
+    @app.get("/__bench/slow/blocking")
+    async def slow_blocking():
+        with SessionLocal() as db:
+            return {"n": db.execute(text(SLOW_SQL), {"n": slow_rows}).scalar()}
+
+    @app.get("/__bench/slow/async")
+    async def slow_async():
+        async with AsyncSessionLocal() as db:
+            return {"n": (await db.execute(text(SLOW_SQL), {"n": slow_rows})).scalar()}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def scans() -> list[float]:
+            samples = []
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await client.get(f"/etudiants/qrcode/{random.choice(qr_data)}")
+                samples.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+            return samples
+
+        async def slow_loop(path: str, stop: asyncio.Event):
+            while not stop.is_set():
+                await client.get(path)
+                # Sans E/S réelle, le transport ASGI peut enchaîner les requêtes sans rendre la main
+                await asyncio.sleep(0)
+
+        report = {"etudiants": n_etudiants, "duration_s": duration, "slow_requests": n_slow}
+        report["idle"] = percentiles(await scans())
+        for mode in ("blocking", "async"):
+            stop = asyncio.Event()
+            slow = [asyncio.create_task(slow_loop(f"/__bench/slow/{mode}", stop)) for _ in range(n_slow)]
+            await asyncio.sleep(0.05)
+            report[mode] = percentiles(await scans())
+            stop.set()
+            await asyncio.gather(*slow)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--etudiants", type=int, default=2000)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--slow", type=int, default=2)
+    parser.add_argument("--slow-rows", type=int, default=150_000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.etudiants, args.duration, args.slow, args.slow_rows)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
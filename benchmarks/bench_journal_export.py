@@ -0,0 +1,93 @@
+"""
+Mémoire et durée d'un export du journal selon la période demandée.
+
+Compare, pour une période courte puis pour l'année entière:
+- `legacy`: get_by_date (objets ORM) puis sérialisation de schemas.Journal en une seule réponse
+- `stream_csv` / `stream_ndjson`: stream_export et les encodeurs par morceaux de GET /journal/export
+
+La mémoire est le pic mesuré par tracemalloc pendant l'opération (les octets produits sont
+comptés puis jetés, comme s'ils étaient envoyés au client).
+
+Usage: python -m benchmarks.bench_journal_export [--etudiants 20000] [--operations 200000]
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from tests.support import configure_env, seed, seed_journal
+
+
+async def run(n_etudiants: int, n_operations: int) -> dict:
+    configure_env()
+    seed(n_etudiants)
+    seed_journal(n_operations)
+
+    from app.helpers import schemas
+    from app.helpers.database import AsyncSessionLocal
+    from app.services import journal as journal_service
+    from app.utils import export
+
+    async def legacy(debut: datetime) -> tuple[int, int]:
+        async with AsyncSessionLocal() as db:
+            journals = await journal_service.get_by_date(db, debut)
+            body = json.dumps([schemas.Journal.model_validate(j, from_attributes=True).model_dump(mode="json")
+                               for j in journals]).encode()
+            return len(journals), len(body)
+
+    def streamed(file_format: str):
+        async def operation(debut: datetime) -> tuple[int, int]:
+            rows = 0
+            size = 0
+
+            async def counted(stream):
+                nonlocal rows
+                async for row in stream:
+                    rows += 1
+                    yield row
+
+            async with AsyncSessionLocal() as db:
+                stream = journal_service.stream_export(db, debut=debut)
+                async for chunk in export.STREAMS[file_format](counted(stream), journal_service.EXPORT_COLUMNS):
+                    size += len(chunk)
+            return rows, size
+        return operation
+
+    async def measure(operation, debut: datetime) -> dict:
+        tracemalloc.start()
+        started = time.perf_counter()
+        rows, size = await operation(debut)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            "rows": rows,
+            "bytes": size,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed),
+            "peak_memory_mb": round(peak / 1024 / 1024, 2),
+        }
+
+    report = {"etudiants": n_etudiants, "operations": n_operations}
+    today = datetime.now()
+    for periode, debut in (("30_jours", today - timedelta(days=30)), ("1_an", today - timedelta(days=366))):
+        report[periode] = {
+            "stream_csv": await measure(streamed("csv"), debut),
+            "stream_ndjson": await measure(streamed("ndjson"), debut),
+            "legacy": await measure(legacy, debut),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--etudiants", type=int, default=20_000)
+    parser.add_argument("--operations", type=int, default=200_000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.etudiants, args.operations)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
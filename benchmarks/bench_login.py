@@ -0,0 +1,96 @@
+"""
+Rafale de connexions (prise de poste): `--clients` opérateurs appellent POST /token en même temps
+pendant que des scans continuent d'arriver.
+
+Mesure la latence des connexions acceptées, le nombre de refus 503 (file du pool de hachage pleine)
+et la latence des scans pendant la rafale. Les variables PASSWORD_WORKERS, PASSWORD_QUEUE_SIZE et
+BCRYPT_ROUNDS s'appliquent comme en production.
+
+Usage: python -m benchmarks.bench_login [--clients 60] [--etudiants 2000]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+from benchmarks.common import percentiles
+from tests.support import configure_env, seed
+
+PASSWORD = "prise-de-poste"
+
+
+async def run(n_clients: int, n_etudiants: int) -> dict:
+    configure_env()
+    qr_data = seed(n_etudiants)
+
+    import httpx
+    from sqlalchemy import insert
+
+    from app.helpers import models
+    from app.helpers.database import AsyncSessionLocal
+    from app.utils.hasher import password_hasher, pwd_context
+    from main import app
+
+    # Une seule empreinte pour tous les opérateurs: seul le coût de la vérification compte
+    hashed = pwd_context.hash(PASSWORD)
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(models.Operator), [
+            {"nom": f"operateur{i}", "hashed_password": hashed, "disabled": False} for i in range(n_clients)
+        ])
+        await db.commit()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        # Démarrage du pool hors mesure
+        await client.post("/token", data={"username": "operateur0", "password": PASSWORD})
+
+        statuses: Counter = Counter()
+        logins: list[float] = []
+
+        async def login(i: int):
+            started = time.perf_counter()
+            response = await client.post("/token", data={"username": f"operateur{i}", "password": PASSWORD})
+            statuses[response.status_code] += 1
+            if response.status_code == 200:
+                logins.append(time.perf_counter() - started)
+
+        async def scans(stop: asyncio.Event) -> list[float]:
+            samples = []
+            while not stop.is_set():
+                started = time.perf_counter()
+                response = await client.get(f"/etudiants/qrcode/{random.choice(qr_data)}")
+                samples.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+                await asyncio.sleep(0.005)
+            return samples
+
+        stop = asyncio.Event()
+        scanner = asyncio.create_task(scans(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(n_clients)))
+        burst = time.perf_counter() - started
+        stop.set()
+        scan_samples = await scanner
+
+    return {
+        "clients": n_clients,
+        "burst_seconds": round(burst, 3),
+        "statuses": dict(statuses),
+        "login": percentiles(logins),
+        "scan_during_burst": percentiles(scan_samples),
+        "hasher": password_hasher.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=60)
+    parser.add_argument("--etudiants", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.clients, args.etudiants)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
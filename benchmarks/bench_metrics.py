@@ -0,0 +1,178 @@
+"""
+Surcoût des métriques (app.utils.metrics).
+
+- `components`: coût unitaire de chaque instrumentation (middleware, événements du moteur par
+  requête SQL, pool mesuré par checkout, observation d'histogramme), mesuré dans un même processus
+  contre la même opération non instrumentée
+- `verify`, `page`: latence de bout en bout sans (`off`) et avec (`on`) métriques. METRICS_ENABLED
+  est lu à l'import: chaque mode tourne dans son propre sous-processus, sur la même base, modes
+  alternés sur `--rounds` tours (médiane des tours). Transport ASGI, sans réseau:
+  - `/etudiants/qrcode/{data}`: scan, une requête SQL au plus
+  - `/etudiants/?limit=50`: lecture paginée (requête SQL et sérialisation de 50 lignes)
+
+Le bruit entre processus dépasse souvent le surcoût réel: `components` fait foi.
+
+Usage: python -m benchmarks.bench_metrics [--etudiants 2000] [--requests 2000] [--rounds 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+from benchmarks.common import percentiles
+from tests.support import configure_env, seed
+
+ROUTES = ("verify", "page")
+
+
+async def measure(args) -> dict:
+    import httpx
+
+    from sqlalchemy import select
+
+    from app.helpers import models
+    from app.helpers.database import SessionLocal
+    from main import app
+
+    with SessionLocal() as db:
+        qr_data = db.scalars(select(models.QR_Code.data)).all()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/operator", json={"nom": "bench-metrics", "password": "bench"})
+        token = (await client.post("/token", data={"username": "bench-metrics", "password": "bench"})).json()
+        client.headers["Authorization"] = f"Bearer {token['access_token']}"
+        paths = {
+            "verify": lambda: f"/etudiants/qrcode/{random.choice(qr_data)}",
+            "page": lambda: f"/etudiants/?skip={random.randrange(len(qr_data) - 50)}&limit=50",
+        }
+        report = {}
+        for route in ROUTES:
+            samples = []
+            for _ in range(args.requests):
+                path = paths[route]()
+                started = time.perf_counter()
+                response = await client.get(path)
+                samples.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+            report[route] = percentiles(samples)
+        response = await client.get("/metrics")
+        if response.status_code == 200:
+            report["metrics_bytes"] = len(response.content)
+    return report
+
+
+def components(db_path: str, number: int) -> dict:
+    """
+    Coût unitaire (microsecondes) de chaque instrumentation, mesuré dans un même processus
+    contre la même opération non instrumentée: le bruit entre processus n'intervient pas
+    """
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.pool import QueuePool
+
+    from app.utils import metrics
+
+    def overhead(plain, instrumented, calls: int = number) -> float:
+        """Écart des meilleurs temps, mesures alternées: une dérive de la machine touche les deux"""
+        timings: dict = {plain: [], instrumented: []}
+        for _ in range(7):
+            for fn in timings:
+                timings[fn].append(timeit.timeit(fn, number=number // calls))
+        return round((min(timings[instrumented]) - min(timings[plain])) / number * 1e6, 3)
+
+    report = {}
+    histogram = metrics.Histogram("bench_seconds", "bench", ("route",))
+    report["histogram_observe_us"] = overhead(lambda: None, lambda: histogram.observe(0.003, "/route"), calls=1)
+
+    # Middleware seul, autour d'une application ASGI vide
+    async def empty_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    scope = {"type": "http", "method": "GET", "path": "/bench"}
+    middleware = metrics.MetricsMiddleware(empty_app)
+
+    async def requests(app):
+        for _ in range(number):
+            await app(scope, receive, send)
+
+    loop = asyncio.new_event_loop()
+    report["middleware_us"] = overhead(lambda: loop.run_until_complete(requests(empty_app)),
+                                       lambda: loop.run_until_complete(requests(middleware)), calls=number)
+    loop.close()
+
+    # Événements du moteur (par requête SQL) et pool mesuré (par checkout)
+    plain = create_engine(f"sqlite:///{db_path}", poolclass=QueuePool)
+    instrumented = create_engine(f"sqlite:///{db_path}", poolclass=metrics.timed_pool(QueuePool, "bench"))
+    metrics.instrument_engine(instrumented, "bench")
+    statement = text("SELECT 1")
+    with plain.connect() as plain_conn, instrumented.connect() as instrumented_conn:
+        report["statement_us"] = overhead(lambda: plain_conn.execute(statement),
+                                          lambda: instrumented_conn.execute(statement), calls=1)
+    report["checkout_us"] = overhead(lambda: plain.connect().close(), lambda: instrumented.connect().close(),
+                                     calls=1)
+    plain.dispose()
+    instrumented.dispose()
+
+    started = time.perf_counter()
+    text_format = metrics.render()
+    report["render_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    report["render_lines"] = text_format.count("\n")
+    return report
+
+
+def child(args):
+    configure_env(args.db)
+    print(json.dumps(asyncio.run(measure(args))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--etudiants", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--number", type=int, default=20_000, help="itérations des mesures unitaires")
+    parser.add_argument("--db")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    args.db = configure_env()
+    seed(args.etudiants)
+    report = {"etudiants": args.etudiants, "requests": args.requests, "rounds": args.rounds,
+              "components": components(args.db, args.number)}
+    # Modes alternés d'un tour à l'autre: une dérive de la machine touche les deux
+    runs: dict[str, list[dict]] = {"off": [], "on": []}
+    for _ in range(args.rounds):
+        for mode in ("off", "on"):
+            env = {**os.environ, "METRICS_ENABLED": str(mode == "on").lower(), "MAIL_WORKER_ENABLED": "false"}
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_metrics", "--child", "--db", args.db,
+                 "--requests", str(args.requests)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            runs[mode].append(json.loads(output.strip().splitlines()[-1]))
+    for route in ROUTES:
+        report[route] = {mode: {key: round(statistics.median(run[route][key] for run in runs[mode]), 3)
+                                for key in ("p50_ms", "p95_ms", "p99_ms", "mean_ms")}
+                         for mode in runs}
+        report[route]["p50_overhead_us"] = round(
+            (report[route]["on"]["p50_ms"] - report[route]["off"]["p50_ms"]) * 1000, 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
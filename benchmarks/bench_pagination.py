@@ -0,0 +1,103 @@
+"""
+Coût d'une page selon sa profondeur: pagination par décalage (OFFSET) contre pagination par curseur.
+
+La page `--page` (1000 par défaut) est atteinte directement: le curseur est construit à partir
+de la dernière ligne de la page précédente, comme s'il avait été renvoyé par X-Next-Cursor.
+
+Deux mesures par mode: `service` (appel complet, chargement des objets compris) et `sql`
+(même tri et même reprise, en ne lisant que (clé de tri, id)): le coût propre au parcours des
+lignes sautées apparaît dans `sql`, le chargement des objets est identique d'une page à l'autre.
+
+Usage: python -m benchmarks.bench_pagination [--etudiants 120000] [--limit 100] [--page 1000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import percentiles
+from tests.support import configure_env, seed, seed_journal
+
+
+async def run(n_etudiants: int, limit: int, page: int, repeat: int) -> dict:
+    configure_env()
+    seed(n_etudiants)
+    seed_journal(n_etudiants)
+
+    from sqlalchemy import select
+
+    from app.helpers import models
+    from app.helpers.database import AsyncSessionLocal
+    from app.services import etudiant as etudiant_service
+    from app.services import journal as journal_service
+    from app.utils import pagination
+
+    async def timed(operation) -> dict:
+        samples = []
+        for _ in range(repeat):
+            async with AsyncSessionLocal() as db:
+                started = time.perf_counter()
+                rows = await operation(db)
+                samples.append(time.perf_counter() - started)
+                assert len(rows) == limit, len(rows)
+        return percentiles(samples)
+
+    async def cursor_before(service, sort: str, order: str, skip: int) -> str:
+        # Position (clé de tri, id) de la dernière ligne de la page précédente
+        async with AsyncSessionLocal() as db:
+            last = (await service.get_all(db, skip=skip - 1, limit=1, sort=sort, order=order))[0]
+            return pagination.encode_cursor(sort, order, getattr(last, sort), last.id)
+
+    async def timed_sql(model, sort: str, order: str, skip: int = 0, after=None) -> dict:
+        column = getattr(model, sort)
+        stmt = pagination.keyset(select(column, model.id), column, model.id, after, order == "desc")
+        stmt = stmt.offset(skip).limit(limit) if skip else stmt.limit(limit)
+        samples = []
+        async with AsyncSessionLocal() as db:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                rows = (await db.execute(stmt)).all()
+                samples.append(time.perf_counter() - started)
+                assert len(rows) == limit, len(rows)
+        return percentiles(samples)
+
+    report = {"etudiants": n_etudiants, "operations": n_etudiants, "limit": limit, "page": page, "repeat": repeat}
+    skip = (page - 1) * limit
+    for name, service, model, sort, order in (("etudiants", etudiant_service, models.Etudiant, "id", "asc"),
+                                              ("journal", journal_service, models.Journal, "date", "desc")):
+        cursor = await cursor_before(service, sort, order, skip)
+        after = pagination.decode_cursor(cursor, sort, order, getattr(model, sort))
+        report[name] = {"sql": {
+            "offset_page_1": await timed_sql(model, sort, order),
+            f"offset_page_{page}": await timed_sql(model, sort, order, skip=skip),
+            "cursor_page_1": await timed_sql(model, sort, order),
+            f"cursor_page_{page}": await timed_sql(model, sort, order, after=after),
+        }}
+        report[name]["service"] = {
+            "offset_page_1": await timed(lambda db: service.get_all(db, skip=0, limit=limit, sort=sort, order=order)),
+            f"offset_page_{page}": await timed(lambda db: service.get_all(db, skip=skip, limit=limit,
+                                                                          sort=sort, order=order)),
+            "cursor_page_1": await timed(lambda db: _rows(service.get_page(db, limit=limit, sort=sort, order=order))),
+            f"cursor_page_{page}": await timed(lambda db: _rows(service.get_page(db, limit=limit, cursor=cursor,
+                                                                                 sort=sort, order=order))),
+        }
+    return report
+
+
+async def _rows(page):
+    rows, _ = await page
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--etudiants", type=int, default=120_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.etudiants, args.limit, args.page, args.repeat)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Saturation du pool de connexions: débit, attente au checkout et expirations selon la concurrence.
+
+Chaque client simulé prend une connexion, exécute une requête puis la garde `--hold-ms`
+(requête lente, appel externe dans une transaction...) avant de la rendre. Quand la concurrence
+dépasse pool_size + max_overflow, les clients attendent une connexion: l'attente au checkout
+augmente, puis les checkouts expirent après pool_timeout (TimeoutError, 503 côté route).
+
+Les réglages du pool sont ceux du profil `--profile` (surchargés par les options). Le moteur de
+mesure est construit avec pool_options et un pool à file: sous SQLite, le moteur asynchrone de
+l'application n'a pas de pool (NullPool).
+
+Usage: python -m benchmarks.bench_pool [--profile prod] [--pool-size 5] [--max-overflow 5]
+                                       [--pool-timeout 2] [--hold-ms 20] [--duration 3]
+                                       [--concurrency 5,10,20,40]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import percentiles
+from tests.support import configure_env
+
+
+async def run(args) -> dict:
+    configure_env()
+
+    from sqlalchemy import exc, text
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    from app.helpers.database import ASYNC_SQLALCHEMY_DATABASE_URL, engine_settings, pool_options
+
+    settings = engine_settings(args.profile)
+    for key in ("pool_size", "max_overflow", "pool_timeout"):
+        if getattr(args, key) is not None:
+            settings[key] = getattr(args, key)
+
+    bench_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=AsyncAdaptedQueuePool,
+                                       pool_pre_ping=settings["pool_pre_ping"], **pool_options(settings))
+    Session = async_sessionmaker(bind=bench_engine)
+    hold = args.hold_ms / 1000
+
+    async def level(concurrency: int) -> dict:
+        waits: list[float] = []
+        latencies: list[float] = []
+        timeouts = 0
+        peak = 0
+        deadline = time.perf_counter() + args.duration
+
+        async def client():
+            nonlocal timeouts, peak
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    async with Session() as db:
+                        await db.connection()
+                        waits.append(time.perf_counter() - started)
+                        peak = max(peak, bench_engine.pool.checkedout())
+                        await db.execute(text("SELECT 1"))
+                        await asyncio.sleep(hold)
+                except exc.TimeoutError:
+                    timeouts += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        return {
+            "concurrency": concurrency,
+            "throughput_per_s": round(len(latencies) / elapsed, 1),
+            "timeouts": timeouts,
+            "peak_checked_out": peak,
+            "checkout_wait": percentiles(waits),
+            "latency": percentiles(latencies),
+        }
+
+    report = {
+        "profile": args.profile,
+        "pool": {key: settings[key] for key in ("pool_size", "max_overflow", "pool_timeout", "pool_pre_ping")},
+        "hold_ms": args.hold_ms,
+        "levels": [],
+    }
+    try:
+        for concurrency in args.concurrency:
+            report["levels"].append(await level(concurrency))
+    finally:
+        await bench_engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", default="prod")
+    parser.add_argument("--pool-size", type=int)
+    parser.add_argument("--max-overflow", type=int)
+    parser.add_argument("--pool-timeout", type=int)
+    parser.add_argument("--hold-ms", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=3)
+    parser.add_argument("--concurrency", type=lambda value: [int(v) for v in value.split(",")],
+                        default=[5, 10, 20, 40, 80])
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
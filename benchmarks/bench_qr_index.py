@@ -0,0 +1,105 @@
+"""
+Index des codes QR en mémoire: chargement, empreinte mémoire et vérification d'un scan.
+
+Compare qrcode.verify avec et sans l'index pour des codes valides, invalidés et inconnus, puis
+mesure un rafraîchissement incrémental après des changements faits par « un autre processus »
+(écrits directement en base, hors du service).
+
+Usage: python -m benchmarks.bench_qr_index [--etudiants 100000] [--scans 2000] [--revoked 1000]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+
+from benchmarks.common import percentiles
+from tests.support import configure_env, seed
+
+
+async def run(n_etudiants: int, n_scans: int, n_revoked: int) -> dict:
+    configure_env()
+    qr_data = seed(n_etudiants)
+
+    from sqlalchemy import insert, update
+
+    from app.helpers import models
+    from app.helpers.database import AsyncSessionLocal, SessionLocal
+    from app.services import qrcode as qrcode_service
+    from app.utils.qr_index import qr_index
+
+    revoked = random.sample(qr_data, n_revoked)
+    with SessionLocal() as db:
+        db.execute(update(models.QR_Code).filter(models.QR_Code.data.in_(revoked)).values(is_valid=False))
+        db.commit()
+    valid = list(set(qr_data) - set(revoked))
+    samples = {
+        "valid": random.choices(valid, k=n_scans),
+        "revoked": random.choices(revoked, k=n_scans),
+        "unknown": [f"{i}_inconnu" for i in range(n_scans)],
+    }
+    expected = {"valid": True, "revoked": False, "unknown": False}
+
+    async def measure(kind: str) -> dict:
+        durations = []
+        async with AsyncSessionLocal() as db:
+            for data in samples[kind]:
+                started = time.perf_counter()
+                verification = await qrcode_service.verify(db, data)
+                durations.append(time.perf_counter() - started)
+                assert verification.accepted is expected[kind], (kind, data, verification)
+        return percentiles(durations)
+
+    report = {"etudiants": n_etudiants, "scans": n_scans, "revoked": n_revoked}
+    report["database"] = {kind: await measure(kind) for kind in samples}
+
+    # Pic mémoire du chargement (tracemalloc le ralentit: la durée est mesurée au second chargement)
+    tracemalloc.start()
+    await qr_index.load()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await qr_index.load()
+    stats = qr_index.stats()
+    report["index"] = {kind: await measure(kind) for kind in samples}
+    report["index_memory"] = {
+        "entries": stats["entries"],
+        "memory_bytes": stats["memory_bytes"],
+        "bytes_per_entry": stats["bytes_per_entry"],
+        "load_ms": stats["load_ms"],
+        "load_peak_traced_mb": round(peak / 1024 / 1024, 2),
+    }
+
+    # Changements d'un autre processus: invalidations signalées, nouveaux codes
+    changed = random.sample(valid, 100)
+    with SessionLocal() as db:
+        db.execute(update(models.QR_Code).filter(models.QR_Code.data.in_(changed)).values(is_valid=False))
+        db.execute(insert(models.QR_CodeChange), [{"data": data} for data in changed])
+        db.execute(insert(models.QR_Code), [{
+            "id_etudiant": 1, "expire_date": qr_index.get(valid[0]).expire_date,
+            "is_valid": True, "data": f"nouveau-{i}",
+        } for i in range(100)])
+        db.commit()
+    started = time.perf_counter()
+    applied = await qr_index.refresh()
+    report["refresh"] = {"applied": applied, "ms": round((time.perf_counter() - started) * 1000, 3)}
+    assert all(not qr_index.get(data).accepted for data in changed)
+    assert qr_index.get("nouveau-0").accepted
+
+    started = time.perf_counter()
+    await qr_index.refresh()
+    report["refresh_idle_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--etudiants", type=int, default=100_000)
+    parser.add_argument("--scans", type=int, default=2000)
+    parser.add_argument("--revoked", type=int, default=1000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.etudiants, args.scans, args.revoked)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Journal des scans et consolidation des présences.
+
+- `record`: coût ajouté à chaque scan (mise en file, microsecondes)
+- `flush`: débit d'écriture des scans par INSERT multi-lignes (scans/s), contre un INSERT par scan
+- `fold`: recalcul d'un jour de `--scans` scans en compteurs par classe (ms)
+- `report`: GET /attendance/totals sur `--days` jours, lu dans attendance_daily, contre le même
+  agrégat calculé sur les scans bruts (ms)
+
+Usage: python -m benchmarks.bench_scan_events [--etudiants 20000] [--scans 200000] [--days 30]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import timeit
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import percentiles
+from tests.support import configure_env, seed
+
+
+def record_cost(number: int) -> dict:
+    from app.helpers import schemas
+    from app.utils.scan_events import ScanEventLog
+
+    log = ScanEventLog(batch_size=10 ** 9, interval=1, max_pending=10 ** 9, retention_days=90)
+    log._task = object()  # type: ignore  (journal « démarré » sans tâche d'écriture)
+    etudiant = schemas.ScanEtudiant(id=1, nom="Nom", prenom="Prenom", matricule="IM0000001",
+                                    parcours="IG", niveau="L1", annee_univ="2023-2024")
+    best = min(timeit.repeat(lambda: log.record(etudiant, "accepted"), number=number, repeat=5))
+    return {"us": round(best / number * 1e6, 3)}
+
+
+def _events(n: int, n_etudiants: int, day: date, rng: random.Random) -> list[dict]:
+    scanned_at = datetime.combine(day, datetime.min.time())
+    outcomes = ("accepted",) * 8 + ("identified", "expired")
+    events = []
+    for _ in range(n):
+        i = rng.randint(1, n_etudiants)
+        events.append({
+            "day": day,
+            "scanned_at": scanned_at,
+            "id_etudiant": i,
+            "parcours": ("IG", "GB", "SR")[i % 3],
+            "niveau": ("L1", "L2", "L3", "M1", "M2")[i % 5],
+            "outcome": rng.choice(outcomes),
+        })
+    return events
+
+
+async def flush_throughput(n_etudiants: int, n: int) -> dict:
+    from sqlalchemy import insert
+
+    from app.helpers import models
+    from app.helpers.database import AsyncSessionLocal
+    from app.utils.scan_events import SCAN_EVENTS_BATCH_SIZE, ScanEventLog
+
+    rng = random.Random(1)
+    log = ScanEventLog(batch_size=SCAN_EVENTS_BATCH_SIZE, interval=1, max_pending=n, retention_days=90)
+    log._entries = _events(n, n_etudiants, date.today(), rng)
+    started = time.perf_counter()
+    await log.flush()
+    batched = time.perf_counter() - started
+
+    single_n = min(n, 2000)
+    events = _events(single_n, n_etudiants, date.today(), rng)
+    started = time.perf_counter()
+    for entry in events:
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(models.ScanEvent).values(**entry))
+            await db.commit()
+    single = time.perf_counter() - started
+    return {
+        "batched_events_per_s": round(n / batched),
+        "single_insert_events_per_s": round(single_n / single),
+        "max_flush_ms": round(log.max_flush_ms, 2),
+    }
+
+
+async def fold_and_report(n_etudiants: int, n_scans: int, n_days: int, n_queries: int) -> dict:
+    import httpx
+    from sqlalchemy import distinct, func, insert, select
+
+    from app.helpers import models
+    from app.helpers.database import AsyncSessionLocal
+    from app.utils.attendance import AttendanceRollup
+    from app.utils.scan_events import ATTENDED_OUTCOMES
+    from main import app
+
+    rng = random.Random(2)
+    today = date.today()
+    days = [today - timedelta(days=offset) for offset in range(n_days)]
+    async with AsyncSessionLocal() as db:
+        for day in days:
+            events = _events(n_scans, n_etudiants, day, rng)
+            for start in range(0, len(events), 5000):
+                await db.execute(insert(models.ScanEvent), events[start:start + 5000])
+        await db.commit()
+
+    rollup = AttendanceRollup(interval=60)
+    fold_ms = []
+    for day in days:
+        started = time.perf_counter()
+        await rollup.fold(day)
+        fold_ms.append((time.perf_counter() - started) * 1000)
+
+    # Même résultat que GET /attendance/totals, calculé sur les scans bruts
+    event = models.ScanEvent
+    per_day = select(
+        event.day, event.parcours, event.niveau,
+        func.count(distinct(event.id_etudiant)).filter(event.outcome.in_(ATTENDED_OUTCOMES)).label("students"),
+    ).filter(event.day >= days[-1], event.day <= today).group_by(event.day, event.parcours, event.niveau).subquery()
+    raw = select(per_day.c.parcours, per_day.c.niveau, func.sum(per_day.c.students)) \
+        .group_by(per_day.c.parcours, per_day.c.niveau)
+
+    raw_samples = []
+    async with AsyncSessionLocal() as db:
+        for _ in range(max(1, n_queries // 10)):
+            started = time.perf_counter()
+            (await db.execute(raw)).all()
+            raw_samples.append(time.perf_counter() - started)
+
+    from app.utils.auth import get_current_active_operator
+    app.dependency_overrides[get_current_active_operator] = lambda: None
+    params = {"debut": days[-1].isoformat(), "fin": today.isoformat()}
+    rollup_samples = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for _ in range(n_queries):
+            started = time.perf_counter()
+            response = await client.get("/attendance/totals", params=params)
+            rollup_samples.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.text
+    return {
+        "fold_ms": {"p50": round(sorted(fold_ms)[len(fold_ms) // 2], 2), "max": round(max(fold_ms), 2)},
+        "report": {"rollup_endpoint": percentiles(rollup_samples), "raw_aggregate_query": percentiles(raw_samples)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--etudiants", type=int, default=20_000)
+    parser.add_argument("--scans", type=int, default=200_000, help="scans par jour")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--number", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    configure_env()
+    seed(args.etudiants)
+    report = {
+        "etudiants": args.etudiants,
+        "scans_per_day": args.scans,
+        "days": args.days,
+        "record": record_cost(args.number),
+        "flush": asyncio.run(flush_throughput(args.etudiants, args.scans)),
+    }
+    report.update(asyncio.run(fold_and_report(args.etudiants, args.scans, args.days, args.queries)))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Réponse d'un scan: construction et sérialisation, puis coût de bout en bout.
+
+`serialization` (microsecondes par réponse, sans base ni HTTP), comme FastAPI le fait pour un
+response_model (validation, model_dump(mode="json"), puis rendu de la classe de réponse):
+- `full_orm_json`: schemas.Etudiant depuis l'objet ORM et ses codes QR, JSONResponse (json.dumps)
+  (réponse de GET /etudiants/qrcode/{data} avant la projection)
+- `slim_row_json`: schemas.ScanEtudiant depuis une ligne de colonnes (Row), JSONResponse
+- `slim_row_orjson`: idem, ORJSONResponse (réponse actuelle)
+- `verification_orjson`: schemas.ScanVerification de GET /qrcode/verify/{data}, ORJSONResponse
+
+`endpoint` (latence par requête, transport ASGI, cache des scans désactivé): l'ancienne route
+(objet ORM + selectinload des codes QR, schemas.Etudiant, JSONResponse), ajoutée pour la mesure,
+contre GET /etudiants/qrcode/{data}.
+
+Usage: python -m benchmarks.bench_serialization [--etudiants 20000] [--number 20000] [--scans 2000]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import timeit
+
+from benchmarks.common import percentiles
+from tests.support import configure_env, seed
+
+
+def serialization(number: int) -> dict:
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+
+    from app.helpers import models, schemas
+    from app.helpers.database import SessionLocal
+    from app.services import etudiant as etudiant_service
+    from app.services import qrcode as qrcode_service
+
+    with SessionLocal() as db:
+        qcode = db.scalars(select(models.QR_Code).limit(1)).one()
+        db_etudiant = db.scalars(select(models.Etudiant).options(selectinload(models.Etudiant.qrcode))
+                                 .filter(models.Etudiant.id == qcode.id_etudiant)).one()
+        row = db.execute(etudiant_service._select_scan_etudiant()
+                         .filter(models.Etudiant.id == qcode.id_etudiant)).one()
+        verification_row = db.execute(qrcode_service._select_verification()
+                                      .filter(models.QR_Code.data == qcode.data)).one()
+
+    def respond(model, source, response_class):
+        value = model.model_validate(source, from_attributes=True)
+        return response_class(value.model_dump(mode="json")).body
+
+    cases = {
+        "full_orm_json": lambda: respond(schemas.Etudiant, db_etudiant, JSONResponse),
+        "slim_row_json": lambda: respond(schemas.ScanEtudiant, row, JSONResponse),
+        "slim_row_orjson": lambda: respond(schemas.ScanEtudiant, row, ORJSONResponse),
+        "verification_orjson": lambda: ORJSONResponse(
+            qrcode_service.scan_verification(verification_row).model_dump(mode="json")).body,
+    }
+    report = {}
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=number, repeat=5))
+        report[name] = {"us": round(best / number * 1e6, 2), "bytes": len(case())}
+    return report
+
+
+async def endpoint(qr_data: list[str], n_scans: int) -> dict:
+    import httpx
+    from fastapi import Depends, HTTPException
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from app.helpers import models, schemas
+    from app.services import etudiant as etudiant_service
+    from app.utils.cache import scan_cache
+    from app.utils.replica import get_read_db
+    from main import app
+
+    scan_cache.maxsize = 0
+
+    @app.get("/__bench/scan/full/{qcode_data}", response_model=schemas.Etudiant)
+    async def scan_full(qcode_data: str, db: AsyncSession = Depends(get_read_db)):
+        result = await db.execute(etudiant_service._select_etudiant()
+                                  .join(models.QR_Code, models.QR_Code.id_etudiant == models.Etudiant.id)
+                                  .filter(models.QR_Code.data == qcode_data))
+        db_etudiant = result.scalars().first()
+        if db_etudiant is None:
+            raise HTTPException(status_code=404)
+        return schemas.Etudiant.model_validate(db_etudiant, from_attributes=True)
+
+    sample = random.choices(qr_data, k=n_scans)
+    report = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, path in (("full", "/__bench/scan/full/{data}"), ("slim", "/etudiants/qrcode/{data}")):
+            samples = []
+            for data in sample:
+                started = time.perf_counter()
+                response = await client.get(path.format(data=data))
+                samples.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+            report[name] = {"bytes": len(response.content), **percentiles(samples)}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--etudiants", type=int, default=20_000)
+    parser.add_argument("--number", type=int, default=20_000)
+    parser.add_argument("--scans", type=int, default=2000)
+    args = parser.parse_args()
+    configure_env()
+    qr_data = seed(args.etudiants)
+    report = {
+        "etudiants": args.etudiants,
+        "serialization": serialization(args.number),
+        "endpoint": asyncio.run(endpoint(qr_data, args.scans)),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
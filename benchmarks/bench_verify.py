@@ -0,0 +1,67 @@
+"""
+Vérification d'un scan: chemin historique contre endpoint dédié.
+
+- `legacy_no_index`: GET /etudiants/qrcode/{data} sans index sur qrcode.data (état initial)
+- `legacy`: GET /etudiants/qrcode/{data} avec l'index
+- `verify`: GET /qrcode/verify/{data}, une seule requête jointe et indexée
+
+Le cache des scans est désactivé pour mesurer le coût en base.
+
+Usage: python -m benchmarks.bench_verify [--etudiants 100000] [--scans 500]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks.common import percentiles
+from tests.support import configure_env, seed
+
+
+async def run(n_etudiants: int, n_scans: int) -> dict:
+    configure_env()
+    qr_data = seed(n_etudiants)
+
+    import httpx
+    from sqlalchemy import text
+
+    from app.helpers.database import engine
+    from app.utils.cache import scan_cache
+    from main import app
+
+    scan_cache.maxsize = 0
+    sample = random.choices(qr_data, k=n_scans)
+
+    async def measure(client: httpx.AsyncClient, path: str) -> dict:
+        samples = []
+        for data in sample:
+            started = time.perf_counter()
+            response = await client.get(path.format(data=data))
+            samples.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.text
+        return percentiles(samples)
+
+    report = {"etudiants": n_etudiants, "scans": n_scans}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_qrcode_data"))
+        report["legacy_no_index"] = await measure(client, "/etudiants/qrcode/{data}")
+        with engine.begin() as conn:
+            conn.execute(text("CREATE INDEX ix_qrcode_data ON qrcode (data)"))
+        report["legacy"] = await measure(client, "/etudiants/qrcode/{data}")
+        report["verify"] = await measure(client, "/qrcode/verify/{data}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--etudiants", type=int, default=100_000)
+    parser.add_argument("--scans", type=int, default=500)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.etudiants, args.scans)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
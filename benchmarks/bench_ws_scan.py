@@ -0,0 +1,116 @@
+"""
+Latence des scans de portiques: REST (une requête HTTP par scan) contre canal WebSocket /qrcode/ws.
+
+L'application tourne dans un vrai serveur uvicorn (sous-processus): connexions, en-têtes et
+trames sont mesurés comme en production. `--scanners` portiques scannent en parallèle pendant
+`--duration` secondes:
+- `rest_close`: GET /qrcode/verify/{data} avec le jeton, nouvelle connexion TCP par scan
+- `rest_keepalive`: idem sur une connexion HTTP gardée ouverte
+- `ws`: un scan à la fois sur le canal WebSocket (attente du résultat avant le suivant)
+- `ws_pipelined`: jusqu'à `--window` scans envoyés sans attendre les résultats
+
+La latence d'un scan va de l'envoi à la réception de son résultat.
+
+Usage: python -m benchmarks.bench_ws_scan [--etudiants 20000] [--scanners 20] [--duration 5]
+                                          [--window 16] [--no-index]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks.common import percentiles, serve_app
+from tests.support import configure_env, seed, seed_operator
+
+PASSWORD = "portique"
+
+
+async def run(args) -> dict:
+    configure_env()
+    qr_data = seed(args.etudiants)
+
+    import httpx
+    import websockets
+
+    seed_operator("portique", PASSWORD)
+    async with serve_app({"QR_INDEX_ENABLED": str(not args.no_index).lower()}) as (base_url, _):
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            token = (await client.post("/token", data={"username": "portique", "password": PASSWORD})).json()["access_token"]
+            # Chargement de l'index terminé avant les mesures
+            headers = {"Authorization": f"Bearer {token}"}
+            while not args.no_index and not (await client.get("/qrcode/index/stats", headers=headers)).json()["ready"]:
+                await asyncio.sleep(0.1)
+
+        async def rest(keepalive: bool) -> list[float]:
+            samples = []
+            request_headers = dict(headers) if keepalive else {**headers, "Connection": "close"}
+            async with httpx.AsyncClient(base_url=base_url, headers=request_headers) as client:
+                deadline = time.perf_counter() + args.duration
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    response = await client.get(f"/qrcode/verify/{random.choice(qr_data)}")
+                    samples.append(time.perf_counter() - started)
+                    assert response.json()["accepted"], response.text
+            return samples
+
+        async def ws(window: int) -> list[float]:
+            samples = []
+            async with websockets.connect(base_url.replace("http://", "ws://") + "/qrcode/ws",
+                                          extra_headers=headers) as connection:
+                assert json.loads(await connection.recv())["type"] == "ready"
+                sent: dict[int, float] = {}
+                slots = asyncio.Semaphore(window)
+                deadline = time.perf_counter() + args.duration
+                finished = asyncio.Event()
+
+                async def send():
+                    i = 0
+                    while time.perf_counter() < deadline:
+                        await slots.acquire()
+                        sent[i] = time.perf_counter()
+                        await connection.send(json.dumps({"id": i, "data": random.choice(qr_data)}))
+                        i += 1
+                    finished.set()
+
+                async def receive():
+                    while not (finished.is_set() and not sent):
+                        result = json.loads(await connection.recv())
+                        samples.append(time.perf_counter() - sent.pop(result["id"]))
+                        assert result["accepted"], result
+                        slots.release()
+
+                await asyncio.gather(send(), receive())
+            return samples
+
+        async def scenario(client) -> dict:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(client() for _ in range(args.scanners)))
+            elapsed = time.perf_counter() - started
+            samples = [sample for result in results for sample in result]
+            return {"scans_per_s": round(len(samples) / elapsed, 1), **percentiles(samples)}
+
+        return {
+            "etudiants": args.etudiants,
+            "scanners": args.scanners,
+            "index": not args.no_index,
+            "rest_close": await scenario(lambda: rest(keepalive=False)),
+            "rest_keepalive": await scenario(lambda: rest(keepalive=True)),
+            "ws": await scenario(lambda: ws(window=1)),
+            "ws_pipelined": await scenario(lambda: ws(window=args.window)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--etudiants", type=int, default=20_000)
+    parser.add_argument("--scanners", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--window", type=int, default=16)
+    parser.add_argument("--no-index", action="store_true")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
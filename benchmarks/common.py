@@ -0,0 +1,69 @@
+"""
+Outils propres aux benchmarks: serveur uvicorn et mesures. La base temporaire et son peuplement
+viennent de tests.support, partagés avec les tests.
+"""
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+from contextlib import asynccontextmanager
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def serve_app(env: dict[str, str] | None = None):
+    """
+    Lance main:app dans un vrai serveur uvicorn (sous-processus, un worker) sur la base configurée,
+    attend qu'il réponde et renvoie (url de base, processus)
+    """
+    import httpx
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, "MAIL_WORKER_ENABLED": "false", **(env or {})},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            for _ in range(600):
+                try:
+                    await client.get("/")
+                    break
+                except httpx.TransportError:
+                    if server.poll() is not None:
+                        raise RuntimeError("Le serveur uvicorn s'est arrêté au démarrage")
+                    await asyncio.sleep(0.1)
+        yield base_url, server
+    finally:
+        server.terminate()
+        server.wait()
+
+
+
+def percentiles(samples: list[float]) -> dict:
+    """
+    p50/p95/p99 (en millisecondes) d'une liste de durées en secondes
+    """
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
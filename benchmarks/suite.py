@@ -0,0 +1,275 @@
+"""
+Suite de référence: les parcours principaux de l'application sous charge concurrente, à comparer
+d'un commit à l'autre.
+
+main:app tourne dans un vrai serveur uvicorn (un worker, voir common.serve_app) sur une base
+SQLite temporaire peuplée de `--etudiants` étudiants (avec leur code QR) et `--journal`
+opérations. Chaque scénario lance `--concurrency` clients (une connexion HTTP gardée ouverte
+chacun) pendant `--duration` secondes, après `--warmup` secondes non mesurées:
+- `scan`: GET /qrcode/verify/{data}, code QR valide tiré au hasard
+- `list`: GET /etudiants/?limit=50, pagination par curseur (chemin par défaut): chaque client reprend
+  à une position tirée au hasard puis suit X-Next-Cursor sur `PAGES_PER_WALK` pages
+- `list_offset`: GET /etudiants/?skip=...&limit=50 (ancienne pagination par décalage), page tirée au
+  hasard, pour comparaison
+- `journal_date`: GET /journal/date sur un jour tiré au hasard
+- `create`: POST /etudiants/ (étudiant nouveau à chaque requête; l'email part dans l'outbox)
+- `login`: POST /token (vérification bcrypt dans le pool de hachage)
+
+Les scénarios en lecture passent avant `create`, qui ajoute des lignes. Tirages reproductibles
+(`--seed`). Résultat JSON: débit, erreurs et p50/p95/p99 par scénario, commit et configuration.
+Avec `--baseline`, écarts relatifs à un résultat précédent.
+
+Usage: python -m benchmarks.suite [--etudiants 10000] [--journal N] [--concurrency 16] [--duration 10]
+                                  [--scenarios scan,list,...] [--output run.json] [--baseline ancien.json]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from benchmarks.common import percentiles, serve_app
+from tests.support import configure_env, seed, seed_journal, seed_operator
+
+PASSWORD = "suite-de-reference"
+PAGE_SIZE = 50
+# Pages suivies par un client (X-Next-Cursor) avant de reprendre ailleurs
+PAGES_PER_WALK = 10
+# Variables d'environnement du serveur relevées dans le résultat (elles changent les mesures)
+CONFIG_PREFIXES = ("DB_", "QR_", "SCAN_", "JOURNAL_", "RENDER_", "PASSWORD_", "BCRYPT_", "METRICS_", "SQLITE_")
+
+
+@dataclass
+class Dataset:
+    qr_data: list[str]
+    n_etudiants: int
+    journal_start: date
+    created: itertools.count = field(default_factory=lambda: itertools.count(1))
+
+
+# Scénario: (jeu de données, tirages, état du client) -> requête. L'état du client garde la
+# dernière réponse reçue ("response", None en cas d'erreur).
+
+def scan(dataset: Dataset, rng: random.Random, state: dict):
+    return "GET", f"/qrcode/verify/{rng.choice(dataset.qr_data)}", {}
+
+
+def page_cursor(dataset: Dataset, rng: random.Random, state: dict):
+    from app.utils import pagination
+
+    response = state.get("response")
+    cursor = response.headers.get("X-Next-Cursor") if response is not None else None
+    if cursor is None or state.get("pages", 0) >= PAGES_PER_WALK:
+        # Reprise à une position au hasard: même curseur que celui d'une page précédente (tri par id)
+        after = rng.randrange(max(1, dataset.n_etudiants - PAGE_SIZE))
+        cursor = pagination.encode_cursor("id", "asc", after, after) if after else None
+        state["pages"] = 0
+    state["pages"] = state.get("pages", 0) + 1
+    params = {"limit": PAGE_SIZE}
+    if cursor is not None:
+        params["cursor"] = cursor
+    return "GET", "/etudiants/", {"params": params}
+
+
+def page_offset(dataset: Dataset, rng: random.Random, state: dict):
+    skip = rng.randrange(max(1, dataset.n_etudiants - PAGE_SIZE))
+    return "GET", "/etudiants/", {"params": {"skip": skip, "limit": PAGE_SIZE}}
+
+
+def journal_date(dataset: Dataset, rng: random.Random, state: dict):
+    day = (dataset.journal_start + timedelta(days=rng.randrange(365))).isoformat()
+    return "GET", "/journal/date", {"params": {"debut": day, "fin": day}}
+
+
+def create(dataset: Dataset, rng: random.Random, state: dict):
+    i = next(dataset.created)
+    return "POST", "/etudiants/", {"json": {
+        "nom": f"Suite{i}",
+        "prenom": f"Prenom{i}",
+        "dob": "2001-01-01T00:00:00",
+        "cin": f"SUITE{i:010d}",
+        "tel": "0340000000",
+        "email": f"suite{i}@exemple.mg",
+        "adresse": "Antananarivo",
+        "niveau": rng.choice(("L1", "L2", "L3", "M1", "M2")),
+        "parcours": rng.choice(("IG", "GB", "SR")),
+        "matricule": f"SUITE{i:07d}",
+        "annee_univ": "2023-2024",
+    }}
+
+
+def login(dataset: Dataset, rng: random.Random, state: dict):
+    return "POST", "/token", {"data": {"username": "suite", "password": PASSWORD}}
+
+
+SCENARIOS = {
+    "scan": scan,
+    "list": page_cursor,
+    "list_offset": page_offset,
+    "journal_date": journal_date,
+    "create": create,
+    "login": login,
+}
+
+
+async def run_scenario(base_url: str, headers: dict, dataset: Dataset, name: str, args) -> dict:
+    import httpx
+
+    build = SCENARIOS[name]
+    samples: list[float] = []
+    statuses: dict[int, int] = {}
+    errors = 0
+    started = time.perf_counter()
+    measure_from = started + args.warmup
+    deadline = measure_from + args.duration
+
+    async def client(index: int):
+        nonlocal errors
+        rng = random.Random(f"{args.seed}:{name}:{index}")
+        state: dict = {}
+        async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=60) as http:
+            while (now := time.perf_counter()) < deadline:
+                method, url, kwargs = build(dataset, rng, state)
+                try:
+                    response = await http.request(method, url, **kwargs)
+                    status = response.status_code
+                except httpx.HTTPError:
+                    response = None
+                    status = 0
+                state["response"] = response if status == 200 else None
+                elapsed = time.perf_counter() - now
+                if now < measure_from:
+                    continue
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    samples.append(elapsed)
+                else:
+                    errors += 1
+
+    await asyncio.gather(*(client(i) for i in range(args.concurrency)))
+    return {
+        "throughput_rps": round(len(samples) / args.duration, 1),
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        **percentiles(samples),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_mb(pid: int) -> float | None:
+    """Pic de mémoire résidente du serveur (Linux)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    """
+    Écarts relatifs (%) au résultat de référence: débit (positif = mieux), latences (négatif = mieux)
+    """
+    comparison = {}
+    for name, result in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous or not previous.get("count"):
+            continue
+        comparison[name] = {
+            key: round((result[key] / previous[key] - 1) * 100, 1)
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms") if previous.get(key) and key in result
+        }
+    return {"commit": baseline.get("meta", {}).get("commit"), "delta_pct": comparison}
+
+
+async def run(args) -> dict:
+    configure_env()
+    started = time.perf_counter()
+    qr_data = seed(args.etudiants)
+    seed_journal(args.journal)
+    seed_operator("suite", PASSWORD)
+    dataset = Dataset(qr_data=qr_data, n_etudiants=args.etudiants,
+                      journal_start=date.today() - timedelta(days=365))
+    seed_seconds = time.perf_counter() - started
+
+    import httpx
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "config": {key: value for key, value in sorted(os.environ.items()) if key.startswith(CONFIG_PREFIXES)},
+        },
+        "dataset": {"etudiants": args.etudiants, "journal": args.journal, "seed_seconds": round(seed_seconds, 1)},
+        "load": {"concurrency": args.concurrency, "duration_s": args.duration, "warmup_s": args.warmup},
+        "scenarios": {},
+    }
+    async with serve_app() as (base_url, server):
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            token = (await client.post("/token", data={"username": "suite", "password": PASSWORD})).json()
+            headers = {"Authorization": f"Bearer {token['access_token']}"}
+            # Index des codes QR chargé avant les mesures (s'il est activé)
+            while True:
+                index = (await client.get("/qrcode/index/stats", headers=headers)).json()
+                if index["ready"] or not index["enabled"]:
+                    break
+                await asyncio.sleep(0.1)
+        for name in args.scenarios:
+            report["scenarios"][name] = await run_scenario(base_url, headers, dataset, name, args)
+        report["server_peak_rss_mb"] = peak_rss_mb(server.pid)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            report["comparison"] = compare(report, json.load(baseline))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--etudiants", type=int, default=10_000)
+    parser.add_argument("--journal", type=int, help="opérations du journal (défaut: autant que d'étudiants)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"scénarios séparés par des virgules parmi {', '.join(SCENARIOS)}")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="fichier JSON du résultat (en plus de la sortie standard)")
+    parser.add_argument("--baseline", help="résultat précédent (JSON) auquel comparer")
+    args = parser.parse_args()
+    if args.journal is None:
+        args.journal = args.etudiants
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"scénarios inconnus: {', '.join(sorted(unknown))}")
+    # Ordre fixe quel que soit l'ordre demandé: les lectures avant les écritures
+    args.scenarios = [name for name in SCENARIOS if name in args.scenarios]
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
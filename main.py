@@ -1,15 +1,81 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy import exc
 
 from app.helpers import models
-from app.helpers.database import engine
-from app.routers import etudiant, operator, journal
+from app.helpers.database import async_engine, engine, replica_engine
+from app.routers import etudiant, operator, journal, qrcode, mail, attendance
+from app.routers import metrics as metrics_router
+from app.utils import metrics, renderer, replica
+from app.utils.attendance import ATTENDANCE_ROLLUP_ENABLED, attendance_rollup
+from app.utils.hasher import password_hasher
+from app.utils.journal_feed import JOURNAL_FEED_ENABLED, journal_feed
+from app.utils.journal_writer import JOURNAL_BUFFERED, journal_buffer
+from app.utils.mailer import MAIL_WORKER_ENABLED, mail_worker
+from app.utils.qr_index import QR_INDEX_ENABLED, qr_index
+from app.utils.scan_events import SCAN_EVENTS_ENABLED, scan_events
 
 models.Base.metadata.create_all(engine)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Worker d'envoi des emails en arrière-plan
+    if MAIL_WORKER_ENABLED:
+        mail_worker.start()
+    # Écriture différée du journal
+    if JOURNAL_BUFFERED:
+        journal_buffer.start()
+    # Index des codes QR en mémoire (chargé en arrière-plan, les scans passent par la base d'ici là)
+    if QR_INDEX_ENABLED:
+        qr_index.start()
+    # Flux des opérations du journal (SSE / WebSocket)
+    if JOURNAL_FEED_ENABLED:
+        journal_feed.start()
+    # Journal des scans (écriture par lots) et consolidation des présences
+    if SCAN_EVENTS_ENABLED:
+        scan_events.start()
+    if ATTENDANCE_ROLLUP_ENABLED:
+        attendance_rollup.start()
+    yield
+    if ATTENDANCE_ROLLUP_ENABLED:
+        await attendance_rollup.stop()
+    if SCAN_EVENTS_ENABLED:
+        await scan_events.stop()
+    if JOURNAL_FEED_ENABLED:
+        await journal_feed.stop()
+    if QR_INDEX_ENABLED:
+        await qr_index.stop()
+    if MAIL_WORKER_ENABLED:
+        await mail_worker.stop()
+    if JOURNAL_BUFFERED:
+        await journal_buffer.stop()
+    # Pools de processus: rendu des codes QR, hachage des mots de passe
+    renderer.shutdown()
+    password_hasher.shutdown()
+    # Connexions du pool fermées proprement
+    await async_engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(exc.TimeoutError)
+async def pool_timeout_handler(request: Request, error: exc.TimeoutError):
+    # Pool de connexions saturé (pool_timeout dépassé): refus rapide, le client peut réessayer
+    return JSONResponse(status_code=503, content={"detail": "Base de donnée saturée, veuillez réessayer."},
+                        headers={"Retry-After": "1"})
+
+# Lecture de ses propres écritures: seulement utile avec une réplique
+if replica_engine is not None:
+    app.middleware("http")(replica.read_your_writes)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,9 +85,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Ajouté en dernier: enveloppe les autres middlewares, la durée mesurée couvre toute la requête
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 app.include_router(operator.router)
 app.include_router(etudiant.router)
 app.include_router(journal.router)
+app.include_router(qrcode.router)
+app.include_router(mail.router)
+app.include_router(attendance.router)
+if metrics.METRICS_ENABLED:
+    app.include_router(metrics_router.router)
 
 
 @app.get("/")
@@ -30,4 +105,4 @@ async def root():
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
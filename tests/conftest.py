@@ -0,0 +1,73 @@
+"""
+Fixtures communes: base SQLite temporaire peuplée une fois par session, client HTTP de
+l'application (transport ASGI, sans lifespan: aucune tâche de fond) et relevé des requêtes SQL.
+
+L'environnement est configuré avant tout import de l'application (paramètres lus à l'import).
+"""
+import pytest
+
+from tests.support import configure_env, count_statements, seed, seed_journal, seed_operator
+
+configure_env()
+
+OPERATOR = "tests"
+PASSWORD = "tests"
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def qr_data() -> list[str]:
+    """Données des codes QR des 200 étudiants de la base (et 200 opérations du journal)"""
+    data = seed(200)
+    seed_journal(200)
+    seed_operator(OPERATOR, PASSWORD)
+    return data
+
+
+@pytest.fixture
+async def operateur(qr_data):
+    """Opérateur enregistré (modèle ORM, comme le passent les routes aux services)"""
+    from sqlalchemy import select
+
+    from app.helpers import models
+    from app.helpers.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        return (await db.scalars(select(models.Operator).filter(models.Operator.nom == OPERATOR))).one()
+
+
+@pytest.fixture
+def queries():
+    """
+    Relevé des requêtes SQL du moteur asynchrone de l'application:
+
+        with queries() as statements:
+            ...
+        assert len(statements) == 2
+    """
+    from app.helpers.database import async_engine
+
+    return lambda: count_statements(async_engine)
+
+
+@pytest.fixture
+async def client(qr_data):
+    import httpx
+
+    from main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://tests") as client:
+        yield client
+
+
+@pytest.fixture
+async def headers(client) -> dict:
+    """En-tête d'un opérateur authentifié (déjà en cache: l'authentification n'émet plus de requête)"""
+    token = (await client.post("/token", data={"username": OPERATOR, "password": PASSWORD})).json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    assert (await client.get("/etudiants/", params={"limit": 1}, headers=headers)).status_code == 200
+    return headers
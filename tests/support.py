@@ -0,0 +1,139 @@
+"""
+Base SQLite temporaire, peuplement et relevé des requêtes SQL: partagés par les tests et les benchmarks.
+
+L'environnement doit être configuré avec `configure_env` AVANT d'importer l'application,
+car `app.helpers.database` lit ses paramètres à l'import.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+
+def configure_env(db_path: str | None = None) -> str:
+    """
+    Pointe l'application vers une base SQLite temporaire et renseigne les variables requises
+    """
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="qr_data_"), "data.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("DB_PROFILE", "test-sqlite")
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("QR_SIGNING_KEYS", "kb:benchmark-signing-key")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+    os.environ.setdefault("REFRESH_TOKEN_EXPIRE_DAYS", "7")
+    return db_path
+
+
+
+def seed(n_etudiants: int, chunk_size: int = 5000) -> list[str]:
+    """
+    Crée le schéma et insère `n_etudiants` étudiants avec leur code QR.
+    Retourne la liste des données QR générées.
+    """
+    from sqlalchemy import insert
+
+    from app.helpers import models
+    from app.helpers.database import SessionLocal, engine
+
+    quiet_engines()
+    models.Base.metadata.create_all(engine)
+    today = date.today()
+    qr_data = []
+    with SessionLocal() as db:
+        for start in range(1, n_etudiants + 1, chunk_size):
+            ids = range(start, min(start + chunk_size, n_etudiants + 1))
+            db.execute(insert(models.Etudiant), [{
+                "id": i,
+                "nom": f"Nom{i}",
+                "prenom": f"Prenom{i}",
+                "dob": date(2000, 1, 1),
+                "cin": f"CIN{i:010d}",
+                "tel": "0340000000",
+                "email": f"etudiant{i}@exemple.mg",
+                "matricule": f"IM{i:07d}",
+                "adresse": "Antananarivo",
+                "parcours": ("IG", "GB", "SR")[i % 3],
+                "niveau": ("L1", "L2", "L3", "M1", "M2")[i % 5],
+                "annee_univ": "2023-2024",
+            } for i in ids])
+            rows = [{
+                "id_etudiant": i,
+                "expire_date": today + timedelta(days=365),
+                "is_valid": True,
+                "data": f"{i}_bench-{i:012d}",
+                "created_at": today,
+            } for i in ids]
+            db.execute(insert(models.QR_Code), rows)
+            qr_data.extend(row["data"] for row in rows)
+        db.commit()
+    return qr_data
+
+
+def seed_journal(n_operations: int, chunk_size: int = 5000):
+    """
+    Opérations réparties sur une année (environ n/365 opérations par jour)
+    """
+    from sqlalchemy import insert
+
+    from app.helpers import models
+    from app.helpers.database import SessionLocal
+
+    start = date.today() - timedelta(days=365)
+    with SessionLocal() as db:
+        db.execute(insert(models.Operator), [{"id": 1, "nom": "bench", "hashed_password": "-", "disabled": False}])
+        for first in range(1, n_operations + 1, chunk_size):
+            db.execute(insert(models.Journal), [{
+                "operation": f"Opération {i}",
+                "id_operator": 1,
+                "im_etudiant": f"IM{i:07d}",
+                "date": start + timedelta(days=i * 365 // n_operations),
+            } for i in range(first, min(first + chunk_size, n_operations + 1))])
+        db.commit()
+
+
+def seed_operator(nom: str, password: str):
+    """
+    Opérateur actif pouvant se connecter par POST /token
+    """
+    from app.helpers import models
+    from app.helpers.database import SessionLocal
+    from app.utils.hasher import pwd_context
+
+    with SessionLocal() as db:
+        db.add(models.Operator(nom=nom, hashed_password=pwd_context.hash(password), disabled=False))
+        db.commit()
+
+
+
+def quiet_engines():
+    """
+    Désactive l'écho SQL des moteurs: la journalisation fausserait les mesures
+    """
+    from app.helpers.database import async_engine, engine
+
+    engine.echo = False
+    async_engine.echo = False
+
+
+
+@contextmanager
+def count_statements(engine):
+    """
+    Relève les requêtes SQL envoyées au pilote dans le bloc (liste des textes SQL).
+    `engine` peut être le moteur synchrone ou asynchrone.
+    """
+    from sqlalchemy import event
+
+    target = getattr(engine, "sync_engine", engine)
+    statements: list[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(target, "before_cursor_execute", before_cursor_execute)
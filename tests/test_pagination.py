@@ -0,0 +1,23 @@
+"""
+Pagination des listes: le curseur et l'ancienne pagination par décalage (`skip`) parcourent
+les mêmes lignes dans le même ordre par défaut (ordre d'écriture).
+"""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("path", ["/etudiants/", "/journal/"])
+async def test_skip_keeps_insertion_order(client, headers, path):
+    first = await client.get(path, params={"limit": 5}, headers=headers)
+    second = await client.get(path, params={"limit": 5, "cursor": first.headers["X-Next-Cursor"]}, headers=headers)
+    offset = await client.get(path, params={"skip": 5, "limit": 5}, headers=headers)
+    ids = [row["id"] for row in first.json() + second.json()]
+    assert ids == sorted(ids)
+    assert [row["id"] for row in offset.json()] == ids[5:]
+
+
+async def test_journal_newest_first_on_request(client, headers):
+    response = await client.get("/journal/", params={"sort": "date", "order": "desc", "limit": 50}, headers=headers)
+    dates = [row["date"] for row in response.json()]
+    assert dates == sorted(dates, reverse=True)
@@ -0,0 +1,62 @@
+"""
+Nombre de requêtes SQL des routes de lecture: constant quelle que soit la taille de la page
+(pas de N+1), et fixé pour chaque route.
+"""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def count(client, queries, headers, path: str, **params) -> tuple[int, int]:
+    """(lignes renvoyées, requêtes SQL émises)"""
+    with queries() as statements:
+        response = await client.get(path, params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    return (len(body) if isinstance(body, list) else 1), len(statements)
+
+
+@pytest.mark.parametrize("path, params, expected", [
+    # Page (curseur) + codes QR (selectinload)
+    ("/etudiants/", {}, 2),
+    ("/etudiants/", {"skip": 1}, 2),
+    # Page avec opérateur et étudiant (joinedload) + codes QR des étudiants (selectinload)
+    ("/journal/", {}, 2),
+    ("/journal/", {"skip": 1}, 2),
+])
+async def test_list_queries_do_not_grow_with_page_size(client, queries, headers, path, params, expected):
+    small = await count(client, queries, headers, path, limit=2, **params)
+    large = await count(client, queries, headers, path, limit=50, **params)
+    assert (small[0], large[0]) == (2, 50)
+    assert small[1] == large[1] == expected
+
+
+async def test_etudiant_detail_queries(client, queries, headers):
+    # Étudiant + codes QR (selectinload)
+    assert await count(client, queries, headers, "/etudiants/IM0000001", im="IM0000001") == (1, 2)
+
+
+async def test_etudiant_by_qrcode_queries(client, queries, headers, qr_data):
+    from app.utils.cache import scan_cache
+
+    # Projection des colonnes affichées au portique, jointure sur le code QR (cache vidé)
+    scan_cache.invalidate(qr_data[0])
+    assert await count(client, queries, headers, f"/etudiants/qrcode/{qr_data[0]}") == (1, 1)
+
+
+@pytest.fixture
+async def outbox(qr_data):
+    from app.helpers.database import AsyncSessionLocal
+    from app.services import mail as mail_service
+
+    async with AsyncSessionLocal() as db:
+        await mail_service.enqueue_qr_codes(db, [(f"etudiant{i}@exemple.mg", qr_data[i]) for i in range(100)])
+        await db.commit()
+
+
+async def test_mail_list_queries_do_not_grow_with_page_size(client, queries, headers, outbox):
+    small = await count(client, queries, headers, "/mail/", limit=2)
+    large = await count(client, queries, headers, "/mail/", limit=50)
+    assert (small[0], large[0]) == (2, 50)
+    # Page de la file d'envoi seule
+    assert small[1] == large[1] == 1
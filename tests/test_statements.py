@@ -0,0 +1,88 @@
+"""
+Requêtes SQL émises par la création, la modification et la suppression d'un étudiant: chaque
+opération reproduit le chemin de sa route (vérifications préalables comprises, authentification
+exclue) et doit rester dans son budget, journal synchrone ou tampon d'écriture actif.
+"""
+from datetime import date
+
+import pytest
+from sqlalchemy import delete as sql_delete
+
+from tests.support import count_statements
+
+pytestmark = pytest.mark.anyio
+
+# Requêtes par opération, journal synchrone (une de moins avec le tampon d'écriture: l'INSERT du journal)
+STATEMENT_BUDGET = {
+    # SELECT (doublon) + INSERT étudiant, code QR, outbox, journal
+    "create": 5,
+    # SELECT étudiant + codes QR (route) + UPDATE + INSERT journal + INSERT qrcode_changes
+    # (champ affiché au portique modifié: à propager aux index des codes QR)
+    "update": 5,
+    # SELECT étudiant + codes QR (route) + INSERT qrcode_changes + DELETE + INSERT journal
+    "delete": 5,
+}
+
+
+@pytest.fixture
+async def journal_buffer(request):
+    from app.utils.journal_writer import journal_buffer
+
+    if request.param:
+        journal_buffer.start()
+    yield request.param
+    if request.param:
+        await journal_buffer.stop()
+
+
+@pytest.mark.parametrize("journal_buffer", [False, True], ids=["synchrone", "tampon"], indirect=True)
+async def test_crud_statement_budget(operateur, journal_buffer):
+    from app.helpers import models, schemas
+    from app.helpers.database import AsyncSessionLocal, async_engine
+    from app.services import etudiant as etudiant_service
+
+    budget = {name: count - 1 if journal_buffer else count for name, count in STATEMENT_BUDGET.items()}
+    suffix = "1" if journal_buffer else "0"
+
+    async def measure(operation):
+        async with AsyncSessionLocal() as db:
+            with count_statements(async_engine) as statements:
+                result = await operation(db)
+        return result, len(statements)
+
+    async def create(db):
+        etudiant = schemas.EtudiantCreate(
+            nom="Rakoto", prenom="Jean", dob=date(2001, 5, 4), cin=f"10101010101{suffix}", tel="0340000000",
+            email=f"rakoto{suffix}@exemple.mg", matricule=f"IM999999{suffix}", adresse="Antananarivo",
+            parcours="IG", niveau="L1", annee_univ="2023-2024",
+        )
+        assert not await etudiant_service.exists(db, im=etudiant.matricule, cin=etudiant.cin)
+        return await etudiant_service.create(db, etudiant, operateur)
+
+    created, statements = await measure(create)
+    assert created.qrcode
+    assert statements <= budget["create"]
+
+    # Comme dans les routes, l'étudiant chargé par la vérification reste référencé
+    # (la carte d'identité de la session ne garde que des références faibles)
+    async def update(db):
+        is_present = await etudiant_service.get_by_id(db, created.id)
+        assert is_present
+        return await etudiant_service.update(db, created.id, {"niveau": "L2"}, operateur)
+
+    updated, statements = await measure(update)
+    assert updated.niveau == "L2"
+    assert statements <= budget["update"]
+
+    async def delete(db):
+        is_present = await etudiant_service.get_by_id(db, created.id)
+        assert is_present
+        return await etudiant_service.delete(db, created.id, operateur)
+
+    _, statements = await measure(delete)
+    assert statements <= budget["delete"]
+
+    # SQLite sans clés étrangères: pas de cascade, et l'id est réutilisé par la création suivante
+    async with AsyncSessionLocal() as db:
+        await db.execute(sql_delete(models.QR_Code).filter(models.QR_Code.id_etudiant == created.id))
+        await db.commit()